@@ -2,8 +2,12 @@
 import os
 import uuid
 import json
+import hmac
+import importlib
 import shutil
+import zipfile
 
+from functools import wraps
 from io import BytesIO
 from flask import (
     Flask,
@@ -14,13 +18,37 @@ from flask import (
     session,
     send_file,
     flash,
+    g,
+    jsonify,
+    Response,
+    stream_with_context,
     after_this_request,   # ✅ ALTERAÇÃO: para resetar após download
 )
 from werkzeug.utils import secure_filename
 
-from core.step1_banco_consolidado import gerar_banco_consolidado
-from core.step2_gerar_espelhos import gerar_espelhos_motoristas
-from core.step3_resumos import gerar_resumos
+from core.progresso import RegistroProgresso, eventos_progresso
+from core.travas import TravaArquivo
+
+# =========================
+# MÓDULOS PESADOS (pandas / openpyxl)
+# =========================
+# Importados dentro das rotas que processam planilhas: login, index e /static
+# respondem sem carregar a pilha de dados. No gunicorn, gunicorn.conf.py chama
+# pre_carregar() no master antes do fork, e os workers já nascem com tudo
+# importado (páginas de memória compartilhadas, sem custo no boot do worker).
+MODULOS_PESADOS = (
+    "core.step1_banco_consolidado",
+    "core.step2_gerar_espelhos",
+    "core.step3_resumos",
+    "core.exportacao",
+    "core.previa",
+    "core.upload_partes",
+)
+
+
+def pre_carregar() -> None:
+    for nome in MODULOS_PESADOS:
+        importlib.import_module(nome)
 
 # =========================
 # CONFIG
@@ -30,13 +58,70 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STORAGE_DIR = os.path.join(BASE_DIR, "storage")
 WORKSPACES_DIR = os.path.join(STORAGE_DIR, "workspaces")
 DOWNLOADS_DIR = os.path.join(STORAGE_DIR, "downloads")
+# travas por sessão: fora do workspace, que é apagado no reset
+TRAVAS_DIR = os.path.join(STORAGE_DIR, "travas")
 
 MODELO_PATH = os.path.join(BASE_DIR, "modelo", "modelo.xlsx")
 
-ALLOWED_EXTENSIONS = {".xlsx"}
+# motoristas e fechamento: .xlsx, .csv ou .parquet (core/entrada.py)
+ALLOWED_EXTENSIONS = {".xlsx", ".csv", ".parquet"}
+MSG_EXTENSOES = "Apenas arquivos .xlsx, .csv ou .parquet são aceitos."
+
+# CSV do Step1: encoding ("utf-8-sig", "cp1252"...) e delimitador (";", ","...). Vazio = detectar.
+CSV_ENCODING = os.environ.get("CSV_ENCODING", "")
+CSV_DELIMITADOR = os.environ.get("CSV_DELIMITADOR", "")
+
+# Step1 em blocos (fechamentos muito grandes). 0 = lê tudo de uma vez.
+BANCO_LINHAS_POR_BLOCO = int(os.environ.get("BANCO_LINHAS_POR_BLOCO", "0"))
+
+# Cache das abas de motorista entre execuções, compartilhado entre sessões
+# (ex: storage/cache_abas). Vazio desliga (padrão).
+ESPELHOS_CACHE_DIR = os.environ.get("ESPELHOS_CACHE_DIR", "")
+ESPELHOS_CACHE_MAX = int(os.environ.get("ESPELHOS_CACHE_MAX", "20000"))
+
+# Motor do Step2: "openpyxl" (copia o modelo) ou "xml" (sheet XML direto, bem mais rápido)
+ESPELHOS_MOTOR = os.environ.get("ESPELHOS_MOTOR", "openpyxl")
+
+# Step2 com memória constante: cada aba vai para o arquivo assim que fica pronta (usa o motor "xml")
+ESPELHOS_STREAMING = os.environ.get("ESPELHOS_STREAMING", "0") == "1"
+
+# Processos para renderizar as abas do Step2 (0 = um por núcleo; >1 usa o motor "xml").
+# No worker gthread (--threads do Procfile) os processos vêm do forkserver, não de
+# fork, e cada um relê banco e modelo antes de começar: compensa com muitos motoristas.
+ESPELHOS_WORKERS = int(os.environ.get("ESPELHOS_WORKERS", "1"))
+
+# Acima desse número de motoristas a saída vira vários arquivos (faixas alfabéticas)
+# + RESUMO_GERAL.xlsx, entregues num ZIP. 0 = sempre um arquivo só.
+ESPELHOS_MAX_ABAS_POR_ARQUIVO = int(os.environ.get("ESPELHOS_MAX_ABAS_POR_ARQUIVO", "0"))
+
+# Step2 grava as abas prontas no workspace a cada N abas; se o worker cair (timeout),
+# o próximo clique em "Gerar Espelhos" continua de onde parou. 0 desliga (padrão).
+# Ligado, usa o motor "xml" (ESPELHOS_MOTOR=openpyxl não vale com checkpoint).
+ESPELHOS_CHECKPOINT_CADA = int(os.environ.get("ESPELHOS_CHECKPOINT_CADA", "0"))
+
+# Step3 grava o resultado das fórmulas junto delas (leitura sem Excel / sem recálculo ao abrir)
+RESUMO_VALORES_EM_CACHE = os.environ.get("RESUMO_VALORES_EM_CACHE", "0") == "1"
+
+# Step3 escreve um bloco de totais em células fixas de cada aba de motorista e o
+# RESUMO/RESUMO TOTAL só referenciam essas células (fórmulas curtas, recálculo mais leve)
+RESUMO_BLOCO_TOTAIS = os.environ.get("RESUMO_BLOCO_TOTAIS", "0") == "1"
+
+# Apelidos de motorista aceitos na conciliação (GET/POST /conciliacao): nome do fechamento
+# -> nome do motoristas, aplicados no passo 1 das próximas execuções. Vazio desliga.
+ALIASES_MOTORISTAS = os.environ.get("ALIASES_MOTORISTAS", os.path.join(STORAGE_DIR, "aliases_motoristas.json"))
+
+# Histórico (SQLite) dos totais de cada execução concluída no passo 3, consultado em
+# GET /historico ou `python -m core.historico consultar`. Vazio desliga.
+HISTORICO_DB = os.environ.get("HISTORICO_DB", os.path.join(STORAGE_DIR, "historico.sqlite3"))
+
+# Perfil sob demanda (admin): POST /step1|step2|step3?perfil=<PERFIL_TOKEN> (ou header
+# X-Perfil-Token) roda o passo com profiler e grava .prof/.folded/.txt em
+# <workspace>/perfis (listar/baixar em GET /perfis?perfil=<token>). Vazio desliga.
+PERFIL_TOKEN = os.environ.get("PERFIL_TOKEN", "")
 
 os.makedirs(WORKSPACES_DIR, exist_ok=True)
 os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+os.makedirs(TRAVAS_DIR, exist_ok=True)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "troque-essa-chave-em-producao")
@@ -93,8 +178,203 @@ def load_state() -> dict:
 
 
 def save_state(state: dict) -> None:
-    with open(_state_path(), "w", encoding="utf-8") as f:
+    # grava e troca: quem lê ao mesmo tempo nunca vê o JSON pela metade
+    p = _state_path()
+    tmp = f"{p}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, p)
+
+
+PASSO_EM_ANDAMENTO = "Já há um passo em andamento nesta sessão. Aguarde ele terminar."
+
+
+def _trava_da_sessao(compartilhada: bool = False) -> TravaArquivo:
+    return TravaArquivo(os.path.join(TRAVAS_DIR, f"{_get_sid()}.lock"), compartilhada=compartilhada)
+
+
+def _sessao_ocupada(resposta_json: bool):
+    if resposta_json:
+        return _erro_json(RuntimeError(PASSO_EM_ANDAMENTO), 409)
+    flash(PASSO_EM_ANDAMENTO, "error")
+    return redirect(url_for("index"))
+
+
+# <travas>/<sid>.passo.json: qual requisição está com a trava exclusiva agora;
+# <travas>/<sid>.resultado.json: o que a última devolveu (flashes e resposta),
+# para uma repetição dela receber o mesmo resultado sem refazer o passo.
+def _travas_json(nome: str) -> str:
+    return os.path.join(TRAVAS_DIR, f"{_get_sid()}.{nome}.json")
+
+
+def _gravar_travas_json(nome: str, dados: dict) -> None:
+    p = _travas_json(nome)
+    tmp = f"{p}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(tmp, p)
+
+
+def _ler_travas_json(nome: str) -> dict:
+    try:
+        with open(_travas_json(nome), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _chave_da_requisicao() -> str:
+    # mesma rota com os mesmos parâmetros (ex: concluir o mesmo upload_id)
+    return json.dumps([request.endpoint, request.view_args or {}], sort_keys=True)
+
+
+def _repetir_resultado(resultado: dict):
+    for categoria, mensagem in resultado.get("mensagens", []):
+        flash(mensagem, categoria)
+    if resultado.get("corpo") is not None:
+        return Response(resultado["corpo"], status=resultado["status"], mimetype=resultado["mimetype"])
+    return redirect(resultado.get("location") or url_for("index"))
+
+
+def exclusivo_por_sessao(resposta_json: bool = False):
+    """
+    Um passo de cada vez por sessão (entre threads e workers), sessões
+    diferentes em paralelo.
+
+    Repetição do passo que está rodando (duplo clique, reenvio, duas abas) é
+    juntada a ele: espera a trava e devolve o resultado daquela execução (os
+    mesmos flashes e a mesma resposta) em vez de fazer o trabalho de novo.
+    Um passo diferente responde na hora (flash + redirect, ou 409 com
+    resposta_json): esperar prenderia uma thread do worker sem necessidade.
+    """
+    def decorador(fn):
+        @wraps(fn)
+        def executar(*args, **kwargs):
+            if not is_logged_in():
+                return fn(*args, **kwargs)
+
+            chave = _chave_da_requisicao()
+            trava = _trava_da_sessao()
+            if not trava.adquirir(bloquear=False):
+                em_andamento = _ler_travas_json("passo")
+                if em_andamento.get("chave") != chave:
+                    return _sessao_ocupada(resposta_json)
+                trava.adquirir()
+                resultado = _ler_travas_json("resultado")
+                if resultado.get("id") == em_andamento.get("id"):
+                    trava.liberar()
+                    return _repetir_resultado(resultado)
+                # a execução em andamento não terminou (worker morto): roda de novo
+
+            try:
+                execucao = uuid.uuid4().hex
+                _gravar_travas_json("passo", {"id": execucao, "chave": chave})
+                antes = len(session.get("_flashes", []))
+
+                resposta = app.make_response(fn(*args, **kwargs))
+
+                _gravar_travas_json("resultado", {
+                    "id": execucao,
+                    "mensagens": session.get("_flashes", [])[antes:],
+                    "status": resposta.status_code,
+                    "mimetype": resposta.mimetype,
+                    "location": resposta.headers.get("Location"),
+                    "corpo": resposta.get_data(as_text=True) if resposta.is_json else None,
+                })
+                os.remove(_travas_json("passo"))
+                return resposta
+            finally:
+                trava.liberar()
+
+        return executar
+
+    return decorador
+
+
+def leitura_por_sessao(resposta_json: bool = False):
+    """
+    Rotas que leem as saídas dos passos (banco, espelhos, arquivo final):
+    trava compartilhada da sessão, para não ler um arquivo que um passo está
+    regravando. Com um passo rodando responde na hora, como exclusivo_por_sessao.
+    """
+    def decorador(fn):
+        @wraps(fn)
+        def executar(*args, **kwargs):
+            if not is_logged_in():
+                return fn(*args, **kwargs)
+
+            trava = _trava_da_sessao(compartilhada=True)
+            if not trava.adquirir(bloquear=False):
+                return _sessao_ocupada(resposta_json)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                trava.liberar()
+
+        return executar
+
+    return decorador
+
+
+def perfil_autorizado() -> bool:
+    if not PERFIL_TOKEN or not is_logged_in():
+        return False
+    token = request.args.get("perfil") or request.headers.get("X-Perfil-Token") or ""
+    return hmac.compare_digest(token.encode("utf-8"), PERFIL_TOKEN.encode("utf-8"))
+
+
+def _perfis_dir() -> str:
+    return os.path.join(_ws_dir(), "perfis")
+
+
+def perfilavel(passo: str):
+    """
+    Com perfil_autorizado(), roda o passo dentro de core.perfil.Perfil:
+    o resultado do passo não muda, só ganha os arquivos do perfil no workspace.
+    """
+    def decorador(fn):
+        @wraps(fn)
+        def executar(*args, **kwargs):
+            if not perfil_autorizado():
+                return fn(*args, **kwargs)
+
+            from core.perfil import Perfil
+
+            with Perfil(_perfis_dir(), passo) as perfil:
+                resposta = fn(*args, **kwargs)
+            flash(f"Perfil do {passo} gravado ({perfil.duracao:.1f}s): {os.path.basename(perfil.arquivos['txt'])}", "ok")
+            return resposta
+
+        return executar
+
+    return decorador
+
+
+def _progresso_path() -> str:
+    return os.path.join(_ws_dir(), "progresso.json")
+
+
+def com_progresso(passo: str):
+    """
+    g.progresso = RegistroProgresso do passo (ao_progresso das funções do core),
+    transmitido ao navegador por SSE em GET /progresso. Encerrado ao sair da
+    rota; a rota registra o erro com g.progresso.concluir(erro=...).
+    """
+    def decorador(fn):
+        @wraps(fn)
+        def executar(*args, **kwargs):
+            if not is_logged_in():
+                return fn(*args, **kwargs)
+
+            g.progresso = RegistroProgresso(_progresso_path(), passo)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                g.progresso.concluir()
+
+        return executar
+
+    return decorador
 
 
 def require_uploaded_files(state: dict):
@@ -126,7 +406,7 @@ def _ensure_bytesio_at_start(bio: BytesIO) -> BytesIO:
 def _save_result_to_path(result, out_path: str) -> str:
     """
     Aceita retorno como:
-    - DataFrame-like (possui .to_excel) ✅
+    - DataFrame-like (possui .to_excel) ✅ -> gravado em fluxo (core/banco_xlsx.py)
     - BytesIO / filelike
     - bytes
     - str (path)
@@ -136,7 +416,9 @@ def _save_result_to_path(result, out_path: str) -> str:
 
     # ✅ DataFrame-like -> salva em XLSX (duck typing)
     if hasattr(result, "to_excel") and callable(getattr(result, "to_excel", None)):
-        result.to_excel(out_path, index=False)
+        from core.banco_xlsx import gravar_banco_xlsx
+
+        gravar_banco_xlsx(result, out_path)
         return out_path
 
     if _is_filelike(result):
@@ -223,6 +505,7 @@ def index():
 
 
 @app.route("/upload", methods=["POST"])
+@exclusivo_por_sessao()
 def upload():
     if not is_logged_in():
         return redirect(url_for("login"))
@@ -242,7 +525,7 @@ def upload():
         return redirect(url_for("index"))
 
     if not _ext_ok(motoristas_file.filename) or not _ext_ok(fechamento_file.filename):
-        flash("Apenas arquivos .xlsx são aceitos.", "error")
+        flash(MSG_EXTENSOES, "error")
         return redirect(url_for("index"))
 
     motoristas_name = secure_filename(motoristas_file.filename)
@@ -251,16 +534,29 @@ def upload():
     motoristas_path = os.path.join(ws, f"motoristas__{motoristas_name}")
     fechamento_path = os.path.join(ws, f"fechamento__{fechamento_name}")
 
+    # descontos em lote (opcional): aplicados nas abas no passo 2
+    descontos_file = request.files.get("descontos")
+    descontos_path = ""
+    if descontos_file and descontos_file.filename:
+        if not _ext_ok(descontos_file.filename):
+            flash(MSG_EXTENSOES, "error")
+            return redirect(url_for("index"))
+        descontos_path = os.path.join(ws, f"descontos__{secure_filename(descontos_file.filename)}")
+
     motoristas_file.save(motoristas_path)
     fechamento_file.save(fechamento_path)
+    if descontos_path:
+        descontos_file.save(descontos_path)
 
     state["uploaded"] = True
+    state["envio_aberto"] = False
     state["step1_done"] = False
     state["step2_done"] = False
     state["step3_done"] = False
     state["files"] = {
         "motoristas": motoristas_path,
         "fechamento": fechamento_path,
+        "descontos": descontos_path,
         "banco": "",
         "espelhos": "",
         "final": ""
@@ -271,7 +567,134 @@ def upload():
     return redirect(url_for("index"))
 
 
+# =========================
+# UPLOAD EM PARTES (retomável)
+# =========================
+# 1) POST /upload/partes {campo, nome, tamanho, tamanho_parte?, sha256?} -> status
+#    (o mesmo arquivo de novo retoma o upload: status["recebidas"])
+# 2) PUT /upload/partes/<id>/<i> corpo = bytes da parte, header X-Checksum-Sha256
+#    enviar primeiro as de status["prioridade"] (cabeçalho validado cedo)
+# 3) POST /upload/partes/<id>/concluir -> arquivo vai para o workspace
+def _uploads_dir() -> str:
+    d = os.path.join(_ws_dir(), "uploads")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _erro_json(e: Exception, codigo: int = 400):
+    return jsonify({"erro": str(e)}), codigo
+
+
+@app.route("/upload/partes", methods=["POST"])
+def upload_partes_iniciar():
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+
+    dados = request.get_json(silent=True) or request.form
+    try:
+        from core.upload_partes import TAMANHO_PARTE_PADRAO, UploadEmPartes
+
+        nome = secure_filename(dados.get("nome", ""))
+        if not nome or not _ext_ok(nome):
+            raise ValueError(MSG_EXTENSOES)
+        tamanho = int(dados.get("tamanho", 0))
+        if tamanho > app.config["MAX_CONTENT_LENGTH"]:
+            raise ValueError("Arquivo maior que o limite de 50MB.")
+
+        up = UploadEmPartes.iniciar(
+            _uploads_dir(),
+            dados.get("campo", ""),
+            nome,
+            tamanho,
+            tamanho_parte=int(dados.get("tamanho_parte") or 0) or TAMANHO_PARTE_PADRAO,
+            sha256=dados.get("sha256", ""),
+        )
+        return jsonify(up.status())
+    except Exception as e:
+        return _erro_json(e)
+
+
+@app.route("/upload/partes/<upload_id>", methods=["GET"])
+def upload_partes_status(upload_id):
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+    try:
+        from core.upload_partes import UploadEmPartes
+
+        return jsonify(UploadEmPartes(_uploads_dir(), upload_id).status())
+    except FileNotFoundError as e:
+        return _erro_json(e, 404)
+    except Exception as e:
+        return _erro_json(e)
+
+
+@app.route("/upload/partes/<upload_id>/<int:indice>", methods=["PUT"])
+def upload_partes_receber(upload_id, indice):
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+    try:
+        from core.upload_partes import UploadEmPartes
+
+        up = UploadEmPartes(_uploads_dir(), upload_id)
+        return jsonify(up.receber(indice, request.get_data(cache=False), request.headers.get("X-Checksum-Sha256", "")))
+    except FileNotFoundError as e:
+        return _erro_json(e, 404)
+    except Exception as e:
+        return _erro_json(e)
+
+
+@app.route("/upload/partes/<upload_id>/concluir", methods=["POST"])
+@exclusivo_por_sessao(resposta_json=True)
+def upload_partes_concluir(upload_id):
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+    try:
+        from core.upload_partes import UploadEmPartes
+
+        up = UploadEmPartes(_uploads_dir(), upload_id)
+        campo = up.meta["campo"]
+        destino = up.concluir(os.path.join(_ws_dir(), f"{campo}__{up.meta['nome']}"))
+    except FileNotFoundError as e:
+        return _erro_json(e, 404)
+    except Exception as e:
+        return _erro_json(e)
+
+    state = load_state()
+    files = state.get("files") or {}
+    if not state.get("envio_aberto"):
+        # primeiro arquivo de um envio novo (o envio fica aberto até um passo rodar):
+        # descontos do envio anterior não valem para este, em qualquer ordem de chegada
+        state["envio_aberto"] = True
+        if campo != "descontos" and files.get("descontos"):
+            if os.path.exists(files["descontos"]):
+                os.remove(files["descontos"])
+            files["descontos"] = ""
+    anterior = files.get(campo)
+    if anterior and anterior != destino and os.path.exists(anterior):
+        os.remove(anterior)
+    files[campo] = destino
+
+    state["files"] = files
+    state["uploaded"] = bool(files.get("motoristas") and files.get("fechamento"))
+    if campo == "descontos":
+        # só os espelhos mudam: o banco consolidado continua valendo
+        files.update({"espelhos": "", "espelhos_partes": [], "final": ""})
+    else:
+        files.update({"banco": "", "espelhos": "", "espelhos_partes": [], "final": ""})
+        state["step1_done"] = False
+    state["step2_done"] = False
+    state["step3_done"] = False
+    save_state(state)
+
+    if state["uploaded"]:
+        flash("Arquivos enviados com sucesso. Agora gere o banco consolidado.", "ok")
+    return jsonify({"ok": True, "campo": campo, "uploaded": state["uploaded"]})
+
+
 @app.route("/step1", methods=["POST"])
+@exclusivo_por_sessao()
+@perfilavel("step1")
+@com_progresso("step1")
 def step1():
     if not is_logged_in():
         return redirect(url_for("login"))
@@ -285,17 +708,55 @@ def step1():
         require_uploaded_files(state)
         ws = _ws_dir()
 
-        banco_path = os.path.join(ws, "banco_consolidado.xlsx")
+        from core.conciliacao import carregar_aliases
+        from core.step1_banco_consolidado import gerar_banco_consolidado
 
-        # ✅ Step1 web: NÃO passa saida_xlsx (sua função não aceita)
-        result = gerar_banco_consolidado(
-            motoristas_xlsx=state["files"]["motoristas"],
-            fechamento_xlsx=state["files"]["fechamento"],
-        )
+        banco_path = os.path.join(ws, "banco_consolidado.xlsx")
+        aliases = carregar_aliases(ALIASES_MOTORISTAS) if ALIASES_MOTORISTAS else None
+
+        if BANCO_LINHAS_POR_BLOCO > 0:
+            # modo streaming: grava direto em banco_path, memória ~ tamanho do bloco
+            result = gerar_banco_consolidado(
+                motoristas_xlsx=state["files"]["motoristas"],
+                fechamento_xlsx=state["files"]["fechamento"],
+                saida_xlsx_path=banco_path,
+                linhas_por_bloco=BANCO_LINHAS_POR_BLOCO,
+                ao_progresso=g.progresso,
+                encoding_csv=CSV_ENCODING or None,
+                delimitador_csv=CSV_DELIMITADOR or None,
+                aliases=aliases,
+            )
+        else:
+            # ✅ Step1 web: NÃO passa saida_xlsx (sua função não aceita)
+            result = gerar_banco_consolidado(
+                motoristas_xlsx=state["files"]["motoristas"],
+                fechamento_xlsx=state["files"]["fechamento"],
+                ao_progresso=g.progresso,
+                encoding_csv=CSV_ENCODING or None,
+                delimitador_csv=CSV_DELIMITADOR or None,
+                aliases=aliases,
+            )
+            g.progresso("salvar")
 
         banco_path = _save_result_to_path(result, banco_path)
 
+        # prévia e RESUMO TOTAL já saem do DataFrame em memória (sem reler o banco do disco)
+        if hasattr(result, "columns"):
+            banco_df = result.copy(deep=False)
+            banco_df.columns = banco_df.columns.str.strip().str.lower()
+            for nome, montar in _montadores_do_banco().items():
+                try:
+                    _gravar_json_do_banco(ws, nome, montar(banco_df))
+                except (ValueError, KeyError, OSError):
+                    # colunas que o montador não reconhece ou disco: a rota calcula do
+                    # arquivo, e o JSON de um banco anterior não pode ficar valendo
+                    app.logger.exception("Passo 1: %s.json não pré-calculado", nome)
+                    antigo = os.path.join(ws, f"{nome}.json")
+                    if os.path.exists(antigo):
+                        os.remove(antigo)
+
         state["files"]["banco"] = banco_path
+        state["envio_aberto"] = False
         state["step1_done"] = True
         state["step2_done"] = False
         state["step3_done"] = False
@@ -303,12 +764,16 @@ def step1():
 
         flash("Banco consolidado gerado. Agora gere os espelhos.", "ok")
     except Exception as e:
+        g.progresso.concluir(erro=str(e))
         flash(f"Erro no passo 1: {e}", "error")
 
     return redirect(url_for("index"))
 
 
 @app.route("/step2", methods=["POST"])
+@exclusivo_por_sessao()
+@perfilavel("step2")
+@com_progresso("step2")
 def step2():
     if not is_logged_in():
         return redirect(url_for("login"))
@@ -328,26 +793,75 @@ def step2():
         if not banco_path or not os.path.exists(banco_path):
             raise FileNotFoundError("banco_consolidado.xlsx não encontrado.")
 
+        from core.step2_gerar_espelhos import gerar_espelhos_motoristas
+
         espelhos_path = os.path.join(ws, "Espelhos_Motoristas.xlsx")
+        retomado = state.get("step2_checkpoint") or {}
+
+        def ao_checkpoint(feitas, total):
+            state["step2_checkpoint"] = {"abas": feitas, "total": total}
+            save_state(state)
 
         # ✅ Step2 web: sua função aceita 2 args (banco, modelo)
-        result = gerar_espelhos_motoristas(banco_path, MODELO_PATH)
+        result = gerar_espelhos_motoristas(
+            banco_path,
+            MODELO_PATH,
+            output_dir=ws,
+            cache_dir=ESPELHOS_CACHE_DIR or None,
+            cache_max_entradas=ESPELHOS_CACHE_MAX,
+            motor=ESPELHOS_MOTOR,
+            streaming=ESPELHOS_STREAMING,
+            workers=ESPELHOS_WORKERS,
+            max_abas_por_arquivo=ESPELHOS_MAX_ABAS_POR_ARQUIVO,
+            checkpoint_dir=os.path.join(ws, "checkpoint_step2") if ESPELHOS_CHECKPOINT_CADA > 0 else None,
+            checkpoint_cada=ESPELHOS_CHECKPOINT_CADA,
+            ao_checkpoint=ao_checkpoint,
+            ao_progresso=g.progresso,
+            descontos_input=state["files"].get("descontos") or None,
+        )
 
-        espelhos_path = _save_result_to_path(result, espelhos_path)
+        if isinstance(result, list):
+            # saída dividida: várias partes + RESUMO_GERAL.xlsx no workspace
+            state["files"]["espelhos_partes"] = result
+            espelhos_path = ""
+        else:
+            state["files"]["espelhos_partes"] = []
+            espelhos_path = _save_result_to_path(result, espelhos_path)
 
         state["files"]["espelhos"] = espelhos_path
+        state["envio_aberto"] = False
         state["step2_done"] = True
         state["step3_done"] = False
+        state.pop("step2_checkpoint", None)
         save_state(state)
 
-        flash("Espelhos gerados. Agora gere RESUMO e RESUMO TOTAL.", "ok")
+        if retomado:
+            flash(f"Espelhos gerados (continuado de {retomado['abas']} de {retomado['total']} abas já prontas). Agora gere RESUMO e RESUMO TOTAL.", "ok")
+        else:
+            flash("Espelhos gerados. Agora gere RESUMO e RESUMO TOTAL.", "ok")
     except Exception as e:
+        g.progresso.concluir(erro=str(e))
         flash(f"Erro no passo 2: {e}", "error")
 
     return redirect(url_for("index"))
 
 
+def _registrar_no_historico(banco_path: str) -> None:
+    if not HISTORICO_DB:
+        return
+    from core.historico import registrar_execucao
+
+    try:
+        registrar_execucao(HISTORICO_DB, banco_path, sessao=_get_sid(), origem=os.path.basename(banco_path))
+    except Exception as e:
+        # o passo 3 já terminou; histórico incompleto não impede o download
+        app.logger.warning("Histórico não registrado: %s", e)
+
+
 @app.route("/step3", methods=["POST"])
+@exclusivo_por_sessao()
+@perfilavel("step3")
+@com_progresso("step3")
 def step3():
     if not is_logged_in():
         return redirect(url_for("login"))
@@ -364,16 +878,51 @@ def step3():
         dl = _dl_dir()
 
         espelhos_path = state["files"].get("espelhos")
+        partes = state["files"].get("espelhos_partes") or []
         banco_path = state["files"].get("banco")
 
-        if not espelhos_path or not os.path.exists(espelhos_path):
+        if not partes and (not espelhos_path or not os.path.exists(espelhos_path)):
             raise FileNotFoundError("Espelhos_Motoristas.xlsx não encontrado.")
+        if not all(os.path.exists(p) for p in partes):
+            raise FileNotFoundError("Parte dos espelhos não encontrada.")
         if not banco_path or not os.path.exists(banco_path):
             raise FileNotFoundError("banco_consolidado.xlsx não encontrado.")
 
+        from core.step2_gerar_espelhos import ARQUIVO_RESUMO_GERAL
+        from core.step3_resumos import gerar_resumos
+
+        if partes:
+            # saída dividida: RESUMO/RESUMO TOTAL em cada parte, tudo num ZIP
+            for parte in partes:
+                gerar_resumos(
+                    espelhos_xlsx_path=parte,
+                    banco_consolidado_xlsx_path=banco_path,
+                    valores_em_cache=RESUMO_VALORES_EM_CACHE,
+                    bloco_totais=RESUMO_BLOCO_TOTAIS,
+                    ao_progresso=g.progresso,
+                )
+
+            final_path = os.path.join(dl, "Espelhos_Motoristas_FINAL.zip")
+            resumo_geral = os.path.join(os.path.dirname(partes[0]), ARQUIVO_RESUMO_GERAL)
+            with zipfile.ZipFile(final_path, "w", zipfile.ZIP_STORED) as zf:
+                zf.write(resumo_geral, ARQUIVO_RESUMO_GERAL)
+                for parte in partes:
+                    zf.write(parte, os.path.basename(parte))
+
+            state["files"]["final"] = final_path
+            state["step3_done"] = True
+            save_state(state)
+            _registrar_no_historico(banco_path)
+
+            flash("RESUMO e RESUMO TOTAL gerados em cada arquivo. Download liberado.", "ok")
+            return redirect(url_for("index"))
+
         result = gerar_resumos(
             espelhos_xlsx_path=espelhos_path,
             banco_consolidado_xlsx_path=banco_path,
+            valores_em_cache=RESUMO_VALORES_EM_CACHE,
+            bloco_totais=RESUMO_BLOCO_TOTAIS,
+            ao_progresso=g.progresso,
         )
 
         # garante que o arquivo final do step3 esteja escrito no mesmo espelhos_path
@@ -388,15 +937,18 @@ def step3():
         state["files"]["final"] = final_path
         state["step3_done"] = True
         save_state(state)
+        _registrar_no_historico(banco_path)
 
         flash("RESUMO e RESUMO TOTAL gerados. Download liberado.", "ok")
     except Exception as e:
+        g.progresso.concluir(erro=str(e))
         flash(f"Erro no passo 3: {e}", "error")
 
     return redirect(url_for("index"))
 
 
 @app.route("/download", methods=["GET"])
+@leitura_por_sessao()
 def download():
     if not is_logged_in():
         return redirect(url_for("login"))
@@ -414,7 +966,327 @@ def download():
         reset_flow_state()
         return response
 
-    return send_file(final_path, as_attachment=True, download_name="Espelhos_Motoristas.xlsx")
+    download_name = "Espelhos_Motoristas" + os.path.splitext(final_path)[1]
+    return send_file(final_path, as_attachment=True, download_name=download_name)
+
+
+@app.route("/download/zip", methods=["GET"])
+def download_zip():
+    """
+    Um .xlsx por motorista + RESUMO.xlsx, num ZIP enviado em streaming:
+    cada arquivo vai para a resposta assim que é renderizado.
+    Disponível a partir do passo 1 (não reinicia o fluxo).
+    """
+    if not is_logged_in():
+        return redirect(url_for("login"))
+
+    # trava compartilhada até o último pedaço do ZIP (o banco é lido durante o envio)
+    trava = _trava_da_sessao(compartilhada=True)
+    if not trava.adquirir(bloquear=False):
+        return _sessao_ocupada(False)
+
+    state = load_state()
+    try:
+        if not state.get("step1_done"):
+            raise ValueError("Faça o passo 1 antes.")
+
+        banco_path = state["files"].get("banco")
+        if not banco_path or not os.path.exists(banco_path):
+            raise FileNotFoundError("banco_consolidado.xlsx não encontrado.")
+
+        from core.step2_gerar_espelhos import gerar_espelhos_motoristas
+
+        pedacos = gerar_espelhos_motoristas(
+            banco_path,
+            MODELO_PATH,
+            output_dir=None,
+            cache_dir=ESPELHOS_CACHE_DIR or None,
+            cache_max_entradas=ESPELHOS_CACHE_MAX,
+            workers=ESPELHOS_WORKERS,
+            formato="zip",
+            descontos_input=state["files"].get("descontos") or None,
+        )
+    except Exception as e:
+        trava.liberar()
+        flash(f"Erro ao gerar o ZIP: {e}", "error")
+        return redirect(url_for("index"))
+
+    resposta = Response(
+        stream_with_context(pedacos),
+        mimetype="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="Espelhos_Motoristas.zip"'},
+    )
+    resposta.call_on_close(trava.liberar)
+    return resposta
+
+
+@app.route("/progresso", methods=["GET"])
+def progresso():
+    """
+    Progresso do passo em execução nesta sessão, por Server-Sent Events:
+    data: {"passo", "fase", "feitos", "total", ...} a cada mudança (ver core/progresso.py).
+    ?passo=step2 ignora eventos de outro passo.
+    """
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+
+    eventos = eventos_progresso(_progresso_path(), passo=request.args.get("passo", ""))
+    return Response(
+        stream_with_context(eventos),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/perfis", methods=["GET"])
+def perfis():
+    """Lista os perfis gravados no workspace (admin)."""
+    if not perfil_autorizado():
+        return _erro_json(PermissionError("Acesso negado."), 403)
+
+    pasta = _perfis_dir()
+    nomes = sorted(os.listdir(pasta), reverse=True) if os.path.isdir(pasta) else []
+    return jsonify({"perfis": [{"arquivo": n, "bytes": os.path.getsize(os.path.join(pasta, n))} for n in nomes]})
+
+
+@app.route("/perfis/<nome>", methods=["GET"])
+def perfil_arquivo(nome):
+    if not perfil_autorizado():
+        return _erro_json(PermissionError("Acesso negado."), 403)
+
+    caminho = os.path.join(_perfis_dir(), secure_filename(nome))
+    if not os.path.isfile(caminho):
+        return _erro_json(FileNotFoundError("Perfil não encontrado."), 404)
+    mimetype = "application/octet-stream" if caminho.endswith(".prof") else "text/plain"
+    return send_file(caminho, as_attachment=not caminho.endswith(".txt"), download_name=os.path.basename(caminho), mimetype=mimetype)
+
+
+# =========================
+# JSON CALCULADO DO BANCO (prévia, RESUMO TOTAL)
+# =========================
+# <workspace>/<nome>.json vale enquanto o banco_consolidado.xlsx não mudar;
+# o passo 1 já grava a partir do DataFrame em memória.
+def _montadores_do_banco() -> dict:
+    from core.exportacao import montar_resumo_total
+    from core.previa import montar_previa
+
+    return {"previa": montar_previa, "resumo_total": montar_resumo_total}
+
+
+def _gravar_json_do_banco(ws: str, nome: str, dados: dict) -> None:
+    tmp = os.path.join(ws, f"{nome}.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(ws, f"{nome}.json"))
+
+
+def _responder_json_do_banco(nome: str):
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+
+    state = load_state()
+    try:
+        if not state.get("step1_done"):
+            raise ValueError("Faça o passo 1 antes.")
+
+        banco_path = state["files"].get("banco")
+        if not banco_path or not os.path.exists(banco_path):
+            raise FileNotFoundError("banco_consolidado.xlsx não encontrado.")
+
+        ws = _ws_dir()
+        path = os.path.join(ws, f"{nome}.json")
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(banco_path):
+            with open(path, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        else:
+            dados = _montadores_do_banco()[nome](banco_path)
+            _gravar_json_do_banco(ws, nome, dados)
+    except Exception as e:
+        return _erro_json(e)
+
+    return jsonify(dados)
+
+
+@app.route("/previa", methods=["GET"])
+@leitura_por_sessao(resposta_json=True)
+def previa():
+    """
+    Prévia do Step2 (JSON): quantidade, valor bruto e valor por cliente de cada
+    motorista + campos bancários vazios (que sairiam INEXISTENTE na aba).
+    Calculada do banco consolidado com agregações do pandas: disponível a
+    partir do passo 1, antes de gerar os espelhos.
+    """
+    return _responder_json_do_banco("previa")
+
+
+@app.route("/resumo-total", methods=["GET"])
+@leitura_por_sessao(resposta_json=True)
+def resumo_total():
+    """
+    Matriz do RESUMO TOTAL (motorista x cliente, valor bruto e totais por
+    cliente) em JSON, do mesmo pivot que o Step3 usa. Disponível a partir do passo 1.
+    """
+    return _responder_json_do_banco("resumo_total")
+
+
+@app.route("/historico", methods=["GET"])
+def historico():
+    """
+    Totais de execuções passadas (JSON), sem abrir XLSX:
+      ?motorista=&cliente=   nome (sem diferenciar maiúsculas/acentos)
+      ?meses=6               últimos N meses da entrega (ou ?desde=AAAA-MM&ate=AAAA-MM)
+      ?por=mes|motorista|cliente|motorista_cliente|execucao
+      ?execucoes=1           lista as execuções registradas
+    """
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+
+    from core.historico import consultar, listar_execucoes, mes_inicial
+
+    try:
+        if not HISTORICO_DB:
+            raise ValueError("Histórico desligado (HISTORICO_DB vazio).")
+
+        args = request.args
+        if args.get("execucoes") == "1":
+            return jsonify({"execucoes": listar_execucoes(HISTORICO_DB, int(args.get("limite", "50")))})
+
+        meses = args.get("meses", "")
+        dados = consultar(
+            HISTORICO_DB,
+            motorista=args.get("motorista") or None,
+            cliente=args.get("cliente") or None,
+            desde=mes_inicial(int(meses)) if meses else args.get("desde") or None,
+            ate=args.get("ate") or None,
+            por=args.get("por", "mes"),
+        )
+    except Exception as e:
+        return _erro_json(e)
+
+    return jsonify(dados)
+
+
+def _nomes_para_conciliar(state: dict):
+    # (nomes no banco consolidado, nomes no motoristas)
+    from core.banco import identificar_colunas, ler_banco
+    from core.step1_banco_consolidado import ler_planilha
+
+    banco_path = state["files"].get("banco")
+    if not banco_path or not os.path.exists(banco_path):
+        raise FileNotFoundError("banco_consolidado.xlsx não encontrado.")
+    banco = ler_banco(banco_path)
+    motoristas = ler_planilha(
+        state["files"]["motoristas"], encoding_csv=CSV_ENCODING or None, delimitador_csv=CSV_DELIMITADOR or None
+    )
+    return banco[identificar_colunas(banco)["motorista"]], motoristas["nome do motorista"]
+
+
+@app.route("/conciliacao", methods=["GET"])
+@leitura_por_sessao(resposta_json=True)
+def conciliacao():
+    """
+    Motoristas do fechamento sem cadastro no motoristas (saem sem dados
+    bancários) e até 3 candidatos para cada um (core/conciliacao.py).
+    """
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+
+    state = load_state()
+    try:
+        if not state.get("step1_done"):
+            raise ValueError("Faça o passo 1 antes.")
+
+        from core.conciliacao import propor_correspondencias
+
+        nomes_banco, nomes_motoristas = _nomes_para_conciliar(state)
+        return jsonify({"nao_encontrados": propor_correspondencias(nomes_banco, nomes_motoristas)})
+    except FileNotFoundError as e:
+        return _erro_json(e, 404)
+    except Exception as e:
+        return _erro_json(e)
+
+
+@app.route("/conciliacao", methods=["POST"])
+@exclusivo_por_sessao(resposta_json=True)
+def conciliacao_aceitar():
+    """
+    {"aceitos": {nome no fechamento: nome no motoristas}}: grava os apelidos
+    (valem para as próximas execuções) e reabre o passo 1 para refazer o
+    banco consolidado com eles.
+    """
+    if not is_logged_in():
+        return _erro_json(PermissionError("Faça login."), 401)
+
+    state = load_state()
+    try:
+        if not ALIASES_MOTORISTAS:
+            raise ValueError("Apelidos de motorista desativados (ALIASES_MOTORISTAS).")
+        if not state.get("step1_done"):
+            raise ValueError("Faça o passo 1 antes.")
+
+        aceitos = (request.get_json(silent=True) or {}).get("aceitos") or {}
+        if not isinstance(aceitos, dict) or not aceitos:
+            raise ValueError("Nenhuma associação enviada.")
+
+        from core.conciliacao import salvar_aliases
+
+        _, nomes_motoristas = _nomes_para_conciliar(state)
+        cadastrados = set(nomes_motoristas.dropna().map(str))
+        invalidos = [para for para in aceitos.values() if para and str(para) not in cadastrados]
+        if invalidos:
+            raise ValueError(f"Motorista(s) fora do cadastro: {', '.join(map(str, invalidos[:10]))}.")
+
+        salvar_aliases(ALIASES_MOTORISTAS, aceitos)
+    except FileNotFoundError as e:
+        return _erro_json(e, 404)
+    except Exception as e:
+        return _erro_json(e)
+
+    state["step1_done"] = False
+    state["step2_done"] = False
+    state["step3_done"] = False
+    state["files"].update({"espelhos": "", "espelhos_partes": [], "final": ""})
+    save_state(state)
+
+    flash(f"{len(aceitos)} associação(ões) salva(s). Gere o banco consolidado de novo para aplicá-las.", "ok")
+    return jsonify({"ok": True, "salvos": len(aceitos)})
+
+
+@app.route("/exportar/<formato>", methods=["GET"])
+@leitura_por_sessao()
+def exportar(formato):
+    """
+    Totais por motorista/cliente + dados bancários (CSV ou JSON) para o sistema de pagamento.
+    Calculado direto do banco consolidado: disponível a partir do passo 1.
+    """
+    if not is_logged_in():
+        return redirect(url_for("login"))
+
+    state = load_state()
+    try:
+        from core.exportacao import FORMATOS_EXPORTACAO, exportar_pagamentos
+
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError("Formato de exportação inválido.")
+        if not state.get("step1_done"):
+            raise ValueError("Faça o passo 1 antes.")
+
+        banco_path = state["files"].get("banco")
+        if not banco_path or not os.path.exists(banco_path):
+            raise FileNotFoundError("banco_consolidado.xlsx não encontrado.")
+
+        conteudo = exportar_pagamentos(banco_path, formato, descontos=state["files"].get("descontos") or None)
+    except Exception as e:
+        flash(f"Erro na exportação: {e}", "error")
+        return redirect(url_for("index"))
+
+    mimetype = "text/csv" if formato == "csv" else "application/json"
+    return send_file(
+        BytesIO(conteudo),
+        as_attachment=True,
+        download_name=f"pagamentos.{formato}",
+        mimetype=mimetype,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+"""
+Benchmark da conciliação de nomes (core/conciliacao.py).
+
+Gera um cadastro sintético de motoristas (nome + sobrenomes comuns) e nomes de
+fechamento com erros de digitação (letra trocada/faltando/sobrando, acento,
+palavras fora de ordem). Compara o índice de blocagem com a comparação contra
+todos os nomes: tempo por nome e acerto do primeiro candidato.
+
+Todos contra todos é lento: roda numa amostra e o tempo total é estimado.
+
+Uso (na raiz do projeto):
+    python bench/bench_conciliacao.py [--cadastro 5000] [--nomes 1000] [--amostra 100]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.banco import norm_nome_key  # noqa: E402
+from core.conciliacao import IndiceNomes, similaridade  # noqa: E402
+
+PRIMEIROS = [
+    "JOÃO", "JOSÉ", "ANTÔNIO", "FRANCISCO", "CARLOS", "PAULO", "PEDRO", "LUCAS", "LUIZ", "MARCOS",
+    "MARIA", "ANA", "FRANCISCA", "ANTÔNIA", "ADRIANA", "JULIANA", "MÁRCIA", "FERNANDA", "PATRÍCIA", "ALINE",
+    "RAFAEL", "DANIEL", "MARCELO", "BRUNO", "EDUARDO", "FELIPE", "RAIMUNDO", "RODRIGO", "MANOEL", "MATEUS",
+]
+MEIOS = ["", "", "DA", "DE", "DOS", "APARECIDA", "CARLOS", "HENRIQUE", "EDUARDO", "CRISTINA", "AUGUSTO"]
+SOBRENOMES = [
+    "SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "RODRIGUES", "FERREIRA", "ALVES", "PEREIRA", "LIMA", "GOMES",
+    "COSTA", "RIBEIRO", "MARTINS", "CARVALHO", "ALMEIDA", "LOPES", "SOARES", "FERNANDES", "VIEIRA", "BARBOSA",
+    "ROCHA", "DIAS", "NASCIMENTO", "ANDRADE", "MOREIRA", "NUNES", "MARQUES", "MACHADO", "MENDES", "FREITAS",
+]
+
+
+def gerar_cadastro(n: int, rnd: random.Random) -> list:
+    nomes = set()
+    while len(nomes) < n:
+        partes = [rnd.choice(PRIMEIROS), rnd.choice(MEIOS), rnd.choice(SOBRENOMES), rnd.choice(SOBRENOMES)]
+        nomes.add(" ".join(p for p in partes if p))
+    return sorted(nomes)
+
+
+def com_erro(nome: str, rnd: random.Random) -> str:
+    tipo = rnd.randrange(5)
+    if tipo == 0:  # sem acento / minúsculo
+        return norm_nome_key(nome).upper()
+    if tipo == 1:  # palavras fora de ordem
+        palavras = nome.split()
+        return " ".join(palavras[-1:] + palavras[:-1])
+    i = rnd.randrange(1, len(nome) - 1)
+    if tipo == 2:  # letra faltando
+        return nome[:i] + nome[i + 1:]
+    if tipo == 3:  # letra trocada
+        return nome[:i] + rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") + nome[i + 1:]
+    return nome[:i] + nome[i] + nome[i:]  # letra repetida
+
+
+def todos_contra_todos(nome: str, cadastro: list):
+    chave = norm_nome_key(nome)
+    return max(cadastro, key=lambda c: similaridade(chave, norm_nome_key(c)))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cadastro", type=int, default=5000)
+    ap.add_argument("--nomes", type=int, default=1000)
+    ap.add_argument("--amostra", type=int, default=100)
+    args = ap.parse_args()
+
+    rnd = random.Random(1)
+    cadastro = gerar_cadastro(args.cadastro, rnd)
+    certos = rnd.sample(cadastro, min(args.nomes, len(cadastro)))
+    digitados = [com_erro(n, rnd) for n in certos]
+
+    t = time.perf_counter()
+    indice = IndiceNomes(cadastro)
+    t_indice = time.perf_counter() - t
+
+    t = time.perf_counter()
+    propostas = [indice.candidatos(n, limite=1) for n in digitados]
+    t_blocagem = time.perf_counter() - t
+    acertos = sum(1 for p, certo in zip(propostas, certos) if p and p[0][0] == certo)
+
+    amostra = list(zip(digitados, certos))[: args.amostra]
+    t = time.perf_counter()
+    acertos_todos = sum(1 for n, certo in amostra if todos_contra_todos(n, cadastro) == certo)
+    t_todos = (time.perf_counter() - t) / len(amostra) * len(digitados)
+
+    print(f"cadastro {len(cadastro)} nomes, {len(digitados)} nomes com erro")
+    print(f"blocagem          {t_indice + t_blocagem:8.2f}s (índice {t_indice:.2f}s)  acerto {acertos / len(digitados):6.1%}")
+    print(
+        f"todos x todos     {t_todos:8.2f}s (estimado de {len(amostra)})  acerto {acertos_todos / len(amostra):6.1%}  "
+        f"({t_todos / (t_indice + t_blocagem):5.1f}x mais lento)"
+    )
+
+
+if __name__ == "__main__":
+    main()
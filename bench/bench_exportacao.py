@@ -0,0 +1,94 @@
+"""
+Benchmark da gravação do banco_consolidado.xlsx.
+
+Monta o banco com o Step1 a partir de entradas sintéticas (mesmo gerador do
+bench_step2) e grava com o DataFrame.to_excel (openpyxl, como era) e com o
+gravar_banco_xlsx (core/banco_xlsx.py, em fluxo). Para cada um mede tempo,
+pico de memória alocada no Python (tracemalloc) e tamanho do arquivo, e confere
+que o pd.read_excel devolve o mesmo DataFrame.
+
+Uso (na raiz do projeto):
+    python bench/bench_exportacao.py [--motoristas 500] [--linhas 50000] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_step2 import gerar_entradas  # noqa: E402
+from core.banco_xlsx import gravar_banco_xlsx  # noqa: E402
+from core.step1_banco_consolidado import gerar_banco_consolidado  # noqa: E402
+
+# nome -> gravar(df, path)
+GRAVADORES = {
+    "to_excel": lambda df, p: df.to_excel(p, index=False),
+    "banco_xlsx": lambda df, p: gravar_banco_xlsx(df, p),
+}
+
+
+def melhor_tempo(fn, repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - t)
+    return melhor
+
+
+def pico_memoria(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def como_texto(df: pd.DataFrame) -> pd.DataFrame:
+    return df.apply(lambda c: c.astype(object).where(c.notna(), "").map(repr))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--motoristas", type=int, default=500)
+    ap.add_argument("--linhas", type=int, default=50000)
+    ap.add_argument("--repeticoes", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"Gerando {args.linhas} linhas / {args.motoristas} motoristas...")
+        gerar_entradas(pasta, args.motoristas, args.linhas)
+        banco = gerar_banco_consolidado(
+            os.path.join(pasta, "motoristas.xlsx"), os.path.join(pasta, "fechamento.xlsx")
+        )
+
+        referencia = None
+        base = None
+        for nome, gravar in GRAVADORES.items():
+            path = os.path.join(pasta, f"banco_{nome}.xlsx")
+            t = melhor_tempo(lambda: gravar(banco, path), args.repeticoes)
+            pico = pico_memoria(lambda: gravar(banco, path))
+
+            lido = pd.read_excel(path)
+            if referencia is None:
+                referencia, base = lido, t
+                igual = "referência"
+            else:
+                mesmo = list(lido.columns) == list(referencia.columns) and lido.dtypes.equals(referencia.dtypes)
+                igual = "igual" if mesmo and como_texto(lido).equals(como_texto(referencia)) else "DIFERENTE"
+
+            tamanho = os.path.getsize(path) / 1024 / 1024
+            print(
+                f"{nome:11s} {t:7.3f}s ({base / t:5.1f}x)  pico {pico:7.1f} MB  "
+                f"arquivo {tamanho:6.2f} MB  leitura {igual}"
+            )
+
+
+if __name__ == "__main__":
+    main()
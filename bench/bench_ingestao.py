@@ -0,0 +1,87 @@
+"""
+Benchmark da leitura das entradas do Step1 em cada formato.
+
+Gera motoristas + fechamento sintéticos (mesmo gerador do bench_step2) e
+grava cada um em .xlsx, CSV (utf-8 com ","), CSV do Excel em português
+(cp1252 com ";" e vírgula decimal) e .parquet. Para cada formato mede a
+leitura do fechamento e o Step1 inteiro (gerar_banco_consolidado), e confere
+que o banco consolidado sai igual ao do .xlsx.
+
+Uso (na raiz do projeto):
+    python bench/bench_ingestao.py [--motoristas 500] [--linhas 50000] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_step2 import gerar_entradas  # noqa: E402
+from core.step1_banco_consolidado import gerar_banco_consolidado, ler_planilha  # noqa: E402
+
+# nome -> (extensão, gravar(df, path))
+FORMATOS = {
+    "xlsx": (".xlsx", lambda df, p: df.to_excel(p, index=False)),
+    "csv utf-8 ,": (".csv", lambda df, p: df.to_csv(p, index=False, date_format="%d/%m/%Y")),
+    "csv cp1252 ;": (
+        ".csv",
+        lambda df, p: df.to_csv(p, index=False, sep=";", decimal=",", encoding="cp1252", date_format="%d/%m/%Y"),
+    ),
+    "parquet": (".parquet", lambda df, p: df.to_parquet(p, index=False)),
+}
+
+
+def melhor_tempo(fn, repeticoes: int):
+    melhor, resultado = float("inf"), None
+    for _ in range(repeticoes):
+        t = time.perf_counter()
+        resultado = fn()
+        melhor = min(melhor, time.perf_counter() - t)
+    return melhor, resultado
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--motoristas", type=int, default=500)
+    ap.add_argument("--linhas", type=int, default=50000)
+    ap.add_argument("--repeticoes", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"Gerando {args.linhas} linhas / {args.motoristas} motoristas...")
+        gerar_entradas(pasta, args.motoristas, args.linhas)
+        motoristas = pd.read_excel(os.path.join(pasta, "motoristas.xlsx"))
+        fechamento = pd.read_excel(os.path.join(pasta, "fechamento.xlsx"))
+
+        referencia = None
+        base = None
+        for i, (nome, (ext, gravar)) in enumerate(FORMATOS.items()):
+            p_mot = os.path.join(pasta, f"motoristas_{i}{ext}")
+            p_fech = os.path.join(pasta, f"fechamento_{i}{ext}")
+            gravar(motoristas, p_mot)
+            gravar(fechamento, p_fech)
+
+            t_leitura, _ = melhor_tempo(lambda: ler_planilha(p_fech), args.repeticoes)
+            t_step1, banco = melhor_tempo(lambda: gerar_banco_consolidado(p_mot, p_fech), args.repeticoes)
+
+            # compara como texto: "1234" no .xlsx (célula de texto) e 1234 no CSV saem iguais na aba
+            banco = banco.apply(lambda c: c.astype(object).where(c.notna(), "").map(str))
+            if referencia is None:
+                referencia, base = banco, t_step1
+                igual = "referência"
+            else:
+                igual = "igual" if banco.equals(referencia) else "DIFERENTE"
+
+            tamanho = os.path.getsize(p_fech) / 1024 / 1024
+            print(
+                f"{nome:13s} {tamanho:6.2f} MB  leitura {t_leitura:7.3f}s  step1 {t_step1:7.3f}s  "
+                f"({base / t_step1:5.1f}x)  banco {igual}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Tempo de inicialização do app.
+
+1) import do app.py num processo novo (sem pandas/openpyxl) e primeira resposta do /login
+2) import dos módulos pesados (o que o pre_carregar() faz no master do gunicorn)
+3) gunicorn de verdade, com e sem pré-carregamento: tempo até o primeiro /login
+   responder e tempo de boot de cada worker (log "Worker ... pronto em")
+
+Uso (na raiz do projeto):
+    python bench/bench_inicio.py [--workers 2] [--repeticoes 3]
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SONDA = r"""
+import sys, time
+t = time.perf_counter()
+import app
+t_import = time.perf_counter() - t
+t = time.perf_counter()
+r = app.app.test_client().get("/login")
+t_login = time.perf_counter() - t
+pesados = "pandas" in sys.modules or "openpyxl" in sys.modules
+t = time.perf_counter()
+app.pre_carregar()
+t_pesados = time.perf_counter() - t
+print(t_import, t_login, r.status_code, int(pesados), t_pesados)
+"""
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def medir_import():
+    out = subprocess.run([sys.executable, "-c", _SONDA], cwd=RAIZ, capture_output=True, text=True, check=True)
+    t_import, t_login, status, pesados, t_pesados = out.stdout.split()
+    return float(t_import), float(t_login), int(status), pesados == "1", float(t_pesados)
+
+
+def medir_gunicorn(workers: int, pre_carregar: bool):
+    porta = porta_livre()
+    env = dict(os.environ, GUNICORN_PRE_CARREGAR="1" if pre_carregar else "0")
+    cmd = [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "--config", "gunicorn.conf.py",
+        "--workers", str(workers),
+        "--bind", f"127.0.0.1:{porta}",
+    ]
+    t = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=RAIZ, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{porta}/login", timeout=1) as r:
+                    r.read()
+                break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - t > 60:
+                    raise RuntimeError("gunicorn não subiu")
+                time.sleep(0.01)
+        t_primeira = time.perf_counter() - t
+        time.sleep(0.5)  # deixa os outros workers logarem
+    finally:
+        proc.terminate()
+        log = proc.communicate(timeout=30)[0]
+
+    boots = [float(x) for x in re.findall(r"pronto em ([\d.]+)s", log)]
+    return t_primeira, boots
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--repeticoes", type=int, default=3)
+    args = ap.parse_args()
+
+    for _ in range(args.repeticoes):
+        t_import, t_login, status, pesados, t_pesados = medir_import()
+        print(
+            f"import app {t_import:6.3f}s  /login {t_login:6.3f}s ({status})  "
+            f"pandas/openpyxl carregados: {'sim' if pesados else 'não'}  módulos pesados {t_pesados:6.3f}s"
+        )
+
+    for pre in (True, False):
+        for _ in range(args.repeticoes):
+            t_primeira, boots = medir_gunicorn(args.workers, pre)
+            boot = ", ".join(f"{b:.3f}s" for b in boots) or "-"
+            print(f"gunicorn pré-carregar={'sim' if pre else 'não'}  1º /login {t_primeira:6.3f}s  boot dos workers: {boot}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark das referências do RESUMO/RESUMO TOTAL (Step3) com e sem bloco de totais.
+
+Gera entradas sintéticas (gerador do bench_step2), roda o Step2 uma vez e o
+Step3 em cópias do mesmo espelhos: com referências de intervalo em outra aba
+(padrão) e com bloco_totais=True. Mede o tempo do Step3, o tamanho do arquivo,
+o XML das abas RESUMO e RESUMO TOTAL, e quantas células de outras abas as
+fórmulas delas referenciam (o que entra no grafo de dependências do Excel).
+Confere que os totais (fórmulas avaliadas, bench/equivalencia.py) saem iguais.
+
+Uso (na raiz do projeto):
+    python bench/bench_resumo.py [--motoristas 1000] [--linhas 40000]
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from openpyxl import load_workbook
+from openpyxl.utils import range_boundaries
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_step2 import MODELO, gerar_entradas  # noqa: E402
+from core.step2_gerar_espelhos import gerar_espelhos_motoristas  # noqa: E402
+from core.step3_resumos import gerar_resumos  # noqa: E402
+from equivalencia import totais_resumo  # noqa: E402
+
+_RE_REF_OUTRA_ABA = re.compile(r"'(?:[^']|'')+'!\$?([A-Z]{1,3})\$?(\d+)(?::\$?([A-Z]{1,3})\$?(\d+))?")
+
+
+def xml_das_abas(path: str, nomes: tuple) -> int:
+    """Bytes (descomprimidos) do sheet XML das abas `nomes`."""
+    wb = load_workbook(path, read_only=True)
+    indices = [wb.sheetnames.index(n) for n in nomes]
+    wb.close()
+    with zipfile.ZipFile(path) as zf:
+        return sum(zf.getinfo(f"xl/worksheets/sheet{i + 1}.xml").file_size for i in indices)
+
+
+def celulas_referenciadas(path: str, nomes: tuple) -> int:
+    """Células de outras abas referenciadas pelas fórmulas das abas `nomes`."""
+    wb = load_workbook(path, read_only=True)
+    total = 0
+    for nome in nomes:
+        for linha in wb[nome].iter_rows(values_only=True):
+            for v in linha:
+                if not (isinstance(v, str) and v.startswith("=")):
+                    continue
+                for m in _RE_REF_OUTRA_ABA.finditer(v):
+                    if m.group(3):
+                        c1, r1, c2, r2 = range_boundaries(f"{m.group(1)}{m.group(2)}:{m.group(3)}{m.group(4)}")
+                        total += (c2 - c1 + 1) * (r2 - r1 + 1)
+                    else:
+                        total += 1
+    wb.close()
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--motoristas", type=int, default=1000)
+    ap.add_argument("--linhas", type=int, default=40000)
+    args = ap.parse_args()
+
+    abas = ("RESUMO", "RESUMO TOTAL")
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"Gerando {args.linhas} linhas / {args.motoristas} motoristas...")
+        banco = gerar_entradas(pasta, args.motoristas, args.linhas)
+        espelhos = gerar_espelhos_motoristas(banco, MODELO, output_dir=pasta, motor="xml")
+
+        referencia = None
+        for nome, bloco in (("intervalos", False), ("bloco_totais", True)):
+            destino = os.path.join(pasta, f"final_{nome}.xlsx")
+            shutil.copyfile(espelhos, destino)
+
+            t = time.perf_counter()
+            gerar_resumos(destino, banco, bloco_totais=bloco)
+            t_step3 = time.perf_counter() - t
+
+            totais = totais_resumo(load_workbook(destino))
+            if referencia is None:
+                referencia = totais
+                igual = "referência"
+            else:
+                igual = "iguais" if totais == referencia else "DIFERENTES"
+
+            print(
+                f"{nome:13s} step3 {t_step3:6.2f}s  arquivo {os.path.getsize(destino) / 1024 / 1024:6.2f} MB  "
+                f"XML RESUMO+TOTAL {xml_das_abas(destino, abas) / 1024:8.1f} KB  "
+                f"células de outras abas {celulas_referenciadas(destino, abas):8d}  totais {igual}"
+            )
+
+
+if __name__ == "__main__":
+    main()
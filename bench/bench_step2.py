@@ -0,0 +1,89 @@
+"""
+Benchmark do Step2 com 1..N processos (workers).
+
+Gera um fechamento sintético, monta o banco com o Step1 e roda o Step2 com
+cada quantidade de workers, mostrando tempo e ganho em relação a 1 worker.
+
+Uso (na raiz do projeto):
+    python bench/bench_step2.py [--motoristas 500] [--linhas 20000] [--workers 1,2,4]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.step1_banco_consolidado import gerar_banco_consolidado  # noqa: E402
+from core.step2_gerar_espelhos import gerar_espelhos_motoristas  # noqa: E402
+
+MODELO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modelo", "modelo.xlsx")
+
+
+def gerar_entradas(pasta: str, n_motoristas: int, n_linhas: int, seed: int = 1, sem_cliente: float = 0.0):
+    """
+    motoristas.xlsx, fechamento.xlsx e banco.xlsx sintéticos em `pasta`.
+    sem_cliente: fração das linhas do fechamento com Cliente vazio.
+    """
+    rnd = random.Random(seed)
+    nomes = [f"MOTORISTA {i:04d}" for i in range(n_motoristas)]
+
+    motoristas = pd.DataFrame([
+        {"Nome do Motorista": n, "Contrato": f"C-{i}", "CPF": f"{i:011d}", "Banco": "001", "Agencia": "1234", "Conta": f"{i}-0", "PIX": f"pix{i}"}
+        for i, n in enumerate(nomes)
+    ])
+    fechamento = pd.DataFrame([
+        {
+            "Romaneio": f"R{rnd.randint(1, max(1, n_linhas // 5))}",
+            "Cliente": None if sem_cliente and rnd.random() < sem_cliente else rnd.choice(["CLIENTE A", "CLIENTE B", "CLIENTE C"]),
+            "Data": datetime.datetime(2026, 1, 1) + datetime.timedelta(days=rnd.randint(0, 30)),
+            "Nome do Motorista": rnd.choice(nomes),
+            "Cidade": rnd.choice(["Recife", "Olinda", "Jaboatão", "Paulista"]),
+            "Status": "ENTREGUE",
+            "Custo": rnd.choice([3.5, 4.0, 5.25]),
+        }
+        for _ in range(n_linhas)
+    ])
+
+    p_mot = os.path.join(pasta, "motoristas.xlsx")
+    p_fech = os.path.join(pasta, "fechamento.xlsx")
+    motoristas.to_excel(p_mot, index=False)
+    fechamento.to_excel(p_fech, index=False)
+    p_banco = os.path.join(pasta, "banco.xlsx")
+    gerar_banco_consolidado(p_mot, p_fech, p_banco)
+    return p_banco
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--motoristas", type=int, default=500)
+    ap.add_argument("--linhas", type=int, default=20000)
+    ap.add_argument("--workers", default=None, help="ex: 1,2,4 (padrão: 1 até o nº de núcleos)")
+    args = ap.parse_args()
+
+    nucleos = os.cpu_count() or 1
+    if args.workers:
+        lista = [int(w) for w in args.workers.split(",")]
+    else:
+        lista = sorted({1, *[w for w in (2, 4, 8, 16, 32) if w <= nucleos], nucleos})
+
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = gerar_entradas(pasta, args.motoristas, args.linhas)
+        print(f"{args.motoristas} motoristas, {args.linhas} linhas, {nucleos} núcleo(s)")
+
+        base = None
+        for w in lista:
+            t = time.perf_counter()
+            gerar_espelhos_motoristas(banco, MODELO, output_dir=os.path.join(pasta, f"w{w}"), motor="xml", workers=w)
+            dt = time.perf_counter() - t
+            base = base or dt
+            print(f"workers={w:<3} {dt:7.2f}s  ganho {base / dt:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Equivalência de saída entre o motor atual e um motor candidato (Steps 1-3).
+
+Roda o fluxo completo (banco consolidado -> espelhos -> RESUMO/RESUMO TOTAL)
+duas vezes nas mesmas entradas: uma com a configuração de referência e outra
+com a candidata. Compara os arquivos finais célula a célula (valores,
+fórmulas, mescladas, formato numérico, fonte, preenchimento, alinhamento,
+bordas, larguras), os nomes das abas (nome_aba_valido) e os totais de RESUMO e
+RESUMO TOTAL (fórmulas avaliadas aqui, sem Excel). Mostra o tempo de cada
+passo e a razão de velocidade. Na saída de referência confere também o valor
+bruto que exportação, prévia e RESUMO do ZIP / RESUMO_GERAL calculam do banco
+com o VALOR TOTAL da aba de cada motorista (a entrada sintética tem linhas sem
+cliente, que ficam fora da aba).
+
+Configuração: "chave=valor,..." com os parâmetros do Step2
+(gerar_espelhos_motoristas); prefixos step1. e step3. vão para o Step1
+(gerar_banco_consolidado) e o Step3 (gerar_resumos).
+
+Uso (na raiz do projeto):
+    python bench/equivalencia.py --candidato motor=xml
+    python bench/equivalencia.py --candidato motor=xml,workers=2,step1.linhas_por_bloco=5000
+    python bench/equivalencia.py --entradas /caminho/periodo_jan --motoristas 0 --candidato streaming=true
+
+--entradas: pasta com motoristas.xlsx e fechamento.xlsx gravados (pode repetir).
+Sai com código 1 se alguma saída diferir.
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+import tempfile
+import time
+from io import BytesIO
+from zipfile import ZipFile
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import range_boundaries
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.exportacao import exportar_pagamentos, montar_pagamentos  # noqa: E402
+from core.previa import montar_previa  # noqa: E402
+from core.step1_banco_consolidado import gerar_banco_consolidado  # noqa: E402
+from core.step2_gerar_espelhos import ARQUIVO_RESUMO_GERAL, gerar_espelhos_motoristas  # noqa: E402
+from core.step3_resumos import gerar_resumos  # noqa: E402
+from bench_step2 import MODELO, gerar_entradas  # noqa: E402
+
+MAX_DIFERENCAS_MOSTRADAS = 20
+
+
+# =========================
+# CONFIGURAÇÃO DO MOTOR
+# =========================
+def _valor(texto: str):
+    if texto.lower() in ("true", "false"):
+        return texto.lower() == "true"
+    if re.fullmatch(r"-?\d+", texto):
+        return int(texto)
+    return texto
+
+
+def ler_configuracao(texto: str) -> dict:
+    """
+    "motor=xml,step1.linhas_por_bloco=5000" ->
+    {"step1": {"linhas_por_bloco": 5000}, "step2": {"motor": "xml"}, "step3": {}}
+    """
+    conf = {"step1": {}, "step2": {}, "step3": {}}
+    for item in filter(None, (p.strip() for p in (texto or "").split(","))):
+        chave, _, valor = item.partition("=")
+        passo, _, nome = chave.rpartition(".")
+        conf[passo or "step2"][nome] = _valor(valor)
+    return conf
+
+
+def rodar_fluxo(motoristas: str, fechamento: str, pasta: str, conf: dict):
+    """Steps 1-3 em `pasta`. Retorna (path do arquivo final, {passo: segundos})."""
+    os.makedirs(pasta, exist_ok=True)
+    tempos = {}
+
+    t = time.perf_counter()
+    banco = os.path.join(pasta, "banco_consolidado.xlsx")
+    gerar_banco_consolidado(motoristas, fechamento, banco, **conf["step1"])
+    tempos["step1"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    espelhos = gerar_espelhos_motoristas(banco, MODELO, output_dir=pasta, **conf["step2"])
+    tempos["step2"] = time.perf_counter() - t
+    if not isinstance(espelhos, str):
+        raise ValueError("Configuração do Step2 precisa gerar um .xlsx só (sem formato=zip / max_abas_por_arquivo).")
+
+    t = time.perf_counter()
+    gerar_resumos(espelhos_xlsx_path=espelhos, banco_consolidado_xlsx_path=banco, **conf["step3"])
+    tempos["step3"] = time.perf_counter() - t
+
+    return espelhos, tempos
+
+
+# =========================
+# COMPARAÇÃO CÉLULA A CÉLULA
+# =========================
+def _cor(cor):
+    return getattr(cor, "rgb", None) if cor is not None else None
+
+
+def _celula(c) -> tuple:
+    valor = c.value
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    f, p, a, b = c.font, c.fill, c.alignment, c.border
+    return (
+        valor,
+        c.number_format,
+        (f.name, f.sz, bool(f.b), bool(f.i), f.u, _cor(f.color)),
+        (p.fill_type, _cor(p.fgColor) if p.fill_type else None),
+        (a.horizontal, a.vertical, bool(a.wrap_text)),
+        tuple(getattr(lado, "style", None) for lado in (b.left, b.right, b.top, b.bottom)),
+    )
+
+
+def _aba(ws) -> tuple:
+    celulas = {}
+    for linha in ws.iter_rows():
+        for c in linha:
+            if c.value is None and not c.has_style:
+                continue
+            celulas[c.coordinate] = _celula(c)
+    mescladas = sorted(str(m) for m in ws.merged_cells.ranges)
+    larguras = {k: round(d.width, 2) for k, d in ws.column_dimensions.items() if d.width}
+    return celulas, mescladas, larguras
+
+
+_CAMPOS_CELULA = ("valor/fórmula", "formato numérico", "fonte", "preenchimento", "alinhamento", "bordas")
+
+
+def comparar_abas(wb_ref, wb_cand) -> list:
+    """Lista de diferenças (texto) entre dois workbooks abertos com load_workbook."""
+    diferencas = []
+    if wb_ref.sheetnames != wb_cand.sheetnames:
+        so_ref = [n for n in wb_ref.sheetnames if n not in wb_cand.sheetnames]
+        so_cand = [n for n in wb_cand.sheetnames if n not in wb_ref.sheetnames]
+        diferencas.append(f"nomes/ordem das abas diferem (só na referência: {so_ref[:5]}, só no candidato: {so_cand[:5]})")
+
+    for nome in wb_ref.sheetnames:
+        if nome not in wb_cand.sheetnames:
+            continue
+        cel_r, merge_r, larg_r = _aba(wb_ref[nome])
+        cel_c, merge_c, larg_c = _aba(wb_cand[nome])
+
+        if merge_r != merge_c:
+            diferencas.append(f"{nome}: mescladas {sorted(set(merge_r) ^ set(merge_c))[:5]}")
+        if larg_r != larg_c:
+            diferencas.append(f"{nome}: larguras de coluna {larg_r} x {larg_c}")
+
+        for coord in sorted(set(cel_r) | set(cel_c)):
+            r, c = cel_r.get(coord), cel_c.get(coord)
+            if r == c:
+                continue
+            if r is None or c is None:
+                diferencas.append(f"{nome}!{coord}: {r} x {c}")
+                continue
+            for campo, vr, vc in zip(_CAMPOS_CELULA, r, c):
+                if vr != vc:
+                    diferencas.append(f"{nome}!{coord} {campo}: {vr!r} x {vc!r}")
+    return diferencas
+
+
+# =========================
+# TOTAIS (avaliação das fórmulas usadas no Step3)
+# =========================
+_RE_REF = r"(?:'((?:[^']|'')+)'!|([A-Za-z0-9_]+)!)?\$?([A-Z]{1,3})\$?(\d+)"
+_RE_SUM = re.compile(r"SUM\(" + _RE_REF + r":\$?([A-Z]{1,3})\$?(\d+)\)")
+_RE_N = re.compile(r"N\(" + _RE_REF + r"\)")
+_RE_CELULA = re.compile(_RE_REF)
+_RE_ARITMETICA = re.compile(r"[\d.eE+\-*/() ]*")
+
+
+class AvaliadorFormulas:
+    """
+    Avalia as fórmulas simples que o Step2/Step3 escrevem: referências
+    (com ou sem aba), SUM de intervalo, N() e + - * /. Vazio/texto valem 0.
+    Referência a uma aba que não existe (#REF! no Excel) e fórmula que não
+    dá para avaliar (ex: nome de aba com aspas sem escape) valem 0 e ficam em
+    `erros`, para aparecer como diferença em vez de derrubar a comparação.
+    """
+
+    def __init__(self, wb):
+        self.wb = wb
+        self._memo = {}
+        self.erros = []
+
+    def _existe(self, aba: str) -> bool:
+        if aba in self.wb.sheetnames:
+            return True
+        erro = f"referência a aba inexistente: '{aba}'"
+        if erro not in self.erros:
+            self.erros.append(erro)
+        return False
+
+    def celula(self, aba: str, coord: str) -> float:
+        chave = (aba, coord)
+        if chave not in self._memo:
+            self._memo[chave] = 0.0  # referência circular vale 0
+            if self._existe(aba):
+                self._memo[chave] = self._valor(aba, self.wb[aba][coord].value)
+        return self._memo[chave]
+
+    def _valor(self, aba: str, v) -> float:
+        if isinstance(v, bool) or v is None:
+            return 0.0
+        if isinstance(v, (int, float)):
+            return float(v)
+        if isinstance(v, (datetime.date, datetime.time)):
+            return 0.0
+        v = str(v)
+        return self._formula(aba, v[1:]) if v.startswith("=") else 0.0
+
+    def _formula(self, aba: str, expr: str) -> float:
+        def alvo(m):
+            return (m.group(1) or "").replace("''", "'") or m.group(2) or aba
+
+        def soma(m):
+            folha = alvo(m)
+            if not self._existe(folha):
+                return "0.0"
+            c1, r1, c2, r2 = range_boundaries(f"{m.group(3)}{m.group(4)}:{m.group(5)}{m.group(6)}")
+            ws = self.wb[folha]
+            total = 0.0
+            for linha in range(r1, r2 + 1):
+                for col in range(c1, c2 + 1):
+                    total += self.celula(folha, ws.cell(row=linha, column=col).coordinate)
+            return repr(total)
+
+        def ref(m):
+            return repr(self.celula(alvo(m), f"{m.group(3)}{m.group(4)}"))
+
+        conta = _RE_CELULA.sub(ref, _RE_N.sub(ref, _RE_SUM.sub(soma, expr)))
+        if _RE_ARITMETICA.fullmatch(conta):
+            try:
+                return float(eval(conta, {"__builtins__": {}}, {}))  # só números e + - * / ( )
+            except (SyntaxError, ZeroDivisionError):
+                pass
+        # ex: aspas sem escape no nome da aba (='ZÉ O'NEIL'!F72)
+        erro = f"fórmula não suportada em '{aba}': ={expr}"
+        if erro not in self.erros:
+            self.erros.append(erro)
+        return 0.0
+
+
+def totais_resumo(wb, erros: list = None) -> dict:
+    """
+    {(aba, coluna do cabeçalho): valor} da linha CUSTO TOTAL de RESUMO e RESUMO TOTAL.
+    erros: se informado, recebe os erros de avaliação (AvaliadorFormulas.erros).
+    """
+    avaliador = AvaliadorFormulas(wb)
+    totais = {}
+    for aba in ("RESUMO", "RESUMO TOTAL"):
+        if aba not in wb.sheetnames:
+            continue
+        ws = wb[aba]
+        linha_total = next((c.row for c in ws["A"] if str(c.value or "").strip().upper() == "CUSTO TOTAL"), None)
+        if linha_total is None:
+            continue
+        cabecalho = {c.column: str(c.value).strip() for c in ws[5] if c.value not in (None, "")}
+        for col, titulo in cabecalho.items():
+            if col == 1:
+                continue
+            totais[(aba, titulo)] = round(avaliador.celula(aba, ws.cell(row=linha_total, column=col).coordinate), 2)
+    if erros is not None:
+        erros.extend(avaliador.erros)
+    return totais
+
+
+def comparar(ref_path: str, cand_path: str) -> tuple:
+    """(diferenças de célula, diferenças de totais, totais da referência)"""
+    wb_ref, wb_cand = load_workbook(ref_path), load_workbook(cand_path)
+    diferencas = comparar_abas(wb_ref, wb_cand)
+    erros_ref, erros_cand = [], []
+    tot_ref, tot_cand = totais_resumo(wb_ref, erros_ref), totais_resumo(wb_cand, erros_cand)
+    dif_totais = [
+        f"{aba} / {col}: {tot_ref.get((aba, col))} x {tot_cand.get((aba, col))}"
+        for aba, col in sorted(set(tot_ref) | set(tot_cand))
+        if tot_ref.get((aba, col)) != tot_cand.get((aba, col))
+    ]
+    dif_totais += [f"referência: {e}" for e in erros_ref] + [f"candidato: {e}" for e in erros_cand]
+    return diferencas, dif_totais, tot_ref
+
+
+# =========================
+# TOTAIS DO BANCO x ABAS DOS MOTORISTAS
+# =========================
+# Exportação, prévia e o RESUMO calculado do banco (ZIP e saída dividida) não
+# leem as abas: somam o banco com as regras do Step2 (core/totais.py). Aqui o
+# valor bruto de cada motorista em cada um deles é conferido com o VALOR TOTAL
+# DOS SERVIÇOS PRESTADOS (F) da aba dele.
+ABAS_FORA = ("RESUMO", "RESUMO TOTAL", "MODELO_BASE")
+
+
+def _valor_total_da_aba(avaliador, ws) -> float:
+    linha = next((c.row for c in ws["A"] if "VALOR TOTAL DOS SERVIÇOS PRESTADOS" in str(c.value or "")), None)
+    return round(avaliador.celula(ws.title, f"F{linha}"), 2) if linha else None
+
+
+def _brutos_do_resumo(conteudo) -> dict:
+    """{motorista: Valor Bruto} do RESUMO gerado por core/resumo_totais.py."""
+    ws = load_workbook(conteudo)["RESUMO"]
+    brutos = {}
+    for nome, bruto in ws.iter_rows(min_row=6, max_col=2, values_only=True):
+        if str(nome or "").strip().upper() == "CUSTO TOTAL":
+            break
+        brutos[str(nome)] = round(float(bruto or 0), 2)
+    return brutos
+
+
+def conferir_totais_do_banco(banco: str, espelhos: str, pasta: str) -> list:
+    """
+    Diferenças entre o VALOR TOTAL das abas de `espelhos` (saída em um arquivo
+    só) e o valor bruto por motorista de montar_pagamentos, da exportação CSV,
+    da prévia e do RESUMO.xlsx do ZIP e do RESUMO_GERAL da saída dividida.
+    """
+    wb = load_workbook(espelhos)
+    avaliador = AvaliadorFormulas(wb)
+    abas = [_valor_total_da_aba(avaliador, ws) for ws in wb.worksheets if ws.title not in ABAS_FORA]
+
+    # abas na ordem do banco, a mesma do montar_pagamentos
+    pagamentos = montar_pagamentos(banco)["motoristas"]
+    nomes = [str(m) for m in pagamentos["motorista"]]
+    if len(nomes) != len(abas):
+        return [f"{len(abas)} aba(s) de motorista x {len(nomes)} motorista(s) no banco"]
+    na_aba = dict(zip(nomes, abas))
+
+    fontes = {
+        "montar_pagamentos": dict(zip(nomes, pagamentos["valor_bruto"].round(2))),
+        "exportação csv": {
+            str(m): v for m, v in pd.read_csv(BytesIO(exportar_pagamentos(banco, "csv")))[["motorista", "valor_bruto"]].itertuples(index=False, name=None)
+        },
+        "prévia": {m["motorista"]: m["valor_bruto"] for m in montar_previa(banco)["motoristas"]},
+    }
+
+    zip_path = gerar_espelhos_motoristas(banco, MODELO, output_dir=os.path.join(pasta, "zip"), formato="zip")
+    with ZipFile(zip_path) as zf:
+        fontes["RESUMO.xlsx do ZIP"] = _brutos_do_resumo(BytesIO(zf.read("RESUMO.xlsx")))
+
+    dividida = os.path.join(pasta, "dividida")
+    gerar_espelhos_motoristas(banco, MODELO, output_dir=dividida, max_abas_por_arquivo=max(1, len(nomes) // 3))
+    fontes[ARQUIVO_RESUMO_GERAL] = _brutos_do_resumo(os.path.join(dividida, ARQUIVO_RESUMO_GERAL))
+
+    diferencas = []
+    for fonte, valores in fontes.items():
+        for nome in nomes:
+            v = valores.get(nome)
+            if v is None or round(float(v), 2) != na_aba[nome]:
+                diferencas.append(f"{fonte} / {nome}: aba {na_aba[nome]} x {v}")
+    return diferencas
+
+
+# =========================
+# MAIN
+# =========================
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--referencia", default="motor=openpyxl", help="configuração atual (padrão: motor=openpyxl)")
+    ap.add_argument("--candidato", action="append", required=True, help="configuração candidata (pode repetir)")
+    ap.add_argument("--entradas", action="append", default=[], help="pasta com motoristas.xlsx e fechamento.xlsx")
+    ap.add_argument("--motoristas", type=int, default=200, help="entrada sintética (0 = sem sintética)")
+    ap.add_argument("--linhas", type=int, default=8000)
+    args = ap.parse_args()
+
+    referencia = ler_configuracao(args.referencia)
+    candidatos = [(c, ler_configuracao(c)) for c in args.candidato]
+
+    falhou = False
+    with tempfile.TemporaryDirectory() as pasta:
+        conjuntos = [(os.path.basename(os.path.normpath(p)), os.path.join(p, "motoristas.xlsx"), os.path.join(p, "fechamento.xlsx")) for p in args.entradas]
+        if args.motoristas > 0:
+            sintetica = os.path.join(pasta, "sintetica")
+            os.makedirs(sintetica)
+            gerar_entradas(sintetica, args.motoristas, args.linhas, sem_cliente=0.02)
+            conjuntos.append((f"sintética {args.motoristas}x{args.linhas}", os.path.join(sintetica, "motoristas.xlsx"), os.path.join(sintetica, "fechamento.xlsx")))
+
+        for i, (nome, motoristas, fechamento) in enumerate(conjuntos):
+            print(f"== {nome}")
+            ref_path, ref_tempos = rodar_fluxo(motoristas, fechamento, os.path.join(pasta, f"{i}_ref"), referencia)
+            print(f"   referência [{args.referencia}]  " + "  ".join(f"{p} {t:6.2f}s" for p, t in ref_tempos.items()))
+            dif_banco = conferir_totais_do_banco(
+                os.path.join(pasta, f"{i}_ref", "banco_consolidado.xlsx"), ref_path, os.path.join(pasta, f"{i}_conferencia")
+            )
+            if dif_banco:
+                falhou = True
+                print(f"   TOTAIS DO BANCO DIFERENTES DAS ABAS: {len(dif_banco)} diferença(s)")
+                for d in dif_banco[:MAX_DIFERENCAS_MOSTRADAS]:
+                    print(f"     {d}")
+            else:
+                print("   totais do banco (exportação, prévia, RESUMO do ZIP e RESUMO_GERAL) = VALOR TOTAL das abas")
+
+            for j, (texto, conf) in enumerate(candidatos):
+                cand_path, cand_tempos = rodar_fluxo(motoristas, fechamento, os.path.join(pasta, f"{i}_cand{j}"), conf)
+                diferencas, dif_totais, totais = comparar(ref_path, cand_path)
+
+                razoes = "  ".join(f"{p} {cand_tempos[p]:6.2f}s ({ref_tempos[p] / cand_tempos[p]:4.2f}x)" for p in cand_tempos)
+                total = sum(ref_tempos.values()) / sum(cand_tempos.values())
+                print(f"   candidato  [{texto}]  {razoes}  total {total:4.2f}x")
+
+                if diferencas or dif_totais:
+                    falhou = True
+                    print(f"   DIFERENTE: {len(diferencas)} diferença(s) de célula/aba, {len(dif_totais)} de totais")
+                    for d in (dif_totais + diferencas)[:MAX_DIFERENCAS_MOSTRADAS]:
+                        print(f"     {d}")
+                else:
+                    bruto = totais.get(("RESUMO", "Valor Bruto"))
+                    print(f"   IDÊNTICO ({len(totais)} totais conferidos, RESUMO Valor Bruto {bruto})")
+
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+import re
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE, TIME_TYPES, get_time_format
+from openpyxl.compat import NUMERIC_TYPES
+from openpyxl.styles import is_date_format
+from openpyxl.styles.borders import Border
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS, BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.datetime import to_excel
+from openpyxl.utils.exceptions import IllegalCharacterError
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.xml.functions import tostring
+
+
+# posições no StyleArray do openpyxl (= atributos do <xf> no cellXfs)
+_FONTE, _PREENCHIMENTO, _BORDA, _FORMATO, _PROTECAO, _ALINHAMENTO = 0, 1, 2, 3, 4, 5
+
+_RE_DIMENSAO = re.compile(r"<dimension\b[^>]*/>")
+_RE_COLS = re.compile(r"<cols>.*?</cols>|<cols\s*/>", re.S)
+_RE_SHEETDATA = re.compile(r"<sheetData>.*?</sheetData>|<sheetData\s*/>", re.S)
+_RE_LINHA = re.compile(r'<row r="(\d+)"([^>]*?)\s*/?>')
+# elementos que o schema põe entre </sheetData> e <mergeCells>
+_RE_ANTES_MESCLAS = re.compile(r"\A(?:<sheetCalcPr\b.*?/>|<sheetProtection\b.*?/>|<protectedRanges>.*?</protectedRanges>"
+                               r"|<scenarios\b.*?</scenarios>|<autoFilter\b.*?(?:/>|</autoFilter>)"
+                               r"|<sortState\b.*?(?:/>|</sortState>)|<dataConsolidate\b.*?(?:/>|</dataConsolidate>)"
+                               r"|<customSheetViews>.*?</customSheetViews>)*", re.S)
+
+
+@lru_cache(maxsize=4096)
+def _coordenada(addr: str):
+    return coordinate_to_tuple(addr)
+
+
+@lru_cache(maxsize=None)
+def _letra(coluna: int) -> str:
+    return get_column_letter(coluna)
+
+
+def _numero(valor) -> str:
+    if valor != valor or valor in (float("inf"), float("-inf")):
+        return ""
+    return "%.16g" % valor
+
+
+class _Celula:
+    """
+    Célula mínima com a mesma interface do openpyxl usada no Step2
+    (value, font, fill, border, alignment, number_format, protection).
+
+    O estilo fica como lista de ids (mesma ordem do StyleArray), registrados
+    direto nas tabelas de estilo do workbook do modelo.
+    """
+
+    __slots__ = ("_aba", "row", "column", "_value", "data_type", "estilo", "mesclada")
+
+    def __init__(self, aba, row, column, value=None, data_type="n", estilo=None, mesclada=False):
+        self._aba = aba
+        self.row = row
+        self.column = column
+        self._value = value
+        self.data_type = data_type
+        self.estilo = estilo if estilo is not None else [0] * 9
+        self.mesclada = mesclada
+
+    @property
+    def coordinate(self) -> str:
+        return f"{_letra(self.column)}{self.row}"
+
+    # ---------- valor (mesmas regras do Cell._bind_value) ----------
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        if self.mesclada:
+            raise AttributeError(f"Célula {self.coordinate} faz parte de uma mesclagem (somente leitura).")
+
+        tipo = "n"
+        if value is None:
+            pass
+        elif isinstance(value, bool):
+            tipo = "b"
+        elif isinstance(value, NUMERIC_TYPES):
+            tipo = "n"
+        elif isinstance(value, (str, bytes)):
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+            value = str(value)[:32767]
+            if ILLEGAL_CHARACTERS_RE.search(value):
+                raise IllegalCharacterError(f"{value} cannot be used in worksheets.")
+            tipo = "s"
+            if len(value) > 1 and value.startswith("="):
+                tipo = "f"
+            elif value in ERROR_CODES:
+                tipo = "e"
+        elif isinstance(value, TIME_TYPES):
+            tipo = "d"
+            if not is_date_format(self.number_format):
+                self.number_format = get_time_format(type(value))
+        else:
+            raise ValueError("Cannot convert {0!r} to Excel".format(value))
+
+        self.data_type = tipo
+        self._value = value
+
+    # ---------- estilos ----------
+    def _obj(self, tabela, pos):
+        return getattr(self._aba._modelo.wb, tabela)[self.estilo[pos]]
+
+    @property
+    def font(self):
+        return self._obj("_fonts", _FONTE)
+
+    @font.setter
+    def font(self, v):
+        self.estilo[_FONTE] = self._aba._modelo.registrar("_fonts", v)
+
+    @property
+    def fill(self):
+        return self._obj("_fills", _PREENCHIMENTO)
+
+    @fill.setter
+    def fill(self, v):
+        self.estilo[_PREENCHIMENTO] = self._aba._modelo.registrar("_fills", v)
+
+    @property
+    def border(self):
+        return self._obj("_borders", _BORDA)
+
+    @border.setter
+    def border(self, v):
+        self.estilo[_BORDA] = self._aba._modelo.registrar("_borders", v)
+
+    @property
+    def alignment(self):
+        return self._obj("_alignments", _ALINHAMENTO)
+
+    @alignment.setter
+    def alignment(self, v):
+        self.estilo[_ALINHAMENTO] = self._aba._modelo.registrar("_alignments", v)
+
+    @property
+    def protection(self):
+        return self._obj("_protections", _PROTECAO)
+
+    @protection.setter
+    def protection(self, v):
+        self.estilo[_PROTECAO] = self._aba._modelo.registrar("_protections", v)
+
+    @property
+    def number_format(self) -> str:
+        idx = self.estilo[_FORMATO]
+        if idx < BUILTIN_FORMATS_MAX_SIZE:
+            return BUILTIN_FORMATS.get(idx, "General")
+        return self._aba._modelo.wb._number_formats[idx - BUILTIN_FORMATS_MAX_SIZE]
+
+    @number_format.setter
+    def number_format(self, v):
+        self.estilo[_FORMATO] = self._aba._modelo.registrar_formato(v)
+
+    @property
+    def has_style(self) -> bool:
+        return any(self.estilo)
+
+
+class _Largura:
+    __slots__ = ("width",)
+
+    def __init__(self):
+        self.width = None
+
+
+class _Larguras(dict):
+    """column_dimensions mínimo: ws.column_dimensions["F"].width = 30"""
+
+    def __missing__(self, letra):
+        d = self[letra] = _Largura()
+        return d
+
+
+# =========================
+# MODELO (template já parseado)
+# =========================
+class ModeloXml:
+    """
+    Aba do modelo.xlsx parseada uma vez para renderizar abas por XML direto.
+
+    Guarda as células do modelo (valor + ids de estilo), as mesclagens, os
+    atributos de cada <row> e o "esqueleto" do sheet XML (sheetPr, views, cols,
+    margens, pageSetup...). Os estilos novos são registrados no próprio workbook
+    do modelo, que é quem grava o styles.xml no pacote final.
+    """
+
+    def __init__(self, wb, aba_modelo):
+        self.wb = wb
+
+        # como no copy_worksheet: toda célula do modelo vira célula comum (valor + estilo)
+        self.celulas = {k: (cell._value, cell.data_type, list(cell._style)) for k, cell in aba_modelo._cells.items()}
+        self.mesclas = [(m.min_row, m.min_col, m.max_row, m.max_col) for m in aba_modelo.merged_cells.ranges]
+
+        # esqueleto: a aba do modelo sem células nem mesclagens, serializada pelo openpyxl
+        esqueleto = wb.copy_worksheet(aba_modelo)
+        wb.remove(esqueleto)
+        esqueleto._cells = {}
+        esqueleto.merged_cells.ranges = set()
+        self._dims_colunas = esqueleto.column_dimensions
+
+        writer = WorksheetWriter(esqueleto)
+        writer.write()
+        xml = writer.read().decode("utf-8")
+        writer.cleanup()
+
+        m = _RE_SHEETDATA.search(xml)
+        self.atributos_linha = {int(r): attrs for r, attrs in _RE_LINHA.findall(m.group(0))}
+        inicio, fim = xml[: m.start()], xml[m.end():]
+
+        inicio = _RE_DIMENSAO.sub("", inicio, count=1)
+        m_cols = _RE_COLS.search(inicio)
+        if m_cols is not None:
+            self._inicio = (inicio[: m_cols.start()], inicio[m_cols.end():])
+        else:
+            self._inicio = (inicio, "")
+
+        pos = _RE_ANTES_MESCLAS.match(fim).end()
+        self._fim = (fim[:pos], fim[pos:])
+
+        # o <dimension> vem logo depois do <sheetPr> (ou no começo)
+        self._pos_dimensao = self._inicio[0].find("<sheetViews")
+
+        self._ids = {}          # (tabela, id(obj)) -> (obj, índice)
+        self._formatos = {}
+        self._estilos = {}      # tuple(StyleArray) -> id no cellXfs
+        self._somas_borda = {}  # (id_borda, chave_extra) -> id_borda
+        self._cols = {}
+
+    # ---------- registro de estilos (memorizado: hash de Font/Border é caro) ----------
+    def registrar(self, tabela: str, obj) -> int:
+        chave = (tabela, id(obj))
+        achado = self._ids.get(chave)
+        if achado is not None and achado[0] is obj:
+            return achado[1]
+        idx = getattr(self.wb, tabela).add(obj)
+        self._ids[chave] = (obj, idx)
+        return idx
+
+    def registrar_formato(self, fmt) -> int:
+        if fmt is None:
+            fmt = "General"
+        idx = self._formatos.get(fmt)
+        if idx is None:
+            if fmt in BUILTIN_FORMATS_REVERSE:
+                idx = BUILTIN_FORMATS_REVERSE[fmt]
+            else:
+                idx = self.wb._number_formats.add(fmt) + BUILTIN_FORMATS_MAX_SIZE
+            self._formatos[fmt] = idx
+        return idx
+
+    def id_estilo(self, estilo) -> int:
+        chave = tuple(estilo)
+        idx = self._estilos.get(chave)
+        if idx is None:
+            idx = self._estilos[chave] = self.wb._cell_styles.add(StyleArray(estilo))
+        return idx
+
+    def somar_borda(self, id_borda: int, chave_extra, extra: Border) -> int:
+        """id de (borda atual + extra), como o `cell.border += extra` do openpyxl."""
+        chave = (id_borda, chave_extra)
+        idx = self._somas_borda.get(chave)
+        if idx is None:
+            idx = self._somas_borda[chave] = self.wb._borders.add(self.wb._borders[id_borda] + extra)
+        return idx
+
+    # ---------- partes fixas do XML ----------
+    def cols_xml(self, larguras: dict) -> str:
+        """<cols> do modelo com as larguras alteradas ({letra: largura})."""
+        chave = tuple(sorted(larguras.items()))
+        xml = self._cols.get(chave)
+        if xml is not None:
+            return xml
+
+        dims = self._dims_colunas
+        novas = [letra for letra in larguras if letra not in dims]
+        antigas = {letra: dims[letra].width for letra in larguras if letra not in novas}
+        for letra, largura in larguras.items():
+            dims[letra].width = largura
+        el = dims.to_tree()
+        xml = tostring(el).decode("utf-8") if el is not None else ""
+        for letra in novas:
+            del dims[letra]
+        for letra, largura in antigas.items():
+            dims[letra].width = largura
+
+        self._cols[chave] = xml
+        return xml
+
+    def nova_aba(self, titulo: str = "") -> "AbaXml":
+        return AbaXml(self, titulo)
+
+
+# =========================
+# ABA (grava as células e gera o XML)
+# =========================
+class AbaXml:
+    """
+    Aba de motorista renderizada sem o modelo de objetos do openpyxl.
+
+    Aceita o mesmo subconjunto da API de Worksheet que o Step2 usa
+    (ws["C4"] = ..., ws.cell(...), ws.merge_cells(...), column_dimensions)
+    com as mesmas regras de mesclagem/bordas do openpyxl, e xml() devolve o
+    sheet XML pronto para o pacote (ver core/pacote_xlsx.salvar_pacote).
+    """
+
+    def __init__(self, modelo: ModeloXml, titulo: str = ""):
+        self._modelo = modelo
+        self.parent = modelo.wb
+        self.title = titulo
+        self._cells = {
+            k: _Celula(self, k[0], k[1], valor, tipo, estilo[:])
+            for k, (valor, tipo, estilo) in modelo.celulas.items()
+        }
+        self._mesclas = list(modelo.mesclas)
+        self.column_dimensions = _Larguras()
+
+    # ---------- API estilo Worksheet ----------
+    def cell(self, row: int, column: int, value=None) -> _Celula:
+        c = self._cells.get((row, column))
+        if c is None:
+            c = self._cells[(row, column)] = _Celula(self, row, column)
+        if value is not None:
+            c.value = value
+        return c
+
+    def __getitem__(self, addr: str) -> _Celula:
+        return self.cell(*_coordenada(addr))
+
+    def __setitem__(self, addr: str, value) -> None:
+        self[addr].value = value
+
+    def merge_cells(self, start_row: int, start_column: int, end_row: int, end_column: int) -> None:
+        """
+        Mesmo efeito do Worksheet.merge_cells do openpyxl: a célula do canto
+        recebe as bordas direita/inferior do canto oposto, as demais viram
+        células mescladas (sem estilo) e as da borda herdam o contorno do canto.
+        """
+        modelo = self._modelo
+        cells = self._cells
+        self._mesclas.append((start_row, start_column, end_row, end_column))
+
+        inicio = self.cell(start_row, start_column)
+        fim = cells.get((end_row, end_column))
+        if fim is not None:
+            b = fim.border
+            extra = Border(right=b.right, bottom=b.bottom)
+            inicio.estilo[_BORDA] = modelo.somar_borda(inicio.estilo[_BORDA], ("cr", fim.estilo[_BORDA]), extra)
+
+        for r in range(start_row, end_row + 1):
+            for c in range(start_column, end_column + 1):
+                if (r, c) != (start_row, start_column):
+                    cells[(r, c)] = _Celula(self, r, c, mesclada=True)
+
+        faixa = CellRange(min_col=start_column, min_row=start_row, max_col=end_column, max_row=end_row)
+        borda_inicio = inicio.border
+        id_inicio = inicio.estilo[_BORDA]
+        for nome in ("top", "left", "right", "bottom"):
+            lado = getattr(borda_inicio, nome)
+            if lado and lado.style is None:
+                continue
+            extra = Border(**{nome: lado})
+            for coord in getattr(faixa, nome):
+                cel = cells.get(coord)
+                if cel is None:
+                    cel = cells[coord] = _Celula(self, coord[0], coord[1], mesclada=True)
+                cel.estilo[_BORDA] = modelo.somar_borda(cel.estilo[_BORDA], (nome, id_inicio), extra)
+
+        protecao = inicio.estilo[_PROTECAO]
+        for r in range(start_row, end_row + 1):
+            for c in range(start_column, end_column + 1):
+                cells[(r, c)].estilo[_PROTECAO] = protecao
+
+    # ---------- XML ----------
+    def xml(self) -> bytes:
+        modelo = self._modelo
+        id_estilo = modelo.id_estilo
+
+        por_linha = {}
+        for (r, c) in sorted(self._cells):
+            por_linha.setdefault(r, []).append(self._cells[(r, c)])
+        for r in modelo.atributos_linha:
+            por_linha.setdefault(r, [])
+
+        partes = []
+        for r in sorted(por_linha):
+            partes.append(f'<row r="{r}"{modelo.atributos_linha.get(r, "")}>')
+            for cel in por_linha[r]:
+                v = cel._value
+                estilizada = any(cel.estilo)
+                if v is None and not estilizada:
+                    continue
+
+                ref = f"{_letra(cel.column)}{r}"
+                s = f' s="{id_estilo(cel.estilo)}"' if estilizada else ""
+                tipo = cel.data_type
+
+                if v is None or v == "":
+                    t = ' t="inlineStr"' if tipo == "s" else ""
+                    partes.append(f'<c r="{ref}"{s}{t}/>')
+                elif tipo == "s":
+                    espaco = ' xml:space="preserve"' if v != v.strip() else ""
+                    partes.append(f'<c r="{ref}"{s} t="inlineStr"><is><t{espaco}>{escape(v)}</t></is></c>')
+                elif tipo == "f":
+                    partes.append(f'<c r="{ref}"{s}><f>{escape(v[1:])}</f><v /></c>')
+                elif tipo == "d":
+                    partes.append(f'<c r="{ref}"{s} t="n"><v>{_numero(to_excel(v, modelo.wb.epoch))}</v></c>')
+                elif tipo == "b":
+                    partes.append(f'<c r="{ref}"{s} t="b"><v>{1 if v else 0}</v></c>')
+                elif tipo == "e":
+                    partes.append(f'<c r="{ref}"{s} t="e"><v>{escape(v)}</v></c>')
+                else:
+                    partes.append(f'<c r="{ref}"{s} t="n"><v>{_numero(v)}</v></c>')
+            partes.append("</row>")
+
+        if self._cells:
+            linhas = [k[0] for k in self._cells]
+            colunas = [k[1] for k in self._cells]
+            dimensao = f"{_letra(min(colunas))}{min(linhas)}:{_letra(max(colunas))}{max(linhas)}"
+        else:
+            dimensao = "A1:A1"
+
+        larguras = {letra: d.width for letra, d in self.column_dimensions.items() if d.width is not None}
+
+        antes_cols, depois_cols = modelo._inicio
+        pos = modelo._pos_dimensao
+        if pos < 0:
+            pos = len(antes_cols)
+        mesclas = "".join(
+            f'<mergeCell ref="{_letra(c1)}{r1}:{_letra(c2)}{r2}"/>' for r1, c1, r2, c2 in self._mesclas
+        )
+        fim_a, fim_b = modelo._fim
+
+        xml = "".join([
+            antes_cols[:pos], f'<dimension ref="{dimensao}"/>', antes_cols[pos:],
+            modelo.cols_xml(larguras), depois_cols,
+            "<sheetData>", "".join(partes), "</sheetData>",
+            fim_a,
+            f'<mergeCells count="{len(self._mesclas)}">{mesclas}</mergeCells>' if self._mesclas else "",
+            fim_b,
+        ])
+        return xml.encode("utf-8")
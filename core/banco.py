@@ -0,0 +1,119 @@
+import re
+import unicodedata
+
+import pandas as pd
+
+
+# =========================
+# COLUNAS DO BANCO CONSOLIDADO
+# =========================
+# Nomes aceitos para cada campo (já normalizados: strip + lower), na ordem de preferência.
+COLUNAS_POSSIVEIS = {
+    "motorista": ["nome do motorista", "motorista", "nome"],
+    "prestador": ["prestador", "nome do prestador", "prestador de serviço", "prestador de servico"],
+    "conta": ["conta", "conta corrente"],
+    "pix": ["pix", "chave pix"],
+    "data": ["data"],
+    "cidade": ["cidade"],
+    "status": ["status"],
+    "custo": ["custo", "valor", "valor unitario", "valor unitário"],
+    "cnpj": ["cnpj", "cnpj do favorecido", "cnpj/cpf", "cpf/cnpj"],
+    "cpf": ["cpf", "cpf do favorecido", "cpf/cnpj", "cnpj/cpf"],
+    "contrato": ["contrato"],
+}
+
+COLUNAS_FIXAS_OBRIGATORIAS = ["cpf", "banco", "agencia", "cliente", "romaneio"]
+CAMPOS_OBRIGATORIOS = ["motorista", "conta", "pix", "data", "cidade", "status", "custo"]
+
+
+def ler_banco(src) -> pd.DataFrame:
+    """
+    Lê o banco_consolidado.xlsx (path ou file-like) com as colunas normalizadas.
+    """
+    df = pd.read_excel(src)
+    df.columns = df.columns.str.strip().str.lower()
+    return df
+
+
+def identificar_colunas(df: pd.DataFrame) -> dict:
+    """
+    Retorna {campo: nome_da_coluna_ou_None} para cada campo de COLUNAS_POSSIVEIS.
+    """
+    def achar_coluna(possiveis):
+        for c in possiveis:
+            if c in df.columns:
+                return c
+        return None
+
+    return {campo: achar_coluna(possiveis) for campo, possiveis in COLUNAS_POSSIVEIS.items()}
+
+
+def validar_colunas(df: pd.DataFrame, cols: dict) -> None:
+    for obrigatoria in COLUNAS_FIXAS_OBRIGATORIAS:
+        if obrigatoria not in df.columns:
+            raise Exception(f"Coluna '{obrigatoria}' não encontrada.")
+
+    if not all(cols[c] for c in CAMPOS_OBRIGATORIOS):
+        raise Exception("Coluna obrigatória não encontrada.")
+
+
+# =========================
+# CIDADE
+# =========================
+def strip_accents(s: str) -> str:
+    nfkd = unicodedata.normalize("NFKD", s)
+    return "".join(ch for ch in nfkd if not unicodedata.combining(ch))
+
+
+def norm_city_key(v) -> str:
+    """
+    Normaliza cidade para agrupamento:
+    - trim
+    - remove acentos
+    - lowercase
+    - remove pontuação básica
+    - colapsa espaços
+    """
+    if v is None:
+        return ""
+    s = str(v).strip()
+    if s == "" or s.lower() == "nan":
+        return ""
+    s = strip_accents(s)
+    s = s.lower()
+    s = re.sub(r"[^a-z0-9\s]", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def norm_city_keys(serie: pd.Series) -> pd.Series:
+    """
+    norm_city_key aplicado a uma coluna inteira, calculando uma vez por cidade distinta.
+    """
+    unicas = serie.drop_duplicates()
+    mapa = dict(zip(unicas, (norm_city_key(v) for v in unicas)))
+    return serie.map(mapa).fillna("")
+
+
+# =========================
+# NOME DO MOTORISTA
+# =========================
+def norm_nome_key(v) -> str:
+    """
+    Chave para casar o mesmo motorista digitado de jeitos diferentes em
+    arquivos diferentes: trim, sem acentos, sem diferenciar maiúsculas,
+    espaços colapsados. Vazio/NaN -> "".
+    """
+    if v is None or (isinstance(v, float) and pd.isna(v)):
+        return ""
+    s = strip_accents(str(v)).casefold()
+    return " ".join(s.split())
+
+
+def norm_nome_keys(serie: pd.Series) -> pd.Series:
+    """
+    norm_nome_key aplicado a uma coluna inteira, calculando uma vez por nome distinto.
+    """
+    unicas = serie.drop_duplicates()
+    mapa = dict(zip(unicas, (norm_nome_key(v) for v in unicas)))
+    return serie.map(mapa).fillna("")
@@ -0,0 +1,233 @@
+import datetime
+import math
+import os
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import numpy as np
+import pandas as pd
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
+
+from core.banco import COLUNAS_POSSIVEIS
+
+
+# =========================
+# BANCO CONSOLIDADO -> XLSX EM FLUXO
+# =========================
+# O DataFrame.to_excel (openpyxl) cria um objeto por célula e só grava no
+# save(). Aqui o sheet XML vai direto para o zip, bloco a bloco, com o tipo de
+# cada coluna decidido uma vez pelo dtype (número, data, booleano, texto; só
+# coluna object é tipada célula a célula) e os formatos fixos no styles.xml:
+# memória ~ um bloco, independente do tamanho do banco.
+#
+# O pd.read_excel lê de volta o mesmo DataFrame que leria do to_excel, com
+# duas diferenças deliberadas: texto começando com "=" fica texto (o openpyxl
+# gravaria fórmula, lida de volta como vazia) e caracteres de controle que o
+# XML não aceita são removidos (o openpyxl levantaria IllegalCharacterError).
+LINHAS_POR_BLOCO = 20000
+NOME_ABA = "Sheet1"
+
+# índices no cellXfs do _ESTILOS
+_S_CABECALHO, _S_DATA, _S_DATA_HORA, _S_DINHEIRO = 1, 2, 3, 4
+
+_ESTILOS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="3"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/><numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm:ss"/><numFmt numFmtId="166" formatCode="&quot;R$&quot; #,##0.00"/></numFmts>
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font><font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border><border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="5">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="top"/></xf>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="166" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+_PARTES_FIXAS = {
+    "[Content_Types].xml": """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>""",
+    "_rels/.rels": """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>""",
+    "xl/workbook.xml": f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{NOME_ABA}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>""",
+    "xl/_rels/workbook.xml.rels": """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>""",
+    "xl/styles.xml": _ESTILOS,
+}
+
+_INICIO_ABA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    "</sheetView></sheetViews><sheetData>"
+)
+_FIM_ABA = "</sheetData></worksheet>"
+
+_COLUNAS_DINHEIRO = set(COLUNAS_POSSIVEIS["custo"])
+
+
+# =========================
+# CÉLULAS
+# =========================
+def _texto(ref: str, v: str, estilo: str = "") -> str:
+    if ILLEGAL_CHARACTERS_RE.search(v):
+        v = ILLEGAL_CHARACTERS_RE.sub("", v)
+    espaco = ' xml:space="preserve"' if v != v.strip() else ""
+    return f'<c r="{ref}"{estilo} t="inlineStr"><is><t{espaco}>{escape(v)}</t></is></c>'
+
+
+def _data(ref: str, v) -> str:
+    if isinstance(v, datetime.datetime):
+        estilo = _S_DATA if (v.hour, v.minute, v.second, v.microsecond) == (0, 0, 0, 0) else _S_DATA_HORA
+    elif isinstance(v, datetime.date):
+        estilo = _S_DATA
+    else:  # datetime.time
+        estilo = _S_DATA_HORA
+    return f'<c r="{ref}" s="{estilo}"><v>{to_excel(v)!r}</v></c>'
+
+
+def _celula(ref: str, v, estilo: str = "") -> str:
+    """
+    Uma célula de coluna object (tipo decidido pelo valor, como no openpyxl).
+    """
+    if v is None or v is pd.NaT or v is pd.NA:
+        return ""
+    if isinstance(v, str):
+        return _texto(ref, v)
+    if isinstance(v, (bool, np.bool_)):
+        return f'<c r="{ref}" t="b"><v>{int(v)}</v></c>'
+    if isinstance(v, (int, np.integer)):
+        return f'<c r="{ref}"{estilo}><v>{int(v)}</v></c>'
+    if isinstance(v, (float, np.floating)):
+        v = float(v)
+        if math.isnan(v) or math.isinf(v):
+            return ""
+        return f'<c r="{ref}"{estilo}><v>{v!r}</v></c>'
+    if isinstance(v, (datetime.datetime, datetime.date, datetime.time)):
+        return _data(ref, v.to_pydatetime() if isinstance(v, pd.Timestamp) else v)
+    return _texto(ref, str(v))
+
+
+def _celulas_da_coluna(serie: pd.Series, letra: str, linha0: int, dinheiro: bool) -> list:
+    """
+    XML de cada célula da coluna ("" = célula vazia), com o tipo decidido pelo dtype.
+    """
+    refs = [f"{letra}{r}" for r in range(linha0, linha0 + len(serie))]
+    estilo = f' s="{_S_DINHEIRO}"' if dinheiro else ""
+    dtype = serie.dtype
+
+    if pd.api.types.is_bool_dtype(dtype) and not serie.hasnans:
+        return [f'<c r="{ref}" t="b"><v>{int(v)}</v></c>' for ref, v in zip(refs, serie.tolist())]
+
+    if pd.api.types.is_integer_dtype(dtype) and not serie.hasnans:
+        return [f'<c r="{ref}"{estilo}><v>{v}</v></c>' for ref, v in zip(refs, serie.tolist())]
+
+    if pd.api.types.is_float_dtype(dtype):
+        valores = serie.to_numpy(dtype=float, na_value=np.nan)
+        return [
+            f'<c r="{ref}"{estilo}><v>{v!r}</v></c>' if math.isfinite(v) else ""
+            for ref, v in zip(refs, valores.tolist())
+        ]
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if getattr(dtype, "tz", None) is not None:
+            raise ValueError(f"Coluna '{serie.name}' tem fuso horário; o Excel não guarda fuso.")
+        return [_celula(ref, v) for ref, v in zip(refs, serie.tolist())]
+
+    if pd.api.types.is_string_dtype(dtype) and not pd.api.types.is_object_dtype(dtype):
+        return [_texto(ref, v) if isinstance(v, str) else "" for ref, v in zip(refs, serie.tolist())]
+
+    return [_celula(ref, v, estilo) for ref, v in zip(refs, serie.tolist())]
+
+
+def _cabecalho_xml(colunas) -> str:
+    celulas = []
+    for i, nome in enumerate(colunas, start=1):
+        celula = _celula(f"{get_column_letter(i)}1", nome)
+        celulas.append(celula.replace(">", f' s="{_S_CABECALHO}">', 1) if celula else "")
+    return f'<row r="1">{"".join(celulas)}</row>'
+
+
+# =========================
+# GRAVAÇÃO
+# =========================
+def _blocos_de(dados, linhas_por_bloco: int):
+    if isinstance(dados, pd.DataFrame):
+        for inicio in range(0, max(len(dados), 1), linhas_por_bloco):
+            yield dados.iloc[inicio:inicio + linhas_por_bloco]
+    else:
+        yield from dados
+
+
+def gravar_banco_xlsx(dados, destino, *, linhas_por_bloco: int = LINHAS_POR_BLOCO, nivel_compressao: int = 1):
+    """
+    Grava o banco consolidado em .xlsx (uma aba "Sheet1", cabeçalho na linha 1,
+    sem índice), como o DataFrame.to_excel(destino, index=False).
+
+    dados: DataFrame ou iterador de DataFrames (blocos com as mesmas colunas;
+           as do primeiro bloco valem para todos).
+    destino: path ou file-like.
+
+    Datas (datetime64) saem com formato dd/mm/aaaa (ou dd/mm/aaaa hh:mm:ss se
+    tiverem hora) e as colunas de custo (COLUNAS_POSSIVEIS["custo"]) com
+    formato de moeda; o valor gravado é o mesmo.
+
+    nivel_compressao: zlib do zip (1 = rápido; o XML repetitivo comprime bem
+    mesmo assim).
+    """
+    if isinstance(destino, (str, os.PathLike)):
+        os.makedirs(os.path.dirname(os.fspath(destino)) or ".", exist_ok=True)
+
+    with ZipFile(destino, "w", ZIP_DEFLATED, allowZip64=True, compresslevel=nivel_compressao) as pacote:
+        with pacote.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as aba:
+            aba.write(_INICIO_ABA.encode("utf-8"))
+
+            colunas = None
+            linha = 2
+            for bloco in _blocos_de(dados, linhas_por_bloco):
+                if colunas is None:
+                    colunas = list(bloco.columns)
+                    letras = [get_column_letter(i) for i in range(1, len(colunas) + 1)]
+                    dinheiro = [str(c).strip().lower() in _COLUNAS_DINHEIRO for c in colunas]
+                    aba.write(_cabecalho_xml(colunas).encode("utf-8"))
+                elif list(bloco.columns) != colunas:
+                    bloco = bloco.reindex(columns=colunas)
+                if not len(bloco):
+                    continue
+
+                por_coluna = [
+                    _celulas_da_coluna(bloco.iloc[:, i], letras[i], linha, dinheiro[i]) for i in range(len(colunas))
+                ]
+                aba.write(
+                    "".join(
+                        f'<row r="{r}">{"".join(celulas)}</row>'
+                        for r, celulas in enumerate(zip(*por_coluna), start=linha)
+                    ).encode("utf-8")
+                )
+                linha += len(bloco)
+
+            aba.write(_FIM_ABA.encode("utf-8"))
+
+        for nome, xml in _PARTES_FIXAS.items():
+            pacote.writestr(nome, xml)
+
+    return destino
@@ -0,0 +1,225 @@
+import re
+import struct
+import zlib
+from xml.sax.saxutils import unescape
+
+from openpyxl.utils import column_index_from_string
+
+
+# =========================
+# CABEÇALHO DE UM .XLSX INCOMPLETO
+# =========================
+# O .xlsx é um zip: o diretório central fica no fim do arquivo e aponta onde
+# começa cada parte (workbook.xml, a primeira aba, sharedStrings.xml). Com o
+# fim do arquivo + o começo dessas partes já dá para ler a primeira linha da
+# primeira aba, sem esperar o resto chegar.
+
+_EOCD = b"PK\x05\x06"
+_CENTRAL = b"PK\x01\x02"
+_LOCAL = b"PK\x03\x04"
+
+_ENTIDADES = {"&quot;": '"', "&apos;": "'"}
+
+_RE_SHEET = re.compile(rb'<(?:\w+:)?sheet\b[^>]*?\br:id="([^"]*)"')
+_RE_REL = re.compile(rb"<Relationship\b[^>]*>")
+_RE_ATTR = re.compile(rb'(\w+)="([^"]*)"')
+_RE_ROW = re.compile(rb"<(?:\w+:)?row\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?row>)", re.S)
+_RE_CELL = re.compile(rb"<(?:\w+:)?c\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)", re.S)
+_RE_V = re.compile(rb"<(?:\w+:)?v>(.*?)</(?:\w+:)?v>", re.S)
+_RE_T = re.compile(rb"<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>", re.S)
+_RE_T_VAZIO = re.compile(rb"<(?:\w+:)?t\s*/>")
+_RE_SI = re.compile(rb"<(?:\w+:)?si>(.*?)</(?:\w+:)?si>", re.S)
+_RE_RPH = re.compile(rb"<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>", re.S)
+_RE_COLUNA = re.compile(rb"([A-Z]+)")
+_RE_VALOR = re.compile(rb"<(?:\w+:)?(?:v|is)>")
+
+# quanto da aba descomprimir no máximo procurando a primeira linha preenchida
+_LIMITE_ABA = 4 * 1024 * 1024
+
+
+class FaltamDados(Exception):
+    """Os bytes necessários ainda não chegaram (ver CabecalhoXlsx.faltando)."""
+
+
+def _texto(xml: bytes) -> str:
+    return unescape(xml.decode("utf-8"), _ENTIDADES)
+
+
+class _Entrada:
+    __slots__ = ("nome", "metodo", "tamanho_comprimido", "offset")
+
+    def __init__(self, nome, metodo, tamanho_comprimido, offset):
+        self.nome = nome
+        self.metodo = metodo
+        self.tamanho_comprimido = tamanho_comprimido
+        self.offset = offset
+
+
+class CabecalhoXlsx:
+    """
+    Lê o cabeçalho (primeira linha preenchida da primeira aba) de um .xlsx
+    que ainda está chegando.
+
+    ler(inicio, fim) -> bytes do intervalo, ou None se algum byte ainda não chegou
+    disponivel(inicio, fim) -> maior trecho contínuo já recebido a partir de inicio
+    tamanho: tamanho final do arquivo
+
+    colunas() devolve os valores do cabeçalho (como na primeira linha do
+    pd.read_excel, antes de normalizar) ou levanta FaltamDados com os
+    intervalos que faltam em `faltando`.
+    """
+
+    def __init__(self, ler, disponivel, tamanho: int):
+        self._ler = ler
+        self._disponivel = disponivel
+        self.tamanho = tamanho
+        self.faltando = []
+        self._entradas = None
+
+    # ---------- bytes ----------
+    def _exigir(self, inicio: int, fim: int) -> bytes:
+        dados = self._ler(inicio, fim)
+        if dados is None:
+            self.faltando.append((inicio, fim))
+            raise FaltamDados()
+        return dados
+
+    # ---------- zip ----------
+    def _diretorio(self) -> dict:
+        if self._entradas is not None:
+            return self._entradas
+
+        # fim do diretório central: 22 bytes + comentário (até 64 KB)
+        inicio = max(0, self.tamanho - (22 + 65535))
+        cauda = self._exigir(inicio, self.tamanho)
+        pos = cauda.rfind(_EOCD)
+        if pos < 0:
+            raise ValueError("Arquivo não é um .xlsx válido.")
+        _, _, _, _, n, tam_dir, ini_dir, _ = struct.unpack("<4s4H2LH", cauda[pos: pos + 22])
+        if ini_dir == 0xFFFFFFFF:
+            raise ValueError("Arquivo zip64 não suportado na validação antecipada.")
+
+        diretorio = self._exigir(ini_dir, ini_dir + tam_dir)
+        entradas = {}
+        p = 0
+        for _ in range(n):
+            if diretorio[p: p + 4] != _CENTRAL:
+                raise ValueError("Diretório do .xlsx corrompido.")
+            (metodo,) = struct.unpack("<H", diretorio[p + 10: p + 12])
+            comp, _, n_nome, n_extra, n_coment = struct.unpack("<2L3H", diretorio[p + 20: p + 34])
+            (offset,) = struct.unpack("<L", diretorio[p + 42: p + 46])
+            nome = diretorio[p + 46: p + 46 + n_nome].decode("utf-8", "replace")
+            entradas[nome] = _Entrada(nome, metodo, comp, offset)
+            p += 46 + n_nome + n_extra + n_coment
+
+        self._entradas = entradas
+        return entradas
+
+    def _inicio_dados(self, entrada: _Entrada) -> int:
+        local = self._exigir(entrada.offset, entrada.offset + 30)
+        if local[:4] != _LOCAL:
+            raise ValueError("Entrada do .xlsx corrompida.")
+        n_nome, n_extra = struct.unpack("<2H", local[26:30])
+        return entrada.offset + 30 + n_nome + n_extra
+
+    def _conteudo(self, nome: str, parar=None, limite=None) -> bytes:
+        """
+        Descomprime a parte `nome` desde o começo. Com `parar(dados)`, para assim
+        que ele devolver True (não precisa da parte inteira, só do começo).
+        """
+        entrada = self._diretorio().get(nome)
+        if entrada is None:
+            raise KeyError(nome)
+        ini = self._inicio_dados(entrada)
+        fim = ini + entrada.tamanho_comprimido
+
+        descomp = zlib.decompressobj(-15) if entrada.metodo == 8 else None
+        dados = b""
+        pos = ini
+        while pos < fim:
+            bloco = self._disponivel(pos, min(fim, pos + 256 * 1024))
+            if not bloco:
+                self.faltando.append((pos, fim))
+                raise FaltamDados()
+            pos += len(bloco)
+            dados += descomp.decompress(bloco) if descomp is not None else bloco
+            if parar is not None and parar(dados):
+                return dados
+            if limite is not None and len(dados) > limite:
+                raise ValueError("Cabeçalho não encontrado no começo da planilha.")
+        if descomp is not None:
+            dados += descomp.flush()
+        return dados
+
+    # ---------- planilha ----------
+    def _primeira_aba(self) -> str:
+        workbook = self._conteudo("xl/workbook.xml")
+        m = _RE_SHEET.search(workbook)
+        if not m:
+            raise ValueError("Planilha sem abas.")
+        rid = m.group(1)
+
+        rels = self._conteudo("xl/_rels/workbook.xml.rels")
+        for rel in _RE_REL.findall(rels):
+            attrs = dict(_RE_ATTR.findall(rel))
+            if attrs.get(b"Id") == rid:
+                alvo = attrs.get(b"Target", b"").decode("utf-8")
+                return alvo.lstrip("/") if alvo.startswith("/") else f"xl/{alvo}"
+        raise ValueError("Aba não encontrada no .xlsx.")
+
+    def colunas(self) -> list:
+        self.faltando = []
+
+        # como no pd.read_excel: linhas sem nenhum valor não contam
+        def primeira_linha(dados):
+            for m in _RE_ROW.finditer(dados):
+                if _RE_VALOR.search(m.group(1) or b""):
+                    return m.group(1)
+            return None
+
+        aba = self._conteudo(self._primeira_aba(), parar=primeira_linha, limite=_LIMITE_ABA)
+        linha = primeira_linha(aba)
+        if linha is None:
+            return []
+
+        celulas = {}
+        indices_compartilhados = {}
+        for m in _RE_CELL.finditer(linha):
+            attrs = dict(_RE_ATTR.findall(m.group(1)))
+            corpo = m.group(2) or b""
+            ref = _RE_COLUNA.match(attrs.get(b"r", b""))
+            col = column_index_from_string(ref.group(1).decode()) if ref else len(celulas) + 1
+            tipo = attrs.get(b"t", b"n")
+
+            if tipo == b"inlineStr":
+                celulas[col] = "".join(_texto(t) for t in _RE_T.findall(_RE_RPH.sub(b"", corpo)))
+                continue
+            v = _RE_V.search(corpo)
+            if v is None:
+                continue
+            if tipo == b"s":
+                indices_compartilhados[col] = int(v.group(1))
+            elif tipo in (b"str", b"e"):
+                celulas[col] = _texto(v.group(1))
+            elif tipo == b"b":
+                celulas[col] = v.group(1) == b"1"
+            else:
+                n = float(v.group(1))
+                celulas[col] = int(n) if n.is_integer() else n
+
+        if indices_compartilhados:
+            maior = max(indices_compartilhados.values())
+            textos = self._conteudo(
+                "xl/sharedStrings.xml",
+                parar=lambda dados: len(_RE_SI.findall(dados)) > maior,
+            )
+            strings = []
+            for si in _RE_SI.findall(textos):
+                si = _RE_RPH.sub(b"", _RE_T_VAZIO.sub(b"", si))
+                strings.append("".join(_texto(t) for t in _RE_T.findall(si)))
+            for col, i in indices_compartilhados.items():
+                celulas[col] = strings[i] if i < len(strings) else None
+
+        if not celulas:
+            return []
+        return [celulas.get(c) for c in range(1, max(celulas) + 1)]
@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from openpyxl.styles import Alignment, Border, Font, Protection
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.fills import Fill
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE
+from openpyxl.xml.functions import fromstring, tostring
+
+
+# Mudou o layout gerado pelo Step2? Incrementar para invalidar o cache antigo.
+# 2: entradas em JSON (antes pickle)
+VERSAO_LAYOUT = 2
+
+# ordem dos objetos de estilo na tupla de estilos_usados
+_CLASSES_ESTILO = (Font, Fill, Border, Alignment, Protection)
+
+# referências a cellXfs dentro do sheet XML: <c s="..">, <row s="..">, <col style="..">
+_RE_ESTILO = re.compile(rb'(<(?:c|row)\b[^>]*?\bs="|<col\b[^>]*?\bstyle=")(\d+)"')
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# =========================
+# ESTILOS (ids do cellXfs são do workbook onde a aba foi gerada)
+# =========================
+def estilos_usados(wb, xml: bytes, a_partir_de: int = 0) -> dict:
+    """
+    {id_no_xml: estilo} com os objetos de estilo (fonte, preenchimento, borda...)
+    de cada id de cellXfs referenciado pelo XML, para reconstruir em outro workbook.
+
+    a_partir_de: só ids >= esse valor (os menores o outro workbook já tem iguais,
+    ex: processos filhos criados a partir do mesmo workbook).
+    """
+    ids = {int(m.group(2)) for m in _RE_ESTILO.finditer(xml)}
+    ids = {i for i in ids if i >= a_partir_de}
+    estilos = {}
+    for i in ids:
+        sa = wb._cell_styles[i]
+        if sa.numFmtId < BUILTIN_FORMATS_MAX_SIZE:
+            fmt = ("id", sa.numFmtId)
+        else:
+            fmt = ("fmt", wb._number_formats[sa.numFmtId - BUILTIN_FORMATS_MAX_SIZE])
+        estilos[i] = (
+            wb._fonts[sa.fontId],
+            wb._fills[sa.fillId],
+            wb._borders[sa.borderId],
+            wb._alignments[sa.alignmentId],
+            wb._protections[sa.protectionId],
+            fmt,
+            sa.pivotButton,
+            sa.quotePrefix,
+            sa.xfId,
+        )
+    return estilos
+
+
+def reutilizar_xml(wb, xml: bytes, estilos: dict) -> bytes:
+    """
+    Registra no workbook os estilos da aba em cache e devolve o XML pronto para ele.
+    Quando os ids coincidem (caso comum) o XML volta intacto, byte a byte.
+    Ids que não estão em `estilos` ficam como estão.
+    """
+    mapa = {}
+    for antigo, (font, fill, border, alignment, protection, fmt, pivot, quote, xf_id) in estilos.items():
+        sa = StyleArray()
+        sa.fontId = wb._fonts.add(font)
+        sa.fillId = wb._fills.add(fill)
+        sa.borderId = wb._borders.add(border)
+        sa.alignmentId = wb._alignments.add(alignment)
+        sa.protectionId = wb._protections.add(protection)
+        if fmt[0] == "id":
+            sa.numFmtId = fmt[1]
+        else:
+            sa.numFmtId = wb._number_formats.add(fmt[1]) + BUILTIN_FORMATS_MAX_SIZE
+        sa.pivotButton = pivot
+        sa.quotePrefix = quote
+        sa.xfId = xf_id
+        mapa[antigo] = wb._cell_styles.add(sa)
+
+    if all(antigo == novo for antigo, novo in mapa.items()):
+        return xml
+
+    def trocar(m):
+        antigo = int(m.group(2))
+        return m.group(1) + str(mapa.get(antigo, antigo)).encode() + b'"'
+
+    return _RE_ESTILO.sub(trocar, xml)
+
+
+# =========================
+# SERIALIZAÇÃO (JSON, sem pickle)
+# =========================
+# Cache e checkpoint ficam em disco e o cache é compartilhado entre sessões:
+# nada ali pode virar código ao ser lido. O XML da aba vai como texto e cada
+# objeto de estilo como o próprio XML do styles.xml (to_tree/from_tree).
+def aba_para_json(xml: bytes, estilos: dict) -> dict:
+    return {
+        "xml": xml.decode("utf-8"),
+        "estilos": {
+            str(i): [tostring(o.to_tree()).decode("utf-8") for o in estilo[:5]] + [list(estilo[5]), *estilo[6:]]
+            for i, estilo in estilos.items()
+        },
+    }
+
+
+def aba_de_json(dados: dict) -> tuple:
+    """(xml, estilos) de aba_para_json."""
+    estilos = {}
+    for i, estilo in dados["estilos"].items():
+        objetos = tuple(cls.from_tree(fromstring(x)) for cls, x in zip(_CLASSES_ESTILO, estilo[:5]))
+        estilos[int(i)] = objetos + (tuple(estilo[5]), *estilo[6:])
+    return dados["xml"].encode("utf-8"), estilos
+
+
+def _gravar_json(p: str, dados) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(tmp, p)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# =========================
+# CACHE EM DISCO (LRU)
+# =========================
+class CacheAbas:
+    """
+    Cache persistente do sheet XML de cada motorista, entre execuções.
+
+    Chave = hash(linhas do motorista + mapeamento de colunas + versão do modelo
+    + VERSAO_LAYOUT). Cada entrada é um arquivo; o mtime marca o último uso e
+    podar() remove as menos usadas recentemente além de max_entradas.
+    """
+
+    def __init__(self, diretorio: str, max_entradas: int = 20000):
+        self.diretorio = diretorio
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.faltas = 0
+        os.makedirs(diretorio, exist_ok=True)
+
+    def chave(self, df_motorista, cols: dict, versao_modelo: str, descontos=None) -> str:
+        h = hashlib.sha256()
+        h.update(f"layout={VERSAO_LAYOUT};modelo={versao_modelo};".encode())
+        if descontos:
+            # linhas (descrição, valor) abaixo de "(-) DESCONTOS" na aba
+            h.update(f"descontos={descontos!r};".encode("utf-8"))
+        h.update(json.dumps(cols, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        h.update(repr(list(df_motorista.columns)).encode("utf-8"))
+        # repr distingue 1, 1.0 e "1" (viram células diferentes na aba)
+        for linha in df_motorista.itertuples(index=False, name=None):
+            h.update(repr(linha).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.aba")
+
+    def contem(self, chave: str) -> bool:
+        """Só verifica se a entrada existe (sem ler nem contar acerto/falta)."""
+        return os.path.exists(self._path(chave))
+
+    def obter(self, chave: str):
+        """
+        Retorna (xml, estilos) ou None.
+        """
+        p = self._path(chave)
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                entrada = json.load(f)
+            if entrada.get("versao") != VERSAO_LAYOUT:
+                raise ValueError("versão antiga")
+            xml, estilos = aba_de_json(entrada)
+            os.utime(p)  # LRU: marca uso
+        except FileNotFoundError:
+            self.faltas += 1
+            return None
+        except Exception:
+            # entrada corrompida / incompatível: descarta
+            self.faltas += 1
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            return None
+
+        self.acertos += 1
+        return xml, estilos
+
+    def guardar(self, chave: str, xml: bytes, estilos: dict) -> None:
+        p = self._path(chave)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        _gravar_json(p, {"versao": VERSAO_LAYOUT, **aba_para_json(xml, estilos)})
+
+    def podar(self) -> int:
+        """
+        Remove as entradas menos usadas recentemente além de max_entradas.
+        Retorna quantas foram removidas.
+        """
+        entradas = []
+        for sub in os.scandir(self.diretorio):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".aba"):
+                    try:
+                        entradas.append((e.stat().st_mtime, e.path))
+                    except FileNotFoundError:
+                        pass
+
+        excesso = len(entradas) - self.max_entradas
+        if excesso <= 0:
+            return 0
+
+        entradas.sort()
+        removidas = 0
+        for _, p in entradas[:excesso]:
+            try:
+                os.remove(p)
+                removidas += 1
+            except FileNotFoundError:
+                pass
+        return removidas
+
+
+# =========================
+# CHECKPOINT (execução interrompida)
+# =========================
+class CheckpointAbas:
+    """
+    Abas já renderizadas de uma execução do Step2 que pode ser interrompida no
+    meio (ex: worker do gunicorn morto pelo timeout). A cada `cada` abas novas
+    um lote é gravado em disco; a próxima execução com a mesma assinatura
+    (mesmo banco, modelo e VERSAO_LAYOUT) reaproveita essas abas pelo nome e
+    só renderiza o resto. Assinatura diferente descarta o checkpoint.
+
+    <diretorio>/meta.json + lote_00001.json, lote_00002.json, ...
+    """
+
+    def __init__(self, diretorio: str, assinatura: str, cada: int = 50):
+        self.diretorio = diretorio
+        self.cada = max(1, cada)
+        self.abas = {}
+        self._novas = {}
+        self._n_lotes = 0
+
+        assinatura = f"layout={VERSAO_LAYOUT};{assinatura}"
+        meta_path = os.path.join(diretorio, "meta.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                valido = json.load(f).get("assinatura") == assinatura
+        except (OSError, ValueError):
+            valido = False
+
+        if not valido:
+            shutil.rmtree(diretorio, ignore_errors=True)
+            os.makedirs(diretorio, exist_ok=True)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"assinatura": assinatura}, f)
+            return
+
+        for nome in sorted(os.listdir(diretorio)):
+            if not (nome.startswith("lote_") and nome.endswith(".json")):
+                continue
+            self._n_lotes += 1
+            try:
+                with open(os.path.join(diretorio, nome), "r", encoding="utf-8") as f:
+                    self.abas.update({aba: aba_de_json(dados) for aba, dados in json.load(f).items()})
+            except Exception:
+                # lote incompleto/corrompido: essas abas só são renderizadas de novo
+                pass
+
+    def __len__(self) -> int:
+        return len(self.abas) + len(self._novas)
+
+    def obter(self, nome_aba: str):
+        """(xml, estilos) da aba, ou None."""
+        return self.abas.get(nome_aba)
+
+    def registrar(self, nome_aba: str, xml: bytes, estilos: dict) -> bool:
+        """
+        Guarda a aba pronta; grava um lote a cada `cada` abas.
+        Retorna True quando um lote foi gravado.
+        """
+        self._novas[nome_aba] = (xml, estilos)
+        if len(self._novas) < self.cada:
+            return False
+        self.gravar()
+        return True
+
+    def gravar(self) -> None:
+        if not self._novas:
+            return
+        self._n_lotes += 1
+        p = os.path.join(self.diretorio, f"lote_{self._n_lotes:05d}.json")
+        _gravar_json(p, {aba: aba_para_json(xml, estilos) for aba, (xml, estilos) in self._novas.items()})
+        self.abas.update(self._novas)
+        self._novas = {}
+
+    def limpar(self) -> None:
+        """Execução concluída: o checkpoint não serve mais."""
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        self.abas = {}
+        self._novas = {}
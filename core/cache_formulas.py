@@ -0,0 +1,93 @@
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.sax.saxutils import unescape
+
+
+# openpyxl grava fórmula como <c r="B6" s="3"><f>SUM(...)</f><v /></c> (sem resultado)
+_RE_CELULA_FORMULA = re.compile(r'<c r="([A-Z]+[0-9]+)"([^>]*)><f>([^<]*)</f><v\s*/>')
+_RE_SHEET = re.compile(r'<sheet\b[^>]*?\bname="([^"]*)"[^>]*?\br:id="([^"]*)"')
+_RE_REL = re.compile(r"<Relationship\b[^>]*>")
+_RE_ATTR = re.compile(r'(\w+)="([^"]*)"')
+
+
+def _formatar_numero(valor) -> str:
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, int):
+        return str(valor)
+    return repr(float(valor))
+
+
+def _partes_das_abas(zf: zipfile.ZipFile) -> dict:
+    """
+    Mapeia nome da aba -> caminho da parte XML dentro do pacote
+    (xl/workbook.xml + xl/_rels/workbook.xml.rels).
+    """
+    workbook_xml = zf.read("xl/workbook.xml").decode("utf-8")
+    rels_xml = zf.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+
+    alvos = {}
+    for rel in _RE_REL.findall(rels_xml):
+        attrs = dict(_RE_ATTR.findall(rel))
+        alvo = attrs.get("Target", "")
+        alvo = alvo.lstrip("/") if alvo.startswith("/") else f"xl/{alvo}"
+        alvos[attrs.get("Id")] = alvo
+
+    return {unescape(nome, {"&quot;": '"', "&apos;": "'"}): alvos.get(rid) for nome, rid in _RE_SHEET.findall(workbook_xml)}
+
+
+def gravar_resultados_formulas(xlsx_path: str, resultados: dict) -> int:
+    """
+    Grava o resultado já calculado (<v>) ao lado de cada fórmula.
+
+    resultados: {nome_da_aba: {"F30": 123.45, ...}}
+
+    O openpyxl salva fórmulas sem valor em cache, então quem lê o arquivo com
+    data_only=True recebe None até o Excel recalcular. Aqui o pacote é
+    reescrito (só as abas envolvidas mudam) preenchendo esses <v>.
+
+    Retorna quantas células receberam valor.
+    """
+    if not resultados:
+        return 0
+
+    total = 0
+    pasta = os.path.dirname(os.path.abspath(xlsx_path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=pasta)
+    os.close(fd)
+
+    try:
+        with zipfile.ZipFile(xlsx_path, "r") as zin, zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zout:
+            partes = _partes_das_abas(zin)
+            valores_por_parte = {
+                partes[aba]: valores for aba, valores in resultados.items() if partes.get(aba) and valores
+            }
+
+            for item in zin.infolist():
+                valores = valores_por_parte.get(item.filename)
+                if valores is None:
+                    with zin.open(item) as src, zout.open(item, "w") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    continue
+
+                xml = zin.read(item).decode("utf-8")
+
+                def _preencher(m):
+                    nonlocal total
+                    coord = m.group(1)
+                    if coord not in valores:
+                        return m.group(0)
+                    total += 1
+                    return f'<c r="{coord}"{m.group(2)}><f>{m.group(3)}</f><v>{_formatar_numero(valores[coord])}</v>'
+
+                zout.writestr(item, _RE_CELULA_FORMULA.sub(_preencher, xml))
+
+        os.replace(tmp_path, xlsx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return total
@@ -0,0 +1,201 @@
+import json
+import os
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+from core.banco import norm_nome_key, norm_nome_keys
+
+
+# =========================
+# CONCILIAÇÃO DE NOMES (fechamento x motoristas)
+# =========================
+# O Step1 junta fechamento e motoristas pelo nome exato; quem não casa fica
+# sem dados bancários (INEXISTENTE na aba). Aqui cada nome sem cadastro recebe
+# candidatos do motoristas.xlsx sem comparar com todos os nomes:
+#
+# - índice de blocagem: cada nome cadastrado entra nos blocos dos prefixos e
+#   sufixos (3 letras) de cada palavra. Um nome com erro de digitação ainda
+#   divide blocos com o certo (o erro raramente pega começo e fim de todas as
+#   palavras), então só os nomes desses blocos são comparados.
+# - os candidatos que dividem mais blocos com o nome (blocos pequenos, de
+#   palavras raras, valem mais que os de "silva", "santos") são os únicos
+#   comparados por similaridade de texto (SequenceMatcher no nome normalizado
+#   e com as palavras em ordem alfabética), no máximo MAX_COMPARACOES por nome.
+#
+# Associações aceitas viram apelidos (arquivo JSON: chave do nome no
+# fechamento -> nome como está no cadastro), aplicados antes do merge nas
+# próximas execuções.
+TAMANHO_PREFIXO = 3
+PALAVRAS_IGNORADAS = {"de", "da", "do", "das", "dos", "e"}
+MAX_COMPARACOES = 30
+
+
+def chaves_de_bloco(chave: str) -> set:
+    """
+    Blocos de um nome já normalizado (norm_nome_key): prefixo e sufixo de cada palavra.
+    """
+    blocos = set()
+    for palavra in chave.split():
+        if palavra in PALAVRAS_IGNORADAS:
+            continue
+        blocos.add(f"<{palavra[:TAMANHO_PREFIXO]}")
+        blocos.add(f">{palavra[-TAMANHO_PREFIXO:]}")
+    return blocos
+
+
+def similaridade(a: str, b: str) -> float:
+    """
+    0..1 entre dois nomes já normalizados; palavras fora de ordem
+    ("SILVA JOAO" x "JOAO SILVA") também contam como iguais.
+    """
+    if a == b:
+        return 1.0
+    direta = SequenceMatcher(None, a, b, autojunk=False).ratio()
+    ordenada = SequenceMatcher(None, " ".join(sorted(a.split())), " ".join(sorted(b.split())), autojunk=False).ratio()
+    return max(direta, ordenada)
+
+
+class IndiceNomes:
+    """
+    Índice de blocagem dos nomes cadastrados.
+
+    Uso:
+        indice = IndiceNomes(motoristas["nome do motorista"])
+        indice.candidatos("JOAO DA SILVA")   # [("JOÃO DA SILVA", 1.0), ...]
+    """
+
+    def __init__(self, nomes):
+        self._nomes = {}     # chave -> nome como está no cadastro (o primeiro)
+        self._blocos = {}    # bloco -> [chaves]
+        for nome in nomes:
+            chave = norm_nome_key(nome)
+            if not chave or chave in self._nomes:
+                continue
+            self._nomes[chave] = nome
+            for bloco in chaves_de_bloco(chave):
+                self._blocos.setdefault(bloco, []).append(chave)
+
+    def __len__(self) -> int:
+        return len(self._nomes)
+
+    def candidatos(self, nome, *, limite: int = 3, minimo: float = 0.6) -> list:
+        """
+        Até `limite` (nome_cadastrado, similaridade) com similaridade >= minimo,
+        do mais parecido para o menos.
+        """
+        chave = norm_nome_key(nome)
+        if not chave:
+            return []
+        if chave in self._nomes:
+            return [(self._nomes[chave], 1.0)]
+
+        blocos = [self._blocos[b] for b in chaves_de_bloco(chave) if b in self._blocos]
+        if not blocos:
+            return []
+        # candidatos que dividem mais blocos (peso maior para bloco pequeno = mais raro);
+        # contar é barato, o caro é a similaridade, limitada a MAX_COMPARACOES
+        peso = {}
+        for bloco in blocos:
+            p = 1.0 / len(bloco)
+            for c in bloco:
+                peso[c] = peso.get(c, 0.0) + 1.0 + p
+        comparar = sorted(peso, key=peso.get, reverse=True)[:MAX_COMPARACOES]
+
+        notas = [(c, similaridade(chave, c)) for c in comparar]
+        notas = [(c, n) for c, n in notas if n >= minimo]
+        notas.sort(key=lambda x: (-x[1], x[0]))
+        return [(self._nomes[c], round(n, 3)) for c, n in notas[:limite]]
+
+
+def nomes_sem_cadastro(nomes_fechamento: pd.Series, nomes_motoristas: pd.Series) -> pd.DataFrame:
+    """
+    Nomes do fechamento que não casam com nenhum do motoristas (mesma regra
+    do merge do Step1: valor exato), com a quantidade de linhas de cada um.
+    Retorna DataFrame(nome, linhas), na ordem do fechamento.
+    """
+    nomes = nomes_fechamento.dropna()
+    sem = nomes[~nomes.isin(set(nomes_motoristas.dropna()))]
+    contagem = sem.value_counts(sort=False)
+    return pd.DataFrame({"nome": contagem.index, "linhas": contagem.values})
+
+
+def propor_correspondencias(
+    nomes_fechamento: pd.Series,
+    nomes_motoristas: pd.Series,
+    *,
+    limite: int = 3,
+    minimo: float = 0.6,
+) -> list:
+    """
+    Para cada nome do fechamento sem cadastro:
+      {"nome", "linhas", "candidatos": [{"nome", "similaridade"}, ...]}
+    """
+    sem = nomes_sem_cadastro(nomes_fechamento, nomes_motoristas)
+    if sem.empty:
+        return []
+    indice = IndiceNomes(nomes_motoristas.dropna().drop_duplicates())
+    return [
+        {
+            "nome": str(nome),
+            "linhas": int(linhas),
+            "candidatos": [
+                {"nome": str(c), "similaridade": n} for c, n in indice.candidatos(nome, limite=limite, minimo=minimo)
+            ],
+        }
+        for nome, linhas in sem.itertuples(index=False, name=None)
+    ]
+
+
+# =========================
+# APELIDOS (associações aceitas)
+# =========================
+def carregar_aliases(path: str) -> dict:
+    """
+    {chave do nome no fechamento: nome no cadastro}; {} se o arquivo não existe.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def salvar_aliases(path: str, aceitos: dict) -> dict:
+    """
+    Acrescenta associações aceitas {nome no fechamento: nome no cadastro} aos
+    apelidos gravados em `path` (nome no cadastro vazio remove o apelido).
+    Retorna os apelidos resultantes.
+    """
+    aliases = carregar_aliases(path)
+    for de, para in aceitos.items():
+        chave = norm_nome_key(de)
+        if not chave:
+            continue
+        if para is None or str(para).strip() == "":
+            aliases.pop(chave, None)
+        else:
+            aliases[chave] = str(para)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return aliases
+
+
+def aplicar_aliases(nomes: pd.Series, aliases: dict, nomes_motoristas: pd.Series) -> pd.Series:
+    """
+    Troca os nomes do fechamento que não estão no cadastro pelo nome do
+    cadastro associado à chave deles (vetorizado: uma chave por nome distinto).
+    Nome que já casa com o cadastro fica como está.
+    """
+    if not aliases:
+        return nomes
+    cadastrados = set(nomes_motoristas.dropna())
+    trocados = norm_nome_keys(nomes).map(aliases)
+    trocar = trocados.notna() & ~nomes.isin(cadastrados)
+    if not trocar.any():
+        return nomes
+    return nomes.astype(object).where(~trocar, trocados)
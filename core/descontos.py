@@ -0,0 +1,169 @@
+import pandas as pd
+
+from core.banco import norm_nome_keys
+from core.entrada import ler_entrada
+
+
+# =========================
+# DESCONTOS EM LOTE
+# =========================
+# Planilha opcional (.xlsx, .csv ou .parquet) com uma linha por desconto:
+# motorista, descrição, valor. O Step2 escreve os descontos nas linhas abaixo
+# de "(-) DESCONTOS" da aba de cada motorista, e a fórmula que já soma essas
+# linhas faz o RESUMO/RESUMO TOTAL saírem com Desconto e Valor Líquido certos.
+#
+# O motorista é casado com o do banco consolidado pela chave do nome
+# (norm_nome_key: sem acento, sem diferenciar maiúsculas, espaços colapsados).
+# Nome que não existe no banco é erro: desconto ignorado em silêncio vira
+# pagamento a mais.
+COLUNAS_DESCONTOS = {
+    "motorista": ["nome do motorista", "motorista", "nome"],
+    "descricao": ["descrição", "descricao", "descrição do desconto", "descricao do desconto", "motivo", "histórico", "historico"],
+    "valor": ["valor", "desconto", "valor do desconto", "valor desconto"],
+}
+
+# linhas da aba entre "(-) DESCONTOS" e o valor líquido (layout do Step2)
+LINHAS_DESCONTO = 5
+
+_MAX_NOMES_NO_ERRO = 10
+
+
+def _numeros(serie: pd.Series) -> pd.Series:
+    """
+    Valores como número: células numéricas como estão; texto no formato
+    brasileiro ("R$ 1.234,56", "50,00") ou com ponto decimal ("50.5").
+    Inválido -> NaN.
+    """
+    numeros = pd.to_numeric(serie, errors="coerce")
+    texto = serie[numeros.isna() & serie.notna()]
+    if texto.empty:
+        return numeros.astype(float)
+
+    texto = texto.astype(str).str.replace("R$", "", regex=False).str.replace(r"\s+", "", regex=True)
+    com_virgula = texto.str.contains(",", regex=False)
+    texto = texto.where(~com_virgula, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return numeros.astype(float).fillna(pd.to_numeric(texto, errors="coerce"))
+
+
+def validar_cabecalho_descontos(colunas) -> None:
+    """
+    Confere as colunas (já normalizadas: strip + lower) da planilha de
+    descontos; serve também só para o cabeçalho (upload em partes).
+    """
+    colunas = set(colunas)
+    if not any(c in colunas for c in COLUNAS_DESCONTOS["motorista"]):
+        raise Exception("Coluna 'nome do motorista' não encontrada na planilha de descontos.")
+    if not any(c in colunas for c in COLUNAS_DESCONTOS["valor"]):
+        raise Exception("Coluna 'valor' não encontrada na planilha de descontos.")
+
+
+def ler_descontos(src, *, encoding: str = None, delimitador: str = None) -> pd.DataFrame:
+    """
+    Lê a planilha de descontos. Retorna DataFrame(motorista, descricao, valor),
+    sem as linhas totalmente vazias, na ordem do arquivo.
+    encoding/delimitador só valem para CSV (None = detectar).
+    """
+    df = ler_entrada(src, encoding=encoding, delimitador=delimitador)
+    df.columns = df.columns.astype(str).str.strip().str.lower()
+    validar_cabecalho_descontos(df.columns)
+
+    def achar_coluna(campo):
+        return next((c for c in COLUNAS_DESCONTOS[campo] if c in df.columns), None)
+
+    col_motorista = achar_coluna("motorista")
+    col_valor = achar_coluna("valor")
+    col_descricao = achar_coluna("descricao")
+
+    motorista = df[col_motorista].astype(object).where(df[col_motorista].notna(), "").map(str).str.strip()
+    descricao = (
+        df[col_descricao].astype(object).where(df[col_descricao].notna(), "").map(str).str.strip()
+        if col_descricao
+        else pd.Series("", index=df.index)
+    )
+    valor = _numeros(df[col_valor])
+
+    preenchida = (motorista != "") | df[col_valor].notna()
+    invalidas = preenchida & ((motorista == "") | valor.isna())
+    if invalidas.any():
+        # +2: cabeçalho na linha 1 e índice começando em 0
+        linhas = ", ".join(str(i + 2) for i in invalidas[invalidas].index[:_MAX_NOMES_NO_ERRO])
+        raise ValueError(f"Planilha de descontos: motorista ou valor inválido na(s) linha(s) {linhas}.")
+
+    out = pd.DataFrame({"motorista": motorista, "descricao": descricao, "valor": valor})[preenchida]
+    return out.reset_index(drop=True)
+
+
+def juntar_descontos(descontos: pd.DataFrame, motoristas: pd.Series) -> pd.DataFrame:
+    """
+    Casa cada desconto com o nome do motorista como está no banco (merge pela
+    chave do nome) e deixa no máximo LINHAS_DESCONTO linhas por motorista: a
+    partir da última, os excedentes viram uma linha "OUTROS DESCONTOS (n)" com
+    a soma deles (o total do motorista não muda).
+
+    descontos: saída de ler_descontos
+    motoristas: coluna de motoristas do banco consolidado
+
+    Retorna DataFrame(motorista, descricao, valor), na ordem do arquivo.
+    Levanta ValueError se algum motorista da planilha não estiver no banco ou
+    casar com mais de um motorista do banco.
+    """
+    banco = pd.DataFrame({"motorista_banco": motoristas.dropna().drop_duplicates()})
+    banco["_chave"] = norm_nome_keys(banco["motorista_banco"])
+
+    juntos = descontos.assign(_chave=norm_nome_keys(descontos["motorista"]))
+
+    # dois motoristas do banco com a mesma chave ("José Silva" e "JOSE SILVA"): não dá
+    # para saber de qual é o desconto (ficar com um deixaria o outro sem nenhum)
+    repetidas = banco[banco["_chave"].duplicated(keep=False) & banco["_chave"].isin(juntos["_chave"])]
+    if not repetidas.empty:
+        grupos = [" / ".join(g) for _, g in repetidas.groupby("_chave", sort=False)["motorista_banco"]]
+        nomes = "; ".join(grupos[:_MAX_NOMES_NO_ERRO])
+        if len(grupos) > _MAX_NOMES_NO_ERRO:
+            nomes += f" (+{len(grupos) - _MAX_NOMES_NO_ERRO})"
+        raise ValueError(f"Descontos com nome ambíguo (mais de um motorista no banco consolidado): {nomes}.")
+
+    juntos = juntos.merge(banco, on="_chave", how="left")
+
+    sem_motorista = juntos.loc[juntos["motorista_banco"].isna(), "motorista"].drop_duplicates().tolist()
+    if sem_motorista:
+        nomes = ", ".join(sem_motorista[:_MAX_NOMES_NO_ERRO])
+        if len(sem_motorista) > _MAX_NOMES_NO_ERRO:
+            nomes += f" (+{len(sem_motorista) - _MAX_NOMES_NO_ERRO})"
+        raise ValueError(f"Descontos de motorista(s) que não estão no banco consolidado: {nomes}.")
+
+    juntos = pd.DataFrame({"motorista": juntos["motorista_banco"], "descricao": juntos["descricao"], "valor": juntos["valor"]})
+
+    grupos = juntos.groupby("motorista", sort=False)
+    posicao = grupos.cumcount()
+    excedente = (grupos["valor"].transform("size") > LINHAS_DESCONTO) & (posicao >= LINHAS_DESCONTO - 1)
+    if not excedente.any():
+        return juntos
+
+    outros = juntos[excedente].groupby("motorista", sort=False)["valor"].agg(["sum", "size"]).reset_index()
+    outros = pd.DataFrame(
+        {
+            "motorista": outros["motorista"],
+            "descricao": "OUTROS DESCONTOS (" + outros["size"].astype(str) + ")",
+            "valor": outros["sum"],
+        }
+    )
+    # no lugar da primeira linha excedente de cada motorista (logo depois das mantidas)
+    outros.index = juntos.index[excedente].to_series().groupby(juntos["motorista"][excedente], sort=False).first().values
+    return pd.concat([juntos[~excedente], outros]).sort_index(kind="stable").reset_index(drop=True)
+
+
+def agrupar_por_motorista(juntos: pd.DataFrame) -> dict:
+    """
+    {motorista: [(descricao, valor), ...]} a partir de juntar_descontos.
+    """
+    por = {}
+    for m, descricao, valor in juntos[["motorista", "descricao", "valor"]].itertuples(index=False, name=None):
+        por.setdefault(m, []).append((descricao, valor))
+    return por
+
+
+def total_por_motorista(juntos: pd.DataFrame) -> pd.Series:
+    """
+    Soma dos descontos de cada motorista (índice = motorista do banco).
+    """
+    return juntos.groupby("motorista", sort=False)["valor"].sum()
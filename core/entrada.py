@@ -0,0 +1,233 @@
+import codecs
+import csv
+import io
+import os
+import struct
+
+import pandas as pd
+
+from core.cabecalho_xlsx import FaltamDados
+
+
+# =========================
+# FORMATOS DE ENTRADA DO STEP1 (motoristas e fechamento)
+# =========================
+# .xlsx (pd.read_excel), .csv e .parquet. O formato vem da extensão (path ou
+# .filename/.name do file-like) e, sem extensão conhecida, dos primeiros bytes.
+FORMATOS_ENTRADA = (".xlsx", ".csv", ".parquet")
+
+# CSV: encoding/delimitador explícitos ou detectados na amostra do começo do arquivo.
+# utf-8-sig aceita UTF-8 com e sem BOM; cp1252 é o "ANSI" do Excel/Windows em português.
+ENCODINGS_CSV = ("utf-8-sig", "cp1252")
+DELIMITADORES_CSV = (";", ",", "\t", "|")
+_AMOSTRA_CSV = 64 * 1024
+
+_MAGICO_PARQUET = b"PAR1"
+_MAGICO_ZIP = b"PK\x03\x04"
+
+
+def _nome_de(src) -> str:
+    if isinstance(src, (str, os.PathLike)):
+        return os.fspath(src)
+    return str(getattr(src, "filename", None) or getattr(src, "name", None) or "")
+
+
+def _inicio(src, n: int) -> bytes:
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, "rb") as f:
+            return f.read(n)
+    if isinstance(src, bytes):
+        return src[:n]
+    pos = src.tell()
+    dados = src.read(n)
+    src.seek(pos)
+    return dados
+
+
+def formato_entrada(src) -> str:
+    """
+    ".xlsx", ".csv" ou ".parquet" de um path, file-like ou bytes.
+    """
+    ext = os.path.splitext(_nome_de(src).lower())[1]
+    if ext in FORMATOS_ENTRADA:
+        return ext
+    magico = _inicio(src, 4)
+    if magico == _MAGICO_PARQUET:
+        return ".parquet"
+    if magico == _MAGICO_ZIP:
+        return ".xlsx"
+    return ".csv"
+
+
+# =========================
+# CSV
+# =========================
+def detectar_csv(amostra: bytes, encoding: str = None, delimitador: str = None) -> tuple:
+    """
+    (encoding, delimitador) do CSV a partir dos primeiros bytes. Valores
+    informados são usados como vieram; os outros são detectados:
+    - encoding: o primeiro de ENCODINGS_CSV que decodifica a amostra
+    - delimitador: o de DELIMITADORES_CSV que o csv.Sniffer escolher no cabeçalho
+      e nas primeiras linhas; se ele não decidir, o que mais aparece no cabeçalho
+    """
+    if not encoding:
+        for enc in ENCODINGS_CSV:
+            try:
+                # final=False: a amostra pode cortar um caractere multibyte no fim
+                codecs.getincrementaldecoder(enc)().decode(amostra, final=False)
+                encoding = enc
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            raise ValueError(f"Encoding do CSV não reconhecido (tente {' ou '.join(ENCODINGS_CSV)}).")
+
+    if not delimitador:
+        texto = amostra.decode(encoding, errors="ignore")
+        linhas = texto.splitlines()
+        if len(linhas) > 1 and not texto.endswith(("\n", "\r")):
+            linhas = linhas[:-1]  # última linha pode estar cortada
+        try:
+            delimitador = csv.Sniffer().sniff("\n".join(linhas[:20]), delimiters="".join(DELIMITADORES_CSV)).delimiter
+        except csv.Error:
+            cabecalho = linhas[0] if linhas else ""
+            delimitador = max(DELIMITADORES_CSV, key=cabecalho.count)
+
+    return encoding, delimitador
+
+
+def tipar_csv(df: pd.DataFrame, decimal: str = ".") -> pd.DataFrame:
+    """
+    Tipos como o pd.read_excel devolveria (no .xlsx cada célula tem o seu):
+    texto que é número vira número, o resto continua texto (ex: custo "x" no
+    meio de valores). Coluna com algum valor com zero à esquerda (CPF, agência,
+    conta) fica toda como texto, sem perder os zeros.
+    """
+    for col in df.columns:
+        texto = df[col].dropna()
+        if texto.empty or texto.str.match(r"-?0\d").any():
+            continue
+        numeros = pd.to_numeric(texto.str.replace(decimal, ".", regex=False) if decimal != "." else texto, errors="coerce")
+        if numeros.notna().all():
+            df[col] = numeros.reindex(df.index)
+        elif numeros.notna().any():
+            # coluna mista: cada número como o openpyxl devolve (float inteiro vira int)
+            numeros = numeros.dropna()
+            numeros = pd.Series([int(v) if v.is_integer() else float(v) for v in numeros], index=numeros.index, dtype=object)
+            df[col] = df[col].astype(object).where(~df.index.isin(numeros.index), numeros.reindex(df.index))
+    return df
+
+
+def ler_csv(src, *, encoding: str = None, delimitador: str = None, linhas_por_bloco: int = None):
+    """
+    pd.read_csv com encoding/delimitador resolvidos por detectar_csv, tudo
+    lido como texto e tipado por tipar_csv. Com delimitador ";" (CSV do Excel
+    em português) a vírgula é o separador decimal.
+    Com linhas_por_bloco devolve um iterador de DataFrames.
+    """
+    encoding, delimitador = detectar_csv(_inicio(src, _AMOSTRA_CSV), encoding, delimitador)
+    decimal = "," if delimitador == ";" else "."
+    lido = pd.read_csv(src, sep=delimitador, encoding=encoding, dtype=str, chunksize=linhas_por_bloco or None)
+    if not linhas_por_bloco:
+        return tipar_csv(lido, decimal)
+    return (tipar_csv(bloco, decimal) for bloco in lido)
+
+
+# =========================
+# PARQUET
+# =========================
+def ler_parquet(src, *, linhas_por_bloco: int = None):
+    """
+    pd.read_parquet (pyarrow). Com linhas_por_bloco devolve um iterador de
+    DataFrames (um por lote do arquivo), sem carregar tudo.
+    """
+    if not linhas_por_bloco:
+        return pd.read_parquet(src)
+
+    import pyarrow.parquet as pq
+
+    def blocos():
+        arquivo = pq.ParquetFile(src)
+        for lote in arquivo.iter_batches(batch_size=linhas_por_bloco):
+            yield lote.to_pandas()
+
+    return blocos()
+
+
+def ler_entrada(src, *, encoding: str = None, delimitador: str = None) -> pd.DataFrame:
+    """
+    Lê .xlsx, .csv ou .parquet inteiro (colunas como estão no arquivo).
+    encoding/delimitador só valem para CSV (None = detectar).
+    """
+    formato = formato_entrada(src)
+    if formato == ".csv":
+        return ler_csv(src, encoding=encoding, delimitador=delimitador)
+    if formato == ".parquet":
+        return ler_parquet(src)
+    return pd.read_excel(src)
+
+
+# =========================
+# CABEÇALHO DE UM ARQUIVO INCOMPLETO (upload em partes)
+# =========================
+# Mesma interface do CabecalhoXlsx: ler(inicio, fim) -> bytes ou None,
+# disponivel(inicio, fim) -> bytes contíguos já recebidos a partir de inicio.
+class CabecalhoCsv:
+    """
+    Primeira linha do CSV, assim que o começo do arquivo chegou.
+    """
+
+    def __init__(self, ler, disponivel, tamanho: int, *, encoding: str = None, delimitador: str = None):
+        self._disponivel = disponivel
+        self.tamanho = tamanho
+        self.encoding = encoding
+        self.delimitador = delimitador
+        self.faltando = []
+
+    def colunas(self) -> list:
+        self.faltando = []
+        fim = min(self.tamanho, _AMOSTRA_CSV)
+        amostra = self._disponivel(0, fim)
+        if len(amostra) < fim and b"\n" not in amostra:
+            self.faltando.append((len(amostra), fim))
+            raise FaltamDados()
+
+        encoding, delimitador = detectar_csv(amostra, self.encoding, self.delimitador)
+        primeira = amostra.decode(encoding, errors="ignore").splitlines()[0] if amostra else ""
+        return next(csv.reader([primeira], delimiter=delimitador), [])
+
+
+class CabecalhoParquet:
+    """
+    Nomes das colunas do .parquet a partir do rodapé (metadados no fim do
+    arquivo: ... <metadados> <tamanho de 4 bytes> PAR1), sem o resto.
+    """
+
+    def __init__(self, ler, disponivel, tamanho: int):
+        self._ler = ler
+        self.tamanho = tamanho
+        self.faltando = []
+
+    def _exigir(self, inicio: int, fim: int) -> bytes:
+        dados = self._ler(inicio, fim)
+        if dados is None:
+            self.faltando.append((inicio, fim))
+            raise FaltamDados()
+        return dados
+
+    def colunas(self) -> list:
+        self.faltando = []
+        if self.tamanho < 12:
+            raise ValueError("Arquivo parquet inválido.")
+        fim = self._exigir(self.tamanho - 8, self.tamanho)
+        if fim[4:] != _MAGICO_PARQUET:
+            raise ValueError("Arquivo parquet inválido.")
+        (n,) = struct.unpack("<I", fim[:4])
+        if n + 12 > self.tamanho:
+            raise ValueError("Arquivo parquet inválido.")
+        metadados = self._exigir(self.tamanho - 8 - n, self.tamanho - 8)
+
+        import pyarrow.parquet as pq
+
+        # PAR1 + rodapé já é um parquet válido para ler só o esquema
+        return list(pq.ParquetFile(io.BytesIO(_MAGICO_PARQUET + metadados + fim)).schema_arrow.names)
@@ -0,0 +1,168 @@
+import json
+from io import StringIO
+
+import pandas as pd
+
+from core.banco import ler_banco
+from core.descontos import juntar_descontos, ler_descontos, total_por_motorista
+from core.totais import (
+    dados_bancarios,
+    matriz_resumo_total,
+    preparar,
+    totais_por_motorista,
+    totais_por_motorista_cliente,
+)
+
+
+FORMATOS_EXPORTACAO = ("csv", "json")
+
+CAMPOS_BANCARIOS = ["contrato", "banco", "agencia", "conta", "favorecido", "cpf_cnpj", "pix"]
+
+
+def _arred(v) -> float:
+    return round(float(v), 2)
+
+
+def montar_pagamentos(banco, descontos=None) -> dict:
+    """
+    Totais de pagamento calculados direto do banco consolidado (sem abrir o XLSX final).
+
+    banco: DataFrame já lido ou path/file-like do banco_consolidado.xlsx
+    descontos: planilha de descontos (path/file-like, DataFrame do
+      ler_descontos ou já juntado pelo juntar_descontos); None = sem descontos
+
+    Retorna:
+      {
+        "clientes": [nomes na ordem do banco],
+        "motoristas": DataFrame (1 linha por motorista: totais + dados bancários),
+        "por_cliente": DataFrame (motorista, cliente, quantidade, valor, romaneios),
+      }
+    """
+    df = banco if isinstance(banco, pd.DataFrame) else ler_banco(banco)
+    cols = preparar(df)
+
+    por_cliente = totais_por_motorista_cliente(df, cols)
+    motoristas = totais_por_motorista(df, cols).merge(dados_bancarios(df, cols), on="motorista", how="left")
+
+    # sem planilha de descontos eles são lançados à mão na aba; aqui o bruto é o próprio líquido
+    motoristas["desconto"] = 0.0
+    if descontos is not None:
+        if not isinstance(descontos, pd.DataFrame):
+            descontos = ler_descontos(descontos)
+        totais_desconto = total_por_motorista(juntar_descontos(descontos, df[cols["motorista"]]))
+        motoristas["desconto"] = motoristas["motorista"].map(totais_desconto).fillna(0.0).astype(float)
+    motoristas["valor_liquido"] = motoristas["valor_bruto"] - motoristas["desconto"]
+
+    clientes = df["cliente"].dropna().drop_duplicates().tolist()
+
+    return {"clientes": clientes, "motoristas": motoristas, "por_cliente": por_cliente}
+
+
+def montar_resumo_total(banco) -> dict:
+    """
+    RESUMO TOTAL (motorista x cliente) calculado direto do banco, pronto para JSON.
+
+    banco: DataFrame já lido ou path/file-like do banco_consolidado.xlsx
+
+    Retorna:
+      {
+        "clientes": [nomes na ordem do banco],
+        "motoristas": [{"motorista", "clientes": {cliente: valor}, "valor_bruto"}, ...],
+        "totais": {"clientes": {cliente: valor}, "valor_bruto"},
+      }
+    Cliente sem linhas no mapeamento da aba do motorista não aparece no dict dele
+    (célula vazia no RESUMO TOTAL).
+    """
+    df = banco if isinstance(banco, pd.DataFrame) else ler_banco(banco)
+    matriz = matriz_resumo_total(df, preparar(df))
+
+    clientes = [str(c) for c in matriz.columns]
+    brutos = matriz.sum(axis=1)
+    lista = [
+        {
+            "motorista": str(m),
+            "clientes": {c: _arred(v) for c, v in zip(clientes, linha) if not pd.isna(v)},
+            "valor_bruto": _arred(bruto),
+        }
+        for m, linha, bruto in zip(matriz.index, matriz.itertuples(index=False, name=None), brutos)
+    ]
+
+    return {
+        "clientes": clientes,
+        "motoristas": lista,
+        "totais": {
+            "clientes": {c: _arred(v) for c, v in zip(clientes, matriz.sum(axis=0))},
+            "valor_bruto": _arred(brutos.sum()),
+        },
+    }
+
+
+def exportar_pagamentos(banco, formato: str = "csv", descontos=None) -> bytes:
+    """
+    Exportação compacta por motorista (para o sistema de pagamento).
+
+    - csv: uma linha por motorista (quantidade, bruto, desconto, líquido, dados bancários)
+           + uma coluna por cliente com o valor daquele cliente
+    - json: {"motoristas": [...], "clientes": [...], "totais": {...}}
+
+    descontos: como no montar_pagamentos
+    """
+    formato = (formato or "").lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato inválido: {formato} (use csv ou json).")
+
+    dados = montar_pagamentos(banco, descontos)
+    motoristas = dados["motoristas"]
+    por_cliente = dados["por_cliente"]
+    clientes = dados["clientes"]
+
+    if formato == "csv":
+        pivot = por_cliente.pivot_table(index="motorista", columns="cliente", values="valor", aggfunc="sum", sort=False)
+        pivot = pivot.reindex(columns=clientes).fillna(0.0).round(2)
+        pivot.columns = [f"cliente: {c}" for c in pivot.columns]
+
+        out = motoristas[["motorista", "quantidade", "romaneios", "valor_bruto", "desconto", "valor_liquido"] + CAMPOS_BANCARIOS]
+        out = out.round({"valor_bruto": 2, "desconto": 2, "valor_liquido": 2})
+        out = out.merge(pivot, left_on="motorista", right_index=True, how="left")
+
+        buf = StringIO()
+        out.to_csv(buf, index=False)
+        return buf.getvalue().encode("utf-8")
+
+    valores_cliente = {}
+    for m, cli, v in por_cliente[["motorista", "cliente", "valor"]].itertuples(index=False, name=None):
+        valores_cliente.setdefault(m, {})[str(cli)] = _arred(v)
+
+    lista = []
+    for r in motoristas.to_dict("records"):
+        item = {
+            "motorista": str(r["motorista"]),
+            "quantidade": int(r["quantidade"]),
+            "romaneios": int(r["romaneios"]),
+            "valor_bruto": _arred(r["valor_bruto"]),
+            "desconto": _arred(r["desconto"]),
+            "valor_liquido": _arred(r["valor_liquido"]),
+            "clientes": valores_cliente.get(r["motorista"], {}),
+        }
+        item.update({c: "" if pd.isna(r[c]) else r[c] for c in CAMPOS_BANCARIOS})
+        lista.append(item)
+
+    por_cliente_total = por_cliente.groupby("cliente", sort=False).agg(
+        quantidade=("quantidade", "sum"), valor=("valor", "sum"), romaneios=("romaneios", "sum")
+    )
+    clientes_json = [
+        {"cliente": str(c), "quantidade": int(q), "valor": _arred(v), "romaneios": int(n)}
+        for c, (q, v, n) in por_cliente_total.reindex(clientes).fillna(0).iterrows()
+    ]
+
+    payload = {
+        "motoristas": lista,
+        "clientes": clientes_json,
+        "totais": {
+            "motoristas": len(lista),
+            "valor_bruto": _arred(motoristas["valor_bruto"].sum()),
+            "desconto": _arred(motoristas["desconto"].sum()),
+            "valor_liquido": _arred(motoristas["valor_liquido"].sum()),
+        },
+    }
+    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
@@ -0,0 +1,319 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import unicodedata
+
+
+# =========================
+# HISTÓRICO DE EXECUÇÕES (SQLite)
+# =========================
+# Cada execução concluída grava os totais do banco consolidado por
+# (motorista, cliente, mês da entrega): perguntas como "quanto o motorista X
+# recebeu do cliente Y nos últimos 6 meses" saem de um SELECT indexado, sem
+# abrir os XLSX finais antigos.
+#
+# _chave: nome normalizado (trim, sem acento, casefold, espaços colapsados)
+# para a busca não depender de como o nome foi digitado em cada fechamento.
+# mes: "AAAA-MM" da coluna data ("" quando a data não é reconhecida).
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id              INTEGER PRIMARY KEY,
+    assinatura      TEXT NOT NULL UNIQUE,
+    registrada_em   TEXT NOT NULL,
+    sessao          TEXT,
+    origem          TEXT,
+    periodo_inicio  TEXT,
+    periodo_fim     TEXT,
+    motoristas      INTEGER NOT NULL,
+    clientes        INTEGER NOT NULL,
+    romaneios       INTEGER NOT NULL,
+    quantidade      INTEGER NOT NULL,
+    valor_bruto     REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS totais (
+    execucao_id     INTEGER NOT NULL REFERENCES execucoes(id) ON DELETE CASCADE,
+    mes             TEXT NOT NULL,
+    motorista       TEXT NOT NULL,
+    motorista_chave TEXT NOT NULL,
+    cliente         TEXT NOT NULL,
+    cliente_chave   TEXT NOT NULL,
+    quantidade      INTEGER NOT NULL,
+    romaneios       INTEGER NOT NULL,
+    valor           REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_totais_motorista ON totais (motorista_chave, cliente_chave, mes);
+CREATE INDEX IF NOT EXISTS idx_totais_cliente ON totais (cliente_chave, mes);
+CREATE INDEX IF NOT EXISTS idx_totais_mes ON totais (mes);
+CREATE INDEX IF NOT EXISTS idx_totais_execucao ON totais (execucao_id);
+CREATE INDEX IF NOT EXISTS idx_execucoes_periodo ON execucoes (periodo_fim);
+"""
+
+AGRUPAMENTOS = {
+    "mes": ["t.mes"],
+    "motorista": ["t.motorista_chave"],
+    "cliente": ["t.cliente_chave"],
+    "motorista_cliente": ["t.motorista_chave", "t.cliente_chave"],
+    "execucao": ["t.execucao_id"],
+}
+
+
+def chave_nome(v) -> str:
+    s = "".join(ch for ch in unicodedata.normalize("NFKD", str(v)) if not unicodedata.combining(ch))
+    return " ".join(s.casefold().split())
+
+
+def conectar(db_path: str) -> sqlite3.Connection:
+    """
+    Abre (e cria, se preciso) o histórico. WAL: consultas não esperam a
+    gravação de outro worker terminar.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA foreign_keys=ON")
+    con.executescript(ESQUEMA)
+    return con
+
+
+def _assinatura(linhas) -> str:
+    """
+    Hash dos totais (saída de totais_por_mes) em ordem fixa. Não usa os bytes
+    do .xlsx: o Step1 grava a data de criação no arquivo, e as mesmas entradas
+    dariam um hash diferente a cada execução.
+    """
+    campos = ["mes", "motorista", "cliente", "quantidade", "romaneios", "valor"]
+    texto = linhas[campos].assign(
+        motorista=linhas["motorista"].map(str),
+        cliente=linhas["cliente"].map(str),
+        valor=linhas["valor"].round(2),
+    ).sort_values(campos[:3]).to_csv(index=False)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def registrar_execucao(db_path: str, banco, *, sessao: str = "", origem: str = "") -> int:
+    """
+    Grava os totais de uma execução no histórico e devolve o id dela.
+
+    banco: path/file-like do banco_consolidado.xlsx
+
+    Substitui o registro anterior (refazer o passo 3 ou o passo 1 não duplica):
+    - do mesmo conteúdo (assinatura = hash dos totais, não dos bytes do arquivo)
+    - da mesma sessão e origem com o mesmo período das entregas (ex: o passo 1
+      refeito depois de aceitar apelidos na conciliação muda os totais, mas é
+      a mesma execução corrigida)
+    """
+    # pandas só aqui: consultas (rota /historico, CLI) não carregam a pilha de dados
+    import pandas as pd
+
+    from core.banco import ler_banco
+    from core.totais import preparar, totais_por_mes
+
+    df = ler_banco(banco)
+    cols = preparar(df)
+
+    linhas = totais_por_mes(df, cols)
+    assinatura = _assinatura(linhas)
+    datas = pd.to_datetime(df[cols["data"]], errors="coerce", dayfirst=True).dropna()
+    motoristas = df[cols["motorista"]].dropna()
+
+    execucao = {
+        "assinatura": assinatura,
+        "registrada_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        "sessao": sessao,
+        "origem": origem,
+        "periodo_inicio": datas.min().date().isoformat() if len(datas) else None,
+        "periodo_fim": datas.max().date().isoformat() if len(datas) else None,
+        "motoristas": int(motoristas.nunique()),
+        "clientes": int(df["cliente"].dropna().nunique()),
+        "romaneios": int(df["romaneio"].dropna().nunique()),
+        "quantidade": int(linhas["quantidade"].sum()),
+        "valor_bruto": round(float(linhas["valor"].sum()), 2),
+    }
+
+    motorista = linhas["motorista"].map(str)
+    cliente = linhas["cliente"].map(str)
+    chaves_m = {m: chave_nome(m) for m in motorista.drop_duplicates()}
+    chaves_c = {c: chave_nome(c) for c in cliente.drop_duplicates()}
+
+    con = conectar(db_path)
+    try:
+        with con:
+            con.execute(
+                "DELETE FROM execucoes WHERE assinatura = ?"
+                " OR (sessao IS ? AND origem IS ? AND periodo_inicio IS ? AND periodo_fim IS ?)",
+                (assinatura, sessao, origem, execucao["periodo_inicio"], execucao["periodo_fim"]),
+            )
+            campos = ", ".join(execucao)
+            cur = con.execute(
+                f"INSERT INTO execucoes ({campos}) VALUES ({', '.join('?' * len(execucao))})",
+                tuple(execucao.values()),
+            )
+            execucao_id = cur.lastrowid
+            con.executemany(
+                "INSERT INTO totais (execucao_id, mes, motorista, motorista_chave, cliente, cliente_chave,"
+                " quantidade, romaneios, valor) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (execucao_id, mes, m, chaves_m[m], c, chaves_c[c], int(q), int(r), float(v))
+                    for mes, m, c, q, r, v in zip(
+                        linhas["mes"], motorista, cliente, linhas["quantidade"], linhas["romaneios"], linhas["valor"]
+                    )
+                ),
+            )
+    finally:
+        con.close()
+    return execucao_id
+
+
+def mes_inicial(meses: int, hoje: datetime.date = None) -> str:
+    """
+    "AAAA-MM" do primeiro mês de uma janela de `meses` meses terminando no mês atual.
+    """
+    hoje = hoje or datetime.date.today()
+    n = hoje.year * 12 + hoje.month - 1 - (max(1, meses) - 1)
+    return f"{n // 12:04d}-{n % 12 + 1:02d}"
+
+
+def consultar(
+    db_path: str,
+    *,
+    motorista: str = None,
+    cliente: str = None,
+    desde: str = None,
+    ate: str = None,
+    por: str = "mes",
+) -> dict:
+    """
+    Totais do histórico filtrados por motorista/cliente (nome sem diferenciar
+    maiúsculas/acentos) e meses da entrega (desde/ate: "AAAA-MM", inclusivos).
+
+    por: mes | motorista | cliente | motorista_cliente | execucao
+
+    Retorna:
+      {"linhas": [{<agrupamento>, quantidade, romaneios, valor, execucoes}, ...],
+       "totais": {quantidade, romaneios, valor, execucoes}}
+    """
+    if por not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento inválido: {por} (use {', '.join(AGRUPAMENTOS)}).")
+
+    filtros, params = [], []
+    if motorista:
+        filtros.append("t.motorista_chave = ?")
+        params.append(chave_nome(motorista))
+    if cliente:
+        filtros.append("t.cliente_chave = ?")
+        params.append(chave_nome(cliente))
+    if desde:
+        filtros.append("t.mes >= ?")
+        params.append(desde)
+    if ate:
+        filtros.append("t.mes <= ?")
+        params.append(ate)
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+    grupo = AGRUPAMENTOS[por]
+    # nome exibido: o da execução mais recente (maior execucao_id com aquela chave)
+    rotulos = {
+        "t.motorista_chave": (
+            "(SELECT u.motorista FROM totais u WHERE u.motorista_chave = t.motorista_chave"
+            " ORDER BY u.execucao_id DESC LIMIT 1) AS motorista"
+        ),
+        "t.cliente_chave": (
+            "(SELECT u.cliente FROM totais u WHERE u.cliente_chave = t.cliente_chave"
+            " ORDER BY u.execucao_id DESC LIMIT 1) AS cliente"
+        ),
+        "t.mes": "t.mes AS mes",
+        "t.execucao_id": "t.execucao_id AS execucao, MAX(e.registrada_em) AS registrada_em",
+    }
+    colunas = ", ".join(rotulos[g] for g in grupo)
+
+    con = conectar(db_path)
+    try:
+        linhas = con.execute(
+            f"""
+            SELECT {colunas},
+                   SUM(t.quantidade) AS quantidade,
+                   SUM(t.romaneios) AS romaneios,
+                   ROUND(SUM(t.valor), 2) AS valor,
+                   COUNT(DISTINCT t.execucao_id) AS execucoes
+            FROM totais t JOIN execucoes e ON e.id = t.execucao_id
+            {where}
+            GROUP BY {', '.join(grupo)}
+            ORDER BY {', '.join(grupo)}
+            """,
+            params,
+        ).fetchall()
+        total = con.execute(
+            f"""
+            SELECT COALESCE(SUM(t.quantidade), 0) AS quantidade,
+                   COALESCE(SUM(t.romaneios), 0) AS romaneios,
+                   ROUND(COALESCE(SUM(t.valor), 0), 2) AS valor,
+                   COUNT(DISTINCT t.execucao_id) AS execucoes
+            FROM totais t {where}
+            """,
+            params,
+        ).fetchone()
+    finally:
+        con.close()
+
+    return {"linhas": [dict(r) for r in linhas], "totais": dict(total)}
+
+
+def listar_execucoes(db_path: str, limite: int = 50) -> list:
+    con = conectar(db_path)
+    try:
+        linhas = con.execute(
+            "SELECT * FROM execucoes ORDER BY registrada_em DESC, id DESC LIMIT ?", (limite,)
+        ).fetchall()
+    finally:
+        con.close()
+    return [dict(r) for r in linhas]
+
+
+# =========================
+# CLI
+# =========================
+# python -m core.historico consultar --motorista "FULANO" --cliente "CLIENTE A" --meses 6
+# python -m core.historico registrar output/banco_consolidado.xlsx
+# python -m core.historico execucoes
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m core.historico", description="Histórico de execuções (SQLite).")
+    ap.add_argument("--db", default=os.environ.get("HISTORICO_DB", os.path.join("storage", "historico.sqlite3")))
+    sub = ap.add_subparsers(dest="comando", required=True)
+
+    c = sub.add_parser("consultar", help="totais por mês/motorista/cliente/execução")
+    c.add_argument("--motorista")
+    c.add_argument("--cliente")
+    c.add_argument("--desde", help="AAAA-MM")
+    c.add_argument("--ate", help="AAAA-MM")
+    c.add_argument("--meses", type=int, help="últimos N meses (inclui o atual); ignora --desde")
+    c.add_argument("--por", default="mes", choices=list(AGRUPAMENTOS))
+
+    r = sub.add_parser("registrar", help="grava um banco_consolidado.xlsx no histórico")
+    r.add_argument("banco")
+
+    e = sub.add_parser("execucoes", help="execuções registradas (mais recentes primeiro)")
+    e.add_argument("--limite", type=int, default=50)
+
+    args = ap.parse_args(argv)
+
+    if args.comando == "registrar":
+        print(registrar_execucao(args.db, args.banco, origem=os.path.basename(args.banco)))
+        return
+    if args.comando == "execucoes":
+        saida = listar_execucoes(args.db, args.limite)
+    else:
+        desde = mes_inicial(args.meses) if args.meses else args.desde
+        saida = consultar(args.db, motorista=args.motorista, cliente=args.cliente, desde=desde, ate=args.ate, por=args.por)
+    json.dump(saida, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+from openpyxl.utils import get_column_letter
+
+
+class LarguraColunas:
+    """
+    Acompanha a maior largura (len(str(valor))) de cada coluna à medida que
+    os valores são escritos, para ajustar as larguras no final sem varrer a
+    aba de novo.
+
+    Uso:
+        larguras = LarguraColunas(ws)
+        larguras.cell(row=1, column=1, value="texto")   # igual ws.cell
+        larguras["A2"] = "texto"                         # igual ws["A2"] = ...
+        larguras.registrar(3, valor)                     # quando o valor foi escrito direto na célula
+        larguras.aplicar(folga=3)
+    """
+
+    def __init__(self, ws=None):
+        self.ws = ws
+        self._max = {}
+
+    def registrar(self, coluna: int, valor) -> None:
+        if valor is None:
+            n = 0
+        else:
+            n = len(str(valor))
+        if n > self._max.get(coluna, -1):
+            self._max[coluna] = n
+
+    def cell(self, row: int, column: int, value=None):
+        c = self.ws.cell(row=row, column=column, value=value)
+        self.registrar(column, value)
+        return c
+
+    def __getitem__(self, addr: str):
+        return self.ws[addr]
+
+    def __setitem__(self, addr: str, value) -> None:
+        self.ws[addr] = value
+        self.registrar(self.ws[addr].column, value)
+
+    def largura(self, coluna: int) -> int:
+        return self._max.get(coluna, 0)
+
+    def aplicar(self, ws=None, *, folga: int = 3) -> None:
+        ws = ws if ws is not None else self.ws
+        for coluna, n in self._max.items():
+            ws.column_dimensions[get_column_letter(coluna)].width = n + folga
@@ -0,0 +1,130 @@
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.relationship import RelationshipList
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.writer.excel import ExcelWriter
+
+
+class _EscritorPacote(ExcelWriter):
+    """
+    ExcelWriter do openpyxl que aceita abas já serializadas.
+
+    - xml_pronto: {titulo_da_aba: bytes do sheet XML} gravado como está no pacote
+    - ao_serializar(ws, xml): chamado com o XML de cada aba serializada normalmente
+    """
+
+    def __init__(self, workbook, archive, xml_pronto=None, ao_serializar=None):
+        super().__init__(workbook, archive)
+        self._xml_pronto = xml_pronto or {}
+        self._ao_serializar = ao_serializar
+
+    def write_worksheet(self, ws):
+        xml = self._xml_pronto.get(ws.title)
+        if xml is None and self._ao_serializar is None:
+            return super().write_worksheet(ws)
+
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+
+        if xml is None:
+            writer = WorksheetWriter(ws)
+            writer.write()
+            xml = writer.read()
+            writer.cleanup()
+            ws._rels = writer._rels
+            self._ao_serializar(ws, xml)
+        else:
+            ws._rels = RelationshipList()
+
+        self._archive.writestr(ws.path[1:], xml)
+        self.manifest.append(ws)
+
+
+def salvar_pacote(wb, destino, *, xml_pronto=None, ao_serializar=None):
+    """
+    Equivalente ao wb.save(destino), mas:
+    - abas cujo título está em xml_pronto são gravadas com esse XML (byte a byte);
+      no workbook elas podem ser só abas vazias reservando nome e posição
+    - ao_serializar(ws, xml) recebe o XML das demais abas (ex: para guardar em cache)
+
+    destino: path ou file-like (BytesIO).
+    """
+    archive = ZipFile(destino, "w", ZIP_DEFLATED, allowZip64=True)
+    writer = _EscritorPacote(wb, archive, xml_pronto=xml_pronto, ao_serializar=ao_serializar)
+    writer.save()
+
+
+# =========================
+# PACOTE EM FLUXO (memória constante)
+# =========================
+class _AbaGravada:
+    """
+    Aba cujo XML já foi gravado no zip. No workbook só ocupa o lugar dela
+    (nome, posição, caminho) para o workbook.xml e o [Content_Types].xml.
+    """
+
+    __slots__ = ("title", "path")
+
+    sheet_state = "visible"
+    _rel_type = Worksheet._rel_type
+    mime_type = Worksheet.mime_type
+
+    def __init__(self, title, path):
+        self.title = title
+        self.path = path
+
+
+class _EscritorFluxo(ExcelWriter):
+    def _write_worksheets(self):
+        super()._write_worksheets()
+        for ws in self.workbook._sheets:
+            if isinstance(ws, _AbaGravada):
+                self.manifest.append(ws)
+
+
+class PacoteEmFluxo:
+    """
+    Grava o .xlsx aos poucos: cada aba vai para o zip assim que fica pronta e
+    não fica nada dela em memória. No fechar() entram as partes do workbook
+    (workbook.xml, styles.xml, tema, [Content_Types].xml...), escritas pelo
+    openpyxl a partir do `wb`, onde os estilos das abas foram registrados.
+
+    As abas que já existem no `wb` continuam sendo serializadas normalmente no
+    fechar() e ficam antes das gravadas em fluxo.
+
+    Uso:
+        pacote = PacoteEmFluxo(wb, destino)
+        pacote.adicionar("JOAO SILVA", xml)
+        ...
+        pacote.fechar()
+    """
+
+    def __init__(self, wb, destino):
+        self.wb = wb
+        self._archive = ZipFile(destino, "w", ZIP_DEFLATED, allowZip64=True)
+        self._fechado = False
+
+    def adicionar(self, titulo: str, xml: bytes) -> None:
+        n = len(self.wb._sheets) + 1
+        aba = _AbaGravada(titulo, f"/xl/worksheets/sheet{n}.xml")
+        self._archive.writestr(aba.path[1:], xml)
+        self.wb._sheets.append(aba)
+
+    def fechar(self) -> None:
+        if self._fechado:
+            return
+        self._fechado = True
+        try:
+            _EscritorFluxo(self.wb, self._archive).save()
+        finally:
+            # o workbook volta a ter só as abas de verdade
+            self.wb._sheets = [ws for ws in self.wb._sheets if not isinstance(ws, _AbaGravada)]
+
+    def descartar(self) -> None:
+        """Fecha o zip sem completar o pacote (usado em caso de erro)."""
+        if not self._fechado:
+            self._fechado = True
+            self._archive.close()
@@ -0,0 +1,179 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# =========================
+# CATEGORIAS DO RESUMO
+# =========================
+# (trecho do caminho do arquivo, nomes de função ou None = qualquer função)
+# Cada amostra da pilha vai para a categoria do frame mais externo que bater
+# (ex: o __hash__ de um estilo chamado dentro de salvar_pacote conta como
+# "salvar", chamado no renderizar conta como escrita de células).
+CATEGORIAS = [
+    ("openpyxl: escrita de células", [
+        ("openpyxl/cell/", None),
+        ("openpyxl/worksheet/worksheet.py", {"cell", "_get_cell", "__getitem__", "__setitem__", "merge_cells"}),
+        ("openpyxl/styles/", None),
+        ("core/larguras.py", None),
+    ]),
+    ("motor xml: renderização das abas", [
+        ("core/aba_xml.py", None),
+        ("core/cache_abas.py", None),
+    ]),
+    ("leitura de planilhas (pandas/openpyxl)", [
+        ("core/banco.py", {"ler_banco"}),
+        ("pandas/io/excel/", None),
+        ("openpyxl/reader/", None),
+        ("openpyxl/worksheet/_reader.py", None),
+        ("openpyxl/worksheet/_read_only.py", None),
+    ]),
+    ("pandas: filtros e agrupamentos", [
+        ("pandas/core/indexing.py", None),
+        ("pandas/core/groupby/", None),
+        ("pandas/core/ops/", None),
+        ("pandas/core/arraylike.py", None),
+        ("pandas/core/strings/", None),
+        ("pandas/core/frame.py", None),
+        ("pandas/core/series.py", None),
+        ("core/totais.py", None),
+        ("core/banco.py", None),
+    ]),
+    ("salvar: serialização e zip", [
+        ("openpyxl/writer/", None),
+        ("openpyxl/cell/_writer.py", None),
+        ("openpyxl/worksheet/_writer.py", None),
+        ("core/pacote_xlsx.py", None),
+        ("zipfile", None),
+        ("zlib", None),
+        ("xml/etree/", None),
+        ("et_xmlfile", None),
+    ]),
+]
+
+
+def _categoria(arquivo: str, funcao: str) -> str:
+    arquivo = arquivo.replace("\\", "/")
+    for nome, regras in CATEGORIAS:
+        for trecho, funcoes in regras:
+            if trecho in arquivo and (funcoes is None or funcao in funcoes):
+                return nome
+    return ""
+
+
+def _rotulo(codigo) -> str:
+    return f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}"
+
+
+class _Amostrador(threading.Thread):
+    """
+    Amostra a pilha de uma thread a cada `intervalo` segundos e conta pilhas
+    no formato "collapsed" (raiz;...;folha N), que o flamegraph.pl e o
+    speedscope abrem direto.
+    """
+
+    def __init__(self, alvo: int, intervalo: float):
+        super().__init__(daemon=True)
+        self.alvo = alvo
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self.categorias = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.alvo)
+            pilha = []
+            categoria = ""
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(_rotulo(codigo))
+                categoria = _categoria(codigo.co_filename, codigo.co_name) or categoria
+                frame = frame.f_back
+            if pilha:
+                self.pilhas[";".join(reversed(pilha))] += 1
+                self.categorias[categoria or "outros"] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+class Perfil:
+    """
+    Perfila um trecho de código (um passo inteiro) e grava em `pasta`:
+
+      <nome>.prof     cProfile (pstats / snakeviz)
+      <nome>.folded   pilhas amostradas no formato collapsed (flame graph)
+      <nome>.txt      resumo: tempo por categoria + funções mais quentes
+
+    Uso:
+        with Perfil("storage/workspaces/<sid>/perfis", "step2") as perfil:
+            gerar_espelhos_motoristas(...)
+        perfil.arquivos  # {"prof": ..., "folded": ..., "txt": ...}
+
+    Só a thread que entra no `with` é perfilada (workers do pool de processos
+    do Step2 não aparecem: use workers=1 para ver a renderização das abas).
+    """
+
+    def __init__(self, pasta: str, nome: str, *, intervalo: float = 0.005, top: int = 30):
+        self.pasta = pasta
+        self.nome = f"{nome}_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.intervalo = intervalo
+        self.top = top
+        self.arquivos = {}
+        self.duracao = 0.0
+        self._profiler = None
+        self._amostrador = None
+        self._inicio = 0.0
+
+    def __enter__(self):
+        self._amostrador = _Amostrador(threading.get_ident(), self.intervalo)
+        self._amostrador.start()
+        self._profiler = cProfile.Profile()
+        self._inicio = time.perf_counter()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler.disable()
+        self.duracao = time.perf_counter() - self._inicio
+        self._amostrador.parar()
+        self.gravar()
+        return False
+
+    def gravar(self) -> dict:
+        os.makedirs(self.pasta, exist_ok=True)
+        base = os.path.join(self.pasta, self.nome)
+
+        self._profiler.dump_stats(base + ".prof")
+
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for pilha, n in self._amostrador.pilhas.most_common():
+                f.write(f"{pilha} {n}\n")
+
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(self.resumo())
+
+        self.arquivos = {"prof": base + ".prof", "folded": base + ".folded", "txt": base + ".txt"}
+        return self.arquivos
+
+    def resumo(self) -> str:
+        amostras = sum(self._amostrador.categorias.values())
+
+        out = io.StringIO()
+        out.write(f"{self.nome}: {self.duracao:.2f}s ({amostras} amostras)\n\n")
+        out.write("Tempo por categoria (amostragem)\n")
+        for cat, n in self._amostrador.categorias.most_common():
+            out.write(f"  {self.duracao * n / amostras:8.3f}s {100 * n / amostras:5.1f}%  {cat}\n")
+
+        out.write("\nFunções mais quentes (tempo próprio)\n")
+        pstats.Stats(self._profiler, stream=out).sort_stats("tottime").print_stats(self.top)
+        out.write("\nFunções mais quentes (tempo acumulado)\n")
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(self.top)
+        return out.getvalue()
@@ -0,0 +1,97 @@
+import pandas as pd
+
+from core.banco import ler_banco
+from core.totais import dados_bancarios, preparar, valores_validos
+
+
+# campos de F2:F8 que aparecem como INEXISTENTE (vermelho) na aba do motorista
+CAMPOS_PREVIA = {
+    "contrato": "Contrato",
+    "banco": "Banco",
+    "agencia": "Agência",
+    "conta": "Conta",
+    "cpf_cnpj": "CPF/CNPJ",
+    "pix": "PIX",
+}
+
+
+def _arred(v) -> float:
+    return round(float(v), 2)
+
+
+def montar_previa(banco) -> dict:
+    """
+    Prévia do Step2 a partir do banco consolidado, só com agregações do pandas
+    (nenhuma aba é renderizada): o que cada motorista vai receber e o que vai
+    sair em vermelho na aba dele.
+
+    banco: DataFrame já lido (colunas como no ler_banco) ou path/file-like do banco_consolidado.xlsx
+
+    Retorna (pronto para JSON):
+      {
+        "clientes": [nomes na ordem do banco],
+        "motoristas": [{motorista, quantidade, romaneios, valor_bruto,
+                        linhas_sem_valor, clientes: {cliente: {quantidade, valor}},
+                        faltando: [rótulos dos campos vazios]}, ...],
+        "totais": {motoristas, quantidade, valor_bruto, linhas_sem_valor, com_pendencia},
+      }
+
+    linhas_sem_valor: linhas do motorista fora do TOTAL (cliente ou cidade vazios
+    ou valor unitário não numérico), geralmente preço digitado errado no fechamento.
+    """
+    df = banco if isinstance(banco, pd.DataFrame) else ler_banco(banco)
+    cols = preparar(df)
+
+    base = valores_validos(df, cols)
+    base["sem_valor"] = (~base["_valido"]).astype(int)
+
+    por_motorista = base.groupby("motorista", sort=False).agg(
+        quantidade=("quantidade", "sum"),
+        romaneios=("romaneio", "nunique"),
+        valor_bruto=("valor", "sum"),
+        linhas_sem_valor=("sem_valor", "sum"),
+    )
+    por_cliente = base.groupby(["motorista", "cliente"], sort=False).agg(
+        quantidade=("quantidade", "sum"), valor=("valor", "sum")
+    )
+
+    bancarios = dados_bancarios(df, cols).set_index("motorista")
+    vazios = pd.DataFrame({c: bancarios[c].str.strip() == "" for c in CAMPOS_PREVIA}).reindex(por_motorista.index, fill_value=True)
+    rotulos = pd.Series(list(CAMPOS_PREVIA.values()), index=list(CAMPOS_PREVIA))
+    faltando = vazios.apply(lambda linha: rotulos[linha.values].tolist(), axis=1)
+
+    clientes_por_motorista = {}
+    for (m, cli), (q, v) in zip(por_cliente.index, por_cliente[["quantidade", "valor"]].itertuples(index=False, name=None)):
+        clientes_por_motorista.setdefault(m, {})[str(cli)] = {"quantidade": int(q), "valor": _arred(v)}
+
+    lista = [
+        {
+            "motorista": str(m),
+            "quantidade": int(q),
+            "romaneios": int(r),
+            "valor_bruto": _arred(v),
+            "linhas_sem_valor": int(s),
+            "clientes": clientes_por_motorista.get(m, {}),
+            "faltando": f,
+        }
+        for m, q, r, v, s, f in zip(
+            por_motorista.index,
+            por_motorista["quantidade"],
+            por_motorista["romaneios"],
+            por_motorista["valor_bruto"],
+            por_motorista["linhas_sem_valor"],
+            faltando.reindex(por_motorista.index),
+        )
+    ]
+
+    return {
+        "clientes": [str(c) for c in df["cliente"].dropna().drop_duplicates()],
+        "motoristas": lista,
+        "totais": {
+            "motoristas": len(lista),
+            "quantidade": int(por_motorista["quantidade"].sum()),
+            "valor_bruto": _arred(por_motorista["valor_bruto"].sum()),
+            "linhas_sem_valor": int(por_motorista["linhas_sem_valor"].sum()),
+            "com_pendencia": int(((vazios.any(axis=1)) | (por_motorista["linhas_sem_valor"] > 0)).sum()),
+        },
+    }
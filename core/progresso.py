@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+
+# =========================
+# PROGRESSO DOS PASSOS
+# =========================
+# Os passos chamam ao_progresso(fase, feitos, total) a cada motorista; o
+# RegistroProgresso só grava o JSON no workspace quando a fase muda, quando a
+# fase termina ou a cada `intervalo` segundos, então o custo por chamada é uma
+# comparação de tempo (milhares de motoristas não viram milhares de escritas).
+# A rota SSE lê esse arquivo (funciona entre threads e workers do gunicorn).
+FASES_FINAIS = ("fim", "erro")
+
+
+class RegistroProgresso:
+    """
+    ao_progresso dos passos gravando em `path`:
+      {"passo", "fase", "feitos", "total", "inicio", "atualizado", "erro"?}
+
+    Uso:
+        progresso = RegistroProgresso("<workspace>/progresso.json", "step2")
+        gerar_espelhos_motoristas(..., ao_progresso=progresso)
+        progresso.concluir()            # ou progresso.concluir(erro="...")
+    """
+
+    def __init__(self, path: str, passo: str, *, intervalo: float = 0.5):
+        self.path = path
+        self.passo = passo
+        self.intervalo = intervalo
+        self.inicio = time.time()
+        self._fase = None
+        self._ultima = 0.0
+        self.concluido = False
+        self("inicio")
+
+    def __call__(self, fase: str, feitos: int = 0, total: int = 0) -> None:
+        agora = time.monotonic()
+        terminou = total > 0 and feitos >= total
+        if fase == self._fase and not terminou and agora - self._ultima < self.intervalo:
+            return
+        self._fase = fase
+        self._ultima = agora
+        self._gravar({"fase": fase, "feitos": feitos, "total": total})
+
+    def concluir(self, erro: str = "") -> None:
+        # só o primeiro vale (a rota registra o erro, o encerramento padrão não sobrescreve)
+        if self.concluido:
+            return
+        self.concluido = True
+        dados = {"fase": "erro" if erro else "fim", "feitos": 0, "total": 0}
+        if erro:
+            dados["erro"] = erro
+        self._gravar(dados)
+
+    def _gravar(self, dados: dict) -> None:
+        dados = {"passo": self.passo, **dados, "inicio": self.inicio, "atualizado": time.time()}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dados, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # progresso é só informativo: nunca derruba o passo
+
+
+def ler_progresso(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def eventos_progresso(path: str, *, passo: str = "", intervalo: float = 0.25, duracao_max: float = 60.0, manter_vivo: float = 15.0):
+    """
+    Server-Sent Events com o progresso gravado em `path` (um evento por mudança).
+
+    - Um registro já encerrado (fim/erro) no momento da conexão é de uma
+      execução anterior: só vale o que mudar depois.
+    - passo: ignora registros de outro passo.
+    - A conexão fecha depois de duracao_max segundos (o EventSource do
+      navegador reconecta sozinho) para não prender uma thread do servidor
+      indefinidamente; comentários a cada manter_vivo segundos detectam
+      cliente que saiu.
+    """
+    yield "retry: 1000\n\n"
+
+    def mtime():
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    dados = ler_progresso(path)
+    visto = mtime()
+    if dados is None or dados.get("fase") not in FASES_FINAIS:
+        visto = None  # execução em andamento: manda o estado atual já na conexão
+
+    inicio = ultimo_envio = time.monotonic()
+    while time.monotonic() - inicio < duracao_max:
+        atual = mtime()
+        if atual is not None and atual != visto:
+            visto = atual
+            dados = ler_progresso(path)
+            if dados is not None and (not passo or dados.get("passo") == passo):
+                yield f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+                ultimo_envio = time.monotonic()
+                if dados.get("fase") in FASES_FINAIS:
+                    return
+        if time.monotonic() - ultimo_envio >= manter_vivo:
+            yield ": ping\n\n"
+            ultimo_envio = time.monotonic()
+        time.sleep(intervalo)
@@ -0,0 +1,204 @@
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Font, Border, Side, Alignment
+
+from core.exportacao import montar_pagamentos
+from core.larguras import LarguraColunas
+
+
+def gerar_resumo_totais(banco, partes=None, descontos=None) -> bytes:
+    """
+    Workbook pequeno só com RESUMO e RESUMO TOTAL (mesmo layout do Step3),
+    calculado direto do banco consolidado.
+
+    Usado quando as abas dos motoristas não estão no mesmo arquivo (ex: um
+    .xlsx por motorista dentro de um ZIP): por isso as linhas trazem valores
+    e não fórmulas apontando para as abas. Só as linhas CUSTO TOTAL e o
+    líquido são fórmulas (dentro da própria aba). Os valores somam as mesmas
+    linhas que as abas (core/totais.valores_validos: sem cliente não entra).
+
+    banco: DataFrame já lido ou path/file-like do banco_consolidado.xlsx
+    partes: [(nome_do_arquivo, [motoristas])] quando a saída foi dividida em
+      vários arquivos. Acrescenta a aba ARQUIVOS (um arquivo por linha: faixa
+      de motoristas e totais) para achar em qual arquivo está cada motorista.
+    descontos: planilha de descontos (ver montar_pagamentos); None = zero.
+    Retorna os bytes do .xlsx.
+    """
+    dados = montar_pagamentos(banco, descontos)
+    motoristas = dados["motoristas"]
+    clientes = dados["clientes"]
+    valor_por_cliente = {
+        (m, c): v for m, c, v in dados["por_cliente"][["motorista", "cliente", "valor"]].itertuples(index=False, name=None)
+    }
+
+    # =========================
+    # ESTILOS (iguais ao Step3)
+    # =========================
+    bold = Font(bold=True)
+    bold_red = Font(bold=True, color="FF0000")
+    red_font = Font(color="FF0000")
+    center = Alignment(horizontal="center", vertical="center")
+    thin = Side(style="thin")
+    border_all = Border(left=thin, right=thin, top=thin, bottom=thin)
+    formato_contabil = 'R$ #,##0.00_);R$ (#,##0.00)'
+
+    def style_cell(cell, *, font=None, alignment=None, border=None, number_format=None):
+        if font is not None:
+            cell.font = font
+        if alignment is not None:
+            cell.alignment = alignment
+        if border is not None:
+            cell.border = border
+        if number_format is not None:
+            cell.number_format = number_format
+
+    def numero(v):
+        return 0.0 if pd.isna(v) else float(v)
+
+    wb = Workbook()
+
+    # =========================
+    # RESUMO
+    # =========================
+    ws_resumo = wb.active
+    ws_resumo.title = "RESUMO"
+    ws_resumo.sheet_view.showGridLines = False
+    resumo = LarguraColunas(ws_resumo)
+
+    resumo["A1"] = "Relação dos Parceiros para Pagamento"
+    ws_resumo["A1"].font = bold
+    resumo["A2"] = "Centro de Custo:"
+    resumo["A3"] = "Período:"
+    resumo["E3"] = "Vencimento:"
+    ws_resumo["E3"].border = border_all
+
+    linha_inicio = 5
+    cabecalhos = ["Nome do motorista", "Valor Bruto", "Desconto", "Valor Líquido", "Status NF"]
+    for col, texto in enumerate(cabecalhos, start=1):
+        style_cell(
+            resumo.cell(row=linha_inicio, column=col, value=texto),
+            font=bold_red if texto == "Desconto" else bold, alignment=center, border=border_all,
+        )
+
+    linha = linha_inicio + 1
+    for m, bruto, desconto in motoristas[["motorista", "valor_bruto", "desconto"]].itertuples(index=False, name=None):
+        style_cell(resumo.cell(row=linha, column=1, value=str(m)), alignment=center, border=border_all)
+        style_cell(resumo.cell(row=linha, column=2, value=numero(bruto)), number_format=formato_contabil, alignment=center, border=border_all)
+        style_cell(resumo.cell(row=linha, column=3, value=numero(desconto)), font=red_font, number_format=formato_contabil, alignment=center, border=border_all)
+        style_cell(resumo.cell(row=linha, column=4, value=f"=B{linha}-C{linha}"), number_format=formato_contabil, alignment=center, border=border_all)
+        style_cell(resumo.cell(row=linha, column=5, value=""), alignment=center, border=border_all)
+        linha += 1
+
+    style_cell(resumo.cell(row=linha, column=1, value="CUSTO TOTAL"), font=bold, alignment=center, border=border_all)
+    for col, letra in ((2, "B"), (3, "C"), (4, "D")):
+        style_cell(
+            resumo.cell(row=linha, column=col, value=f"=SUM({letra}{linha_inicio + 1}:{letra}{linha - 1})"),
+            font=bold_red if letra == "C" else bold, number_format=formato_contabil, alignment=center, border=border_all,
+        )
+    style_cell(ws_resumo.cell(row=linha, column=5), font=bold, alignment=center, border=border_all)
+
+    # =========================
+    # RESUMO TOTAL
+    # =========================
+    ws_rt = wb.create_sheet("RESUMO TOTAL")
+    ws_rt.sheet_view.showGridLines = False
+    rt = LarguraColunas(ws_rt)
+
+    rt["A1"] = "Relação dos Parceiros para Pagamento"
+    ws_rt["A1"].font = bold
+    rt["A2"] = "Centro de Custo:"
+    rt["A3"] = "Período:"
+
+    linha_cab = 5
+    linha_rt = 6
+    col_inicio = 2
+    col_valor_bruto = col_inicio + len(clientes)
+    col_desconto = col_valor_bruto + 1
+    col_liquido = col_desconto + 1
+    col_status = col_liquido + 1
+
+    style_cell(rt.cell(row=linha_cab, column=1, value="Nome do Motorista"), font=bold, alignment=center, border=border_all)
+    for j, cliente in enumerate(clientes):
+        style_cell(rt.cell(row=linha_cab, column=col_inicio + j, value=cliente), font=bold, alignment=center, border=border_all)
+    style_cell(rt.cell(row=linha_cab, column=col_valor_bruto, value="Valor Bruto"), font=bold, alignment=center, border=border_all)
+    style_cell(rt.cell(row=linha_cab, column=col_desconto, value="Desconto"), font=bold_red, alignment=center, border=border_all)
+    style_cell(rt.cell(row=linha_cab, column=col_liquido, value="Valor Líquido"), font=bold, alignment=center, border=border_all)
+    style_cell(rt.cell(row=linha_cab, column=col_status, value="Status NF"), font=bold, alignment=center, border=border_all)
+    style_cell(rt.cell(row=3, column=col_status, value="Vencimento:"), font=bold, alignment=center, border=border_all)
+
+    bruto_letter = ws_rt.cell(row=linha_cab, column=col_valor_bruto).column_letter
+    desc_letter = ws_rt.cell(row=linha_cab, column=col_desconto).column_letter
+
+    linha = linha_rt
+    for m, bruto, desconto in motoristas[["motorista", "valor_bruto", "desconto"]].itertuples(index=False, name=None):
+        style_cell(rt.cell(row=linha, column=1, value=str(m)), alignment=center, border=border_all)
+        for j, cliente in enumerate(clientes):
+            v = valor_por_cliente.get((m, cliente))
+            cell = rt.cell(row=linha, column=col_inicio + j, value="" if v is None else numero(v))
+            style_cell(cell, alignment=center, border=border_all, number_format=None if v is None else formato_contabil)
+        style_cell(rt.cell(row=linha, column=col_valor_bruto, value=numero(bruto)), number_format=formato_contabil, alignment=center, border=border_all)
+        style_cell(rt.cell(row=linha, column=col_desconto, value=numero(desconto)), font=red_font, number_format=formato_contabil, alignment=center, border=border_all)
+        style_cell(
+            rt.cell(row=linha, column=col_liquido, value=f"={bruto_letter}{linha}-N({desc_letter}{linha})"),
+            number_format=formato_contabil, alignment=center, border=border_all,
+        )
+        style_cell(rt.cell(row=linha, column=col_status, value=""), alignment=center, border=border_all)
+        linha += 1
+
+    style_cell(rt.cell(row=linha, column=1, value="CUSTO TOTAL"), font=bold, alignment=center, border=border_all)
+    for c in range(col_inicio, col_liquido + 1):
+        letra = ws_rt.cell(row=linha_cab, column=c).column_letter
+        style_cell(
+            rt.cell(row=linha, column=c, value=f"=SUM({letra}{linha_rt}:{letra}{linha - 1})"),
+            font=bold_red if c == col_desconto else bold, alignment=center, border=border_all, number_format=formato_contabil,
+        )
+    style_cell(ws_rt.cell(row=linha, column=col_status), font=bold, alignment=center, border=border_all)
+
+    resumo.aplicar(folga=3)
+    rt.aplicar(folga=3)
+
+    # =========================
+    # ARQUIVOS (saída dividida)
+    # =========================
+    if partes:
+        ws_arq = wb.create_sheet("ARQUIVOS")
+        ws_arq.sheet_view.showGridLines = False
+        arq = LarguraColunas(ws_arq)
+
+        totais = motoristas.set_index("motorista")[["valor_bruto", "desconto"]]
+        cabecalhos = ["Arquivo", "Motoristas", "De", "Até", "Valor Bruto", "Desconto", "Valor Líquido"]
+        for col, texto in enumerate(cabecalhos, start=1):
+            style_cell(arq.cell(row=1, column=col, value=texto), font=bold_red if texto == "Desconto" else bold, alignment=center, border=border_all)
+
+        linha = 2
+        for arquivo, lista in partes:
+            presentes = totais.reindex([m for m in lista if m in totais.index])
+            bruto = float(presentes["valor_bruto"].sum())
+            desconto = float(presentes["desconto"].sum())
+            valores = [arquivo, len(lista), str(lista[0]) if lista else "", str(lista[-1]) if lista else "", bruto, desconto]
+            for col, v in enumerate(valores, start=1):
+                style_cell(
+                    arq.cell(row=linha, column=col, value=v),
+                    font=red_font if col == 6 else None, alignment=center, border=border_all,
+                    number_format=formato_contabil if col >= 5 else None,
+                )
+            style_cell(arq.cell(row=linha, column=7, value=f"=E{linha}-F{linha}"), number_format=formato_contabil, alignment=center, border=border_all)
+            linha += 1
+
+        style_cell(arq.cell(row=linha, column=1, value="TOTAL"), font=bold, alignment=center, border=border_all)
+        for col, letra in ((2, "B"), (5, "E"), (6, "F"), (7, "G")):
+            style_cell(
+                arq.cell(row=linha, column=col, value=f"=SUM({letra}2:{letra}{linha - 1})"),
+                font=bold_red if letra == "F" else bold, alignment=center, border=border_all,
+                number_format=formato_contabil if col >= 5 else None,
+            )
+        for col in (3, 4):
+            style_cell(ws_arq.cell(row=linha, column=col), border=border_all)
+
+        arq.aplicar(folga=3)
+
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
@@ -1,58 +1,197 @@
 import os
+from typing import Callable, Iterator
+
 import pandas as pd
+from openpyxl import load_workbook
+
+from core.banco_xlsx import gravar_banco_xlsx
+from core.conciliacao import aplicar_aliases
+from core.entrada import formato_entrada, ler_csv, ler_entrada, ler_parquet
 
 
-def normalizar_colunas(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+def normalizar_colunas(df: pd.DataFrame, copiar: bool = True) -> pd.DataFrame:
+    """
+    copiar=False renomeia as colunas no próprio DataFrame (útil quando ele
+    acabou de ser lido e ninguém mais o referencia, evitando uma cópia inteira).
+    """
+    if copiar:
+        df = df.copy()
     df.columns = df.columns.astype(str).str.strip().str.lower()
     return df
 
 
-def gerar_banco_consolidado(
-    motoristas_xlsx,
-    fechamento_xlsx,
-    saida_xlsx_path: str | None = None,
-) -> pd.DataFrame:
+def _valor_celula(v):
+    # mesma conversão do pd.read_excel (engine openpyxl): float inteiro vira int
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _cabecalho(valores) -> list:
     """
-    Gera o banco consolidado juntando fechamento + motoristas.
+    Reproduz os nomes de coluna do pd.read_excel:
+    vazio -> 'Unnamed: i' e repetidos -> 'nome.1', 'nome.2'...
+    """
+    nomes = []
+    vistos = {}
+    for i, v in enumerate(valores):
+        nome = f"Unnamed: {i}" if v is None else str(_valor_celula(v))
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f"{nome}.{vistos[nome]}"
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
 
-    motoristas_xlsx / fechamento_xlsx:
-      - pode ser caminho (str) para .xlsx
-      - pode ser file-like (ex: request.files['motoristas'], BytesIO, etc)
 
-    saida_xlsx_path:
-      - se informado, salva o arquivo final nesse caminho
-      - se None, apenas retorna o DataFrame
+def ler_excel_em_blocos(src, linhas_por_bloco: int) -> Iterator[pd.DataFrame]:
+    """
+    Lê a primeira aba de um .xlsx em modo read-only (iter_rows), devolvendo
+    DataFrames de no máximo `linhas_por_bloco` linhas, já com as colunas
+    normalizadas.
+
+    A memória usada fica proporcional ao tamanho do bloco, não ao arquivo.
+    Linhas vazias no final da planilha são descartadas (igual ao pd.read_excel).
+    """
+    if linhas_por_bloco <= 0:
+        raise ValueError("linhas_por_bloco deve ser maior que zero.")
+
+    wb = load_workbook(src, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        linhas = ws.iter_rows(values_only=True)
+
+        primeira = next(linhas, None)
+        if primeira is None:
+            return
+        colunas = _cabecalho(primeira)
+        n_colunas = len(colunas)
+
+        bloco = []
+        vazias_pendentes = []
+        emitiu = False
+
+        for linha in linhas:
+            valores = [_valor_celula(v) for v in linha[:n_colunas]]
+            valores += [None] * (n_colunas - len(valores))
+
+            if all(v is None or v == "" for v in valores):
+                # só entra se aparecer uma linha preenchida depois
+                vazias_pendentes.append(valores)
+                continue
+
+            if vazias_pendentes:
+                bloco.extend(vazias_pendentes)
+                vazias_pendentes = []
+            bloco.append(valores)
+
+            if len(bloco) >= linhas_por_bloco:
+                yield normalizar_colunas(pd.DataFrame(bloco, columns=colunas), copiar=False)
+                emitiu = True
+                bloco = []
+
+        if bloco or not emitiu:
+            # sem nenhuma linha de dados ainda devolve o cabeçalho
+            yield normalizar_colunas(pd.DataFrame(bloco, columns=colunas), copiar=False)
+    finally:
+        wb.close()
+
+
+def _datas_de_texto(df: pd.DataFrame) -> pd.DataFrame:
+    # CSV traz a data como texto (dd/mm/aaaa no Brasil); o .xlsx já vem como data
+    if "data" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["data"]):
+        df["data"] = pd.to_datetime(df["data"], errors="coerce", dayfirst=True)
+    return df
+
+
+def ler_planilha(src, *, encoding_csv: str = None, delimitador_csv: str = None) -> pd.DataFrame:
+    """
+    Lê motoristas/fechamento em .xlsx, .csv ou .parquet (core/entrada.py) com
+    as colunas normalizadas. encoding_csv/delimitador_csv: None = detectar.
+    """
+    formato = formato_entrada(src)
+    df = normalizar_colunas(ler_entrada(src, encoding=encoding_csv, delimitador=delimitador_csv), copiar=False)
+    return _datas_de_texto(df) if formato == ".csv" else df
+
+
+def ler_em_blocos(src, linhas_por_bloco: int, *, encoding_csv: str = None, delimitador_csv: str = None) -> Iterator[pd.DataFrame]:
+    """
+    ler_planilha em blocos de no máximo `linhas_por_bloco` linhas (memória
+    proporcional ao bloco): .xlsx em modo read-only, .csv com chunksize e
+    .parquet por lotes.
+    """
+    formato = formato_entrada(src)
+    if formato == ".xlsx":
+        yield from ler_excel_em_blocos(src, linhas_por_bloco)
+        return
+    if linhas_por_bloco <= 0:
+        raise ValueError("linhas_por_bloco deve ser maior que zero.")
+
+    if formato == ".csv":
+        blocos = ler_csv(src, encoding=encoding_csv, delimitador=delimitador_csv, linhas_por_bloco=linhas_por_bloco)
+    else:
+        blocos = ler_parquet(src, linhas_por_bloco=linhas_por_bloco)
+    for bloco in blocos:
+        bloco = normalizar_colunas(bloco, copiar=False)
+        yield _datas_de_texto(bloco) if formato == ".csv" else bloco
+
+
+POSSIVEIS_CONTRATO = [
+    "contrato",
+    "n contrato",
+    "nº contrato",
+    "numero do contrato",
+    "número do contrato",
+    "contrato nº",
+    "contrato n",
+    "contrato numero",
+]
+
+
+def validar_cabecalho(arquivo: str, colunas) -> None:
+    """
+    Confere as colunas (já normalizadas: strip + lower) que o Step1 exige de
+    cada arquivo. Serve tanto para o DataFrame lido quanto só para o cabeçalho
+    (ex: upload em partes, antes do arquivo chegar inteiro).
+
+    arquivo: "motoristas" ou "fechamento"
     """
+    colunas = set(colunas)
+    if arquivo == "motoristas":
+        if not any(c in colunas for c in POSSIVEIS_CONTRATO):
+            raise Exception("Coluna de contrato não encontrada em motoristas.xlsx (crie a coluna 'contrato').")
+        if "nome do motorista" not in colunas:
+            raise Exception("Coluna 'nome do motorista' não encontrada no motoristas.xlsx.")
+    elif arquivo == "fechamento":
+        if "nome do motorista" not in colunas:
+            raise Exception("Coluna 'nome do motorista' não encontrada no fechamento.xlsx.")
+    else:
+        raise ValueError(f"Arquivo inválido: {arquivo}")
 
-    motoristas = normalizar_colunas(pd.read_excel(motoristas_xlsx))
-    fechamento = normalizar_colunas(pd.read_excel(fechamento_xlsx))
 
+def _preparar_motoristas(motoristas: pd.DataFrame) -> pd.DataFrame:
     # ===============================
     # GARANTIR COLUNA "contrato" (VEM DE MOTORISTAS)
     # ===============================
-    possiveis_contrato = [
-        "contrato",
-        "n contrato",
-        "nº contrato",
-        "numero do contrato",
-        "número do contrato",
-        "contrato nº",
-        "contrato n",
-        "contrato numero",
-    ]
-
-    col_contrato = next((c for c in possiveis_contrato if c in motoristas.columns), None)
-    if not col_contrato:
-        raise Exception("Coluna de contrato não encontrada em motoristas.xlsx (crie a coluna 'contrato').")
+    validar_cabecalho("motoristas", motoristas.columns)
+
+    col_contrato = next(c for c in POSSIVEIS_CONTRATO if c in motoristas.columns)
     if col_contrato != "contrato":
         motoristas = motoristas.rename(columns={col_contrato: "contrato"})
 
+    return motoristas
+
+
+def _consolidar(fechamento: pd.DataFrame, motoristas: pd.DataFrame, aliases: dict | None = None) -> pd.DataFrame:
     # Merge
-    if "nome do motorista" not in fechamento.columns:
-        raise Exception("Coluna 'nome do motorista' não encontrada no fechamento.xlsx.")
-    if "nome do motorista" not in motoristas.columns:
-        raise Exception("Coluna 'nome do motorista' não encontrada no motoristas.xlsx.")
+    validar_cabecalho("fechamento", fechamento.columns)
+
+    # nomes já conciliados em execuções anteriores (core/conciliacao.py)
+    if aliases:
+        fechamento = fechamento.assign(
+            **{"nome do motorista": aplicar_aliases(fechamento["nome do motorista"], aliases, motoristas["nome do motorista"])}
+        )
 
     banco_consolidado = fechamento.merge(motoristas, on="nome do motorista", how="left")
 
@@ -63,9 +202,94 @@ def gerar_banco_consolidado(
             pd.to_datetime(banco_consolidado[coluna_data], errors="coerce").dt.strftime("%d/%m/%Y")
         )
 
+    return banco_consolidado
+
+
+def _gravar_em_blocos(blocos: Iterator[pd.DataFrame], saida_xlsx_path: str) -> str:
+    """
+    Grava os blocos em fluxo (core/banco_xlsx.py): cada bloco vai direto para
+    o zip do XLSX, sem manter o banco inteiro em memória.
+    """
+    gravar_banco_xlsx(blocos, saida_xlsx_path)
+    return saida_xlsx_path
+
+
+def gerar_banco_consolidado(
+    motoristas_xlsx,
+    fechamento_xlsx,
+    saida_xlsx_path: str | None = None,
+    *,
+    linhas_por_bloco: int | None = None,
+    ao_progresso: Callable[[str, int, int], None] | None = None,
+    encoding_csv: str | None = None,
+    delimitador_csv: str | None = None,
+    aliases: dict | None = None,
+) -> pd.DataFrame | str:
+    """
+    Gera o banco consolidado juntando fechamento + motoristas.
+
+    motoristas_xlsx / fechamento_xlsx:
+      - pode ser caminho (str) para .xlsx, .csv ou .parquet
+      - pode ser file-like (ex: request.files['motoristas'], BytesIO, etc)
+      - o formato vem da extensão ou dos primeiros bytes (core/entrada.py);
+        as colunas passam pela mesma normalização nos três
+
+    encoding_csv / delimitador_csv:
+      - só para CSV; None detecta (utf-8 ou cp1252; ";", ",", tab ou "|").
+        Com ";" a vírgula é o separador decimal.
+
+    saida_xlsx_path:
+      - se informado, salva o arquivo final nesse caminho
+      - se None, apenas retorna o DataFrame
+
+    linhas_por_bloco:
+      - se None (padrão), lê o fechamento inteiro
+      - se informado, lê o fechamento em blocos (ler_em_blocos),
+        consolida bloco a bloco contra motoristas e grava direto em
+        saida_xlsx_path (obrigatório nesse modo). Retorna o path gravado.
+
+    aliases:
+      - {chave do nome (norm_nome_key): nome no motoristas} das associações
+        aceitas na conciliação (core/conciliacao.py); nomes do fechamento sem
+        cadastro são trocados antes do merge
+
+    ao_progresso(fase, feitos, total): "leitura", "consolidar" (no modo em
+    blocos, feitos = blocos já consolidados; total = 0, desconhecido) e "salvar".
+    """
+    def progresso(fase, feitos=0, total=0):
+        if ao_progresso is not None:
+            ao_progresso(fase, feitos, total)
+
+    progresso("leitura")
+
+    motoristas = _preparar_motoristas(
+        ler_planilha(motoristas_xlsx, encoding_csv=encoding_csv, delimitador_csv=delimitador_csv)
+    )
+
+    # ===============================
+    # MODO STREAMING (ARQUIVOS MUITO GRANDES)
+    # ===============================
+    if linhas_por_bloco:
+        if not saida_xlsx_path:
+            raise ValueError("linhas_por_bloco exige saida_xlsx_path.")
+
+        def blocos():
+            fechamento = ler_em_blocos(
+                fechamento_xlsx, linhas_por_bloco, encoding_csv=encoding_csv, delimitador_csv=delimitador_csv
+            )
+            for n, bloco in enumerate(fechamento):
+                progresso("consolidar", n)
+                yield _consolidar(bloco, motoristas, aliases)
+
+        return _gravar_em_blocos(blocos(), saida_xlsx_path)
+
+    fechamento = ler_planilha(fechamento_xlsx, encoding_csv=encoding_csv, delimitador_csv=delimitador_csv)
+    progresso("consolidar")
+    banco_consolidado = _consolidar(fechamento, motoristas, aliases)
+
     # Salvar, se solicitado
     if saida_xlsx_path:
-        os.makedirs(os.path.dirname(saida_xlsx_path), exist_ok=True)
-        banco_consolidado.to_excel(saida_xlsx_path, index=False)
+        progresso("salvar")
+        gravar_banco_xlsx(banco_consolidado, saida_xlsx_path)
 
-    return banco_consolidado
\ No newline at end of file
+    return banco_consolidado
@@ -1,16 +1,124 @@
+import itertools
+import math
+import multiprocessing
 import os
 import re
-import unicodedata
+import tempfile
+import threading
 from io import BytesIO
-from typing import Union, Optional
+from typing import Callable, Iterator, Union, Optional
+from zipfile import ZipFile, ZIP_STORED
 
 import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.styles import Alignment, Border, Side, PatternFill, Font
 
+from core.aba_xml import ModeloXml
+from core.banco import identificar_colunas, ler_banco, norm_city_keys, validar_colunas
+from core.cache_abas import CacheAbas, CheckpointAbas, estilos_usados, hash_bytes, reutilizar_xml
+from core.descontos import LINHAS_DESCONTO, agrupar_por_motorista, juntar_descontos, ler_descontos
+from core.larguras import LarguraColunas
+from core.pacote_xlsx import PacoteEmFluxo, salvar_pacote
+from core.resumo_totais import gerar_resumo_totais
+from core.totais import dividir_em_partes
+
 
 FileLike = Union[str, BytesIO, bytes]
 
+# "openpyxl": copia o modelo e escreve célula por célula (padrão)
+# "xml": gera o sheet XML de cada aba direto a partir do modelo parseado (core/aba_xml.py)
+MOTORES = ("openpyxl", "xml")
+
+# "xlsx": um workbook com uma aba por motorista (padrão)
+# "zip": um .xlsx por motorista + RESUMO.xlsx com os totais, dentro de um ZIP
+FORMATOS_SAIDA = ("xlsx", "zip")
+
+# saída dividida (max_abas_por_arquivo): resumo geral gravado ao lado das partes
+ARQUIVO_RESUMO_GERAL = "RESUMO_GERAL.xlsx"
+
+
+# =========================
+# POOL DE PROCESSOS (workers > 1)
+# =========================
+# Com uma thread só no processo (CLI, worker sync) os filhos são criados por
+# fork: herdam o banco já lido, o modelo parseado e a função de renderização
+# do pai, sem serializar nada disso. Só a lista de motoristas de cada lote vai
+# e o XML de cada aba volta.
+#
+# Com outras threads vivas (worker gthread do gunicorn, servidor do Flask) o
+# fork não é seguro: o filho herda só a thread que chamou o fork, e um lock que
+# outra thread segurava naquele instante (logging, sqlite, fila do SSE) fica
+# travado para sempre nele. Aí os filhos vêm do forkserver (ou spawn, onde não
+# há forkserver): processos novos, que recebem as entradas do Step2 (bytes do
+# banco, do modelo e dos descontos) e refazem a preparação no
+# _inicializar_processo antes do primeiro lote.
+_renderizar_lote = None
+_lock_pool = threading.Lock()
+
+
+def _executar_lote(lote):
+    return _renderizar_lote(lote)
+
+
+def _inicializar_processo(entradas: dict, n_estilos_base: int):
+    global _renderizar_lote
+    _renderizar_lote = gerar_espelhos_motoristas(**entradas, motor="xml", output_dir=None, _estilos_do_pai=n_estilos_base)
+
+
+def fork_disponivel() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def fork_seguro() -> bool:
+    return fork_disponivel() and threading.active_count() == 1
+
+
+def _abrir_pool(n: int, renderizar_lote, entradas: dict, n_estilos_base: int):
+    global _renderizar_lote
+    if fork_seguro():
+        with _lock_pool:
+            _renderizar_lote = renderizar_lote
+            try:
+                return multiprocessing.get_context("fork").Pool(n)
+            finally:
+                _renderizar_lote = None
+
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+    if contexto.get_start_method() == "forkserver":
+        # o forkserver já nasce com pandas/openpyxl/core importados
+        contexto.set_forkserver_preload([__name__])
+    return contexto.Pool(n, initializer=_inicializar_processo, initargs=(entradas, n_estilos_base))
+
+
+class _SaidaEmPedacos:
+    """
+    Destino (só escrita, sem seek) para o ZipFile: acumula o que foi escrito
+    até alguém retirar. Permite mandar o ZIP para a resposta HTTP em pedaços.
+    """
+
+    def __init__(self):
+        self._pedacos = []
+
+    def write(self, data) -> int:
+        self._pedacos.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def retirar(self) -> bytes:
+        data = b"".join(self._pedacos)
+        self._pedacos = []
+        return data
+
+
+def _sem_linhas_de_grade(xml: bytes) -> bytes:
+    # o Step3 oculta as linhas de grade de todas as abas; no ZIP não há Step3
+    if b"showGridLines" in xml:
+        return xml
+    return xml.replace(b"<sheetView ", b'<sheetView showGridLines="0" ', 1)
+
 
 def _to_bytes_io(src: FileLike) -> BytesIO:
     """
@@ -35,39 +143,26 @@ def _to_bytes_io(src: FileLike) -> BytesIO:
     return bio
 
 
-def _strip_accents(s: str) -> str:
-    nfkd = unicodedata.normalize("NFKD", s)
-    return "".join(ch for ch in nfkd if not unicodedata.combining(ch))
-
-
-def _norm_city_key(v) -> str:
-    """
-    Normaliza cidade para agrupamento:
-    - trim
-    - remove acentos
-    - lowercase
-    - remove pontuação básica
-    - colapsa espaços
-    """
-    if v is None:
-        return ""
-    s = str(v).strip()
-    if s == "" or s.lower() == "nan":
-        return ""
-    s = _strip_accents(s)
-    s = s.lower()
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
 def gerar_espelhos_motoristas(
     banco_consolidado_input: FileLike,
     modelo_input: FileLike,
     *,
     output_dir: Optional[str] = "output/espelhos",
     output_filename: str = "Espelhos_Motoristas.xlsx",
-) -> Union[str, bytes]:
+    cache_dir: Optional[str] = None,
+    cache_max_entradas: int = 20000,
+    motor: str = "openpyxl",
+    streaming: bool = False,
+    workers: int = 1,
+    formato: str = "xlsx",
+    max_abas_por_arquivo: int = 0,
+    checkpoint_dir: Optional[str] = None,
+    checkpoint_cada: int = 50,
+    ao_checkpoint: Optional[Callable[[int, int], None]] = None,
+    ao_progresso: Optional[Callable[[str, int, int], None]] = None,
+    descontos_input: Optional[FileLike] = None,
+    _estilos_do_pai: Optional[int] = None,
+) -> Union[str, bytes, Iterator[bytes], list]:
     """
     Gera um único XLSX com uma aba por motorista.
 
@@ -75,45 +170,108 @@ def gerar_espelhos_motoristas(
     - modelo_input: path/bytes/BytesIO do modelo.xlsx
     - Se output_dir for None: retorna bytes do XLSX final (ideal para web).
     - Se output_dir for str: salva em disco e retorna o path final.
+    - cache_dir: se informado, guarda o XML de cada aba entre execuções (ver
+      core/cache_abas.py). Motoristas cujas linhas não mudaram reaproveitam a
+      aba já renderizada em vez de copiar o modelo e escrever célula por célula.
+    - motor: "openpyxl" ou "xml". No "xml" o modelo é parseado uma vez e cada
+      aba vira sheet XML direto (mesmo layout, sem copy_worksheet nem objetos
+      Cell do openpyxl); o workbook só monta o pacote (styles, workbook.xml).
+    - streaming: memória constante. Cada aba é gravada no .xlsx assim que fica
+      pronta (core/pacote_xlsx.PacoteEmFluxo) e descartada; só os nomes das abas
+      ficam até o fim. Usa sempre o motor "xml" (a largura da coluna F sai no
+      <cols>, antes das linhas). Em disco o arquivo só aparece no final.
+    - workers: processos para renderizar as abas (0 = um por núcleo). Com mais
+      de 1 usa o motor "xml": os motoristas são divididos em lotes, renderizados
+      num pool de processos e as abas entram no workbook na ordem original, com
+      os mesmos nomes. Num processo com uma thread só (CLI, worker sync) os
+      filhos vêm de fork; com outras threads (worker gthread do gunicorn) vêm
+      do forkserver/spawn e leem as entradas de novo antes do primeiro lote.
+    - formato: "xlsx" ou "zip". No "zip" cada motorista vira um .xlsx pequeno
+      (motoristas/<aba>.xlsx) e os totais vão num RESUMO.xlsx à parte (valores
+      calculados do banco, ver core/resumo_totais.py). Usa o motor "xml" e os
+      workers; cada arquivo entra no ZIP assim que fica pronto, nenhum
+      workbook grande é montado. Com output_dir=None retorna um iterador de
+      pedaços de bytes do ZIP (para resposta HTTP em streaming); com output_dir
+      grava <output_filename sem extensão>.zip e retorna o path.
+    - max_abas_por_arquivo: acima desse número de motoristas (0 = nunca) a saída
+      é dividida em vários .xlsx por faixa alfabética de motorista
+      (<output_filename>_parte01.xlsx, ...; abas em ordem alfabética dentro de
+      cada parte), cada um pronto para receber o próprio RESUMO no Step3, mais
+      o ARQUIVO_RESUMO_GERAL (totais de todos + aba ARQUIVOS). Usa o motor
+      "xml", exige output_dir e retorna a lista de paths das partes.
+    - checkpoint_dir: abas prontas vão sendo gravadas ali a cada checkpoint_cada
+      abas novas (core/cache_abas.CheckpointAbas). Se a execução for
+      interrompida (ex: timeout do worker), a próxima com o mesmo banco e modelo
+      reaproveita essas abas e só renderiza o resto. Apagado quando o arquivo
+      final fica pronto. Usa o motor "xml"; não se aplica ao formato "zip".
+      ao_checkpoint(abas_no_checkpoint, total_de_abas) é chamado a cada lote.
+    - ao_progresso(fase, feitos, total): chamado a cada aba pronta na fase
+      "renderizar" (feitos de total motoristas, incluindo as que vieram do
+      cache/checkpoint) e no início de "leitura" e "salvar" (feitos=total=0).
+      É chamado por motorista: quem recebe deve ser barato (ver core/progresso.py).
+    - descontos_input: planilha opcional de descontos (motorista, descrição,
+      valor; .xlsx, .csv ou .parquet, ver core/descontos.py). Os descontos de
+      cada motorista vão para as linhas abaixo de "(-) DESCONTOS" da aba dele
+      na mesma passada, e o RESUMO do Step3 já sai com Desconto e Valor Líquido
+      certos. Nos formatos "zip" e dividido entram também nos totais do RESUMO
+      calculado do banco. Motorista da planilha que não está no banco é erro.
+    - _estilos_do_pai: uso interno (_inicializar_processo). Só prepara e
+      devolve a função que renderiza um lote de abas no processo filho.
     """
+    def progresso(fase, feitos=0, total=0):
+        if ao_progresso is not None:
+            ao_progresso(fase, feitos, total)
+
+    progresso("leitura")
+    if motor not in MOTORES:
+        raise ValueError(f"Motor inválido: {motor} (use {' ou '.join(MOTORES)}).")
+    if formato not in FORMATOS_SAIDA:
+        raise ValueError(f"Formato de saída inválido: {formato} (use {' ou '.join(FORMATOS_SAIDA)}).")
+    n_workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
 
     # =========================
     # LER BANCO CONSOLIDADO
     # =========================
     banco_io = _to_bytes_io(banco_consolidado_input)
-    df = pd.read_excel(banco_io)
-    df.columns = df.columns.str.strip().str.lower()
+    df = ler_banco(banco_io)
 
     # =========================
     # IDENTIFICAR COLUNAS
     # =========================
-    def achar_coluna(possiveis):
-        for c in possiveis:
-            if c in df.columns:
-                return c
-        return None
+    cols = identificar_colunas(df)
+    validar_colunas(df, cols)
 
-    col_motorista = achar_coluna(["nome do motorista", "motorista", "nome"])
-    col_prestador = achar_coluna(["prestador", "nome do prestador", "prestador de serviço", "prestador de servico"])
+    col_motorista = cols["motorista"]
+    col_prestador = cols["prestador"]
 
-    col_conta = achar_coluna(["conta", "conta corrente"])
-    col_pix = achar_coluna(["pix", "chave pix"])
-    col_data = achar_coluna(["data"])
-    col_cidade = achar_coluna(["cidade"])
-    col_status = achar_coluna(["status"])
-    col_custo = achar_coluna(["custo", "valor", "valor unitario", "valor unitário"])
+    dividir = formato == "xlsx" and max_abas_por_arquivo > 0 and df[col_motorista].nunique(dropna=False) > max_abas_por_arquivo
+    if dividir and output_dir is None:
+        raise ValueError("max_abas_por_arquivo exige output_dir.")
+    if formato == "zip":
+        checkpoint_dir = None
+    if streaming or n_workers > 1 or formato == "zip" or dividir or checkpoint_dir:
+        motor = "xml"
 
-    col_cnpj = achar_coluna(["cnpj", "cnpj do favorecido", "cnpj/cpf", "cpf/cnpj"])
-    col_cpf = achar_coluna(["cpf", "cpf do favorecido", "cpf/cnpj", "cnpj/cpf"])
+    col_conta = cols["conta"]
+    col_pix = cols["pix"]
+    col_data = cols["data"]
+    col_cidade = cols["cidade"]
+    col_status = cols["status"]
+    col_custo = cols["custo"]
 
-    col_contrato = achar_coluna(["contrato"])
+    col_cnpj = cols["cnpj"]
+    col_cpf = cols["cpf"]
 
-    for obrigatoria in ["cpf", "banco", "agencia", "cliente", "romaneio"]:
-        if obrigatoria not in df.columns:
-            raise Exception(f"Coluna '{obrigatoria}' não encontrada.")
+    col_contrato = cols["contrato"]
 
-    if not all([col_motorista, col_conta, col_pix, col_data, col_cidade, col_status, col_custo]):
-        raise Exception("Coluna obrigatória não encontrada.")
+    # =========================
+    # DESCONTOS (OPCIONAL): juntados aos motoristas do banco uma vez só
+    # =========================
+    descontos = None
+    descontos_por = {}
+    if descontos_input is not None:
+        descontos = juntar_descontos(ler_descontos(descontos_input), df[col_motorista])
+        descontos_por = agrupar_por_motorista(descontos)
 
     # =========================
     # ESTILOS
@@ -155,14 +313,6 @@ def gerar_espelhos_motoristas(
             ws[addr] = f"{label}: {value}"
             ws[addr].font = font_bold
 
-    def auto_largura_coluna_F(ws, start_row=2, end_row=8):
-        max_len = 0
-        for r in range(start_row, end_row + 1):
-            v = ws[f"F{r}"].value
-            if v is not None:
-                max_len = max(max_len, len(str(v)))
-        ws.column_dimensions["F"].width = max_len + 2
-
     def aplicar_borda(ws, row, col_ini, col_fim, borda):
         for c in range(col_ini, col_fim + 1):
             ws.cell(row=row, column=c).border = borda
@@ -206,24 +356,17 @@ def gerar_espelhos_motoristas(
         return candidate
 
     # =========================
-    # ABRIR MODELO
+    # RENDERIZAR A ABA DE UM MOTORISTA
+    # (ws = cópia do modelo no openpyxl ou AbaXml do motor "xml")
     # =========================
-    modelo_io = _to_bytes_io(modelo_input)
-    wb = load_workbook(modelo_io)
-    aba_modelo = wb.active
-    aba_modelo.title = "MODELO_BASE"
-
-    used_sheet_names = set()
-
-    # =========================
-    # GERAR UMA ABA POR MOTORISTA
-    # =========================
-    for motorista in df[col_motorista].drop_duplicates():
-        df_motorista = df[df[col_motorista] == motorista]
+    def renderizar(ws, motorista, df_motorista):
         linha_ref = df_motorista.iloc[0]
 
-        ws = wb.copy_worksheet(aba_modelo)
-        ws.title = nome_aba_valido(str(motorista), used_sheet_names)
+        # por cliente do motorista: linhas da tabela (parte 2) e do mapeamento (parte 3)
+        por_cliente = [
+            (cliente, romaneios_por.get((motorista, cliente), []), cidades_por.get((motorista, cliente), []))
+            for cliente in df_motorista["cliente"].drop_duplicates()
+        ]
 
         # =========================
         # PARTE 1 — DADOS FIXOS + PRESTADOR
@@ -249,31 +392,34 @@ def gerar_espelhos_motoristas(
         else:
             ws["C5"] = ""
 
+        # largura da coluna F medida enquanto F2:F8 são escritas
+        larguras = LarguraColunas(ws)
+
         contrato_val = get_val(linha_ref[col_contrato]) if col_contrato else ""
         if str(contrato_val).strip():
-            ws["F2"] = f"Contrato: {contrato_val}"
+            larguras["F2"] = f"Contrato: {contrato_val}"
             ws["F2"].font = font_bold
         else:
-            ws["F2"] = "Contrato: INEXISTENTE"
+            larguras["F2"] = "Contrato: INEXISTENTE"
             ws["F2"].font = font_bold_red
 
         favorecido_nome = prestador if tem_prestador else motorista
 
-        set_info(ws, "F3", "Banco", linha_ref.get("banco"))
-        set_info(ws, "F4", "Agência", linha_ref.get("agencia"))
-        set_info(ws, "F5", "Conta", linha_ref[col_conta] if col_conta else "")
-        set_info(ws, "F6", "Favorecido", favorecido_nome)
-        set_info(ws, "F7", "CPF/CNPJ do Favorecido", doc_val)
-        set_info(ws, "F8", "PIX", linha_ref[col_pix] if col_pix else "")
+        set_info(larguras, "F3", "Banco", linha_ref.get("banco"))
+        set_info(larguras, "F4", "Agência", linha_ref.get("agencia"))
+        set_info(larguras, "F5", "Conta", linha_ref[col_conta] if col_conta else "")
+        set_info(larguras, "F6", "Favorecido", favorecido_nome)
+        set_info(larguras, "F7", "CPF/CNPJ do Favorecido", doc_val)
+        set_info(larguras, "F8", "PIX", linha_ref[col_pix] if col_pix else "")
 
-        auto_largura_coluna_F(ws, start_row=2, end_row=8)
+        larguras.aplicar(folga=2)
 
         # =========================
         # PARTE 2 — TABELA VARIÁVEL
         # =========================
         linha_atual = 11
 
-        for cliente in df_motorista["cliente"].drop_duplicates():
+        for cliente, romaneios, _ in por_cliente:
             ws.merge_cells(start_row=linha_atual, start_column=1, end_row=linha_atual, end_column=6)
             cell = ws.cell(row=linha_atual, column=1)
             cell.value = cliente
@@ -283,17 +429,12 @@ def gerar_espelhos_motoristas(
             aplicar_borda(ws, linha_atual, 1, 6, border_all)
             linha_atual += 1
 
-            df_cliente = df_motorista[df_motorista["cliente"] == cliente]
-            romaneios = df_cliente["romaneio"].dropna().drop_duplicates()
-
-            for rom in romaneios:
-                df_rom = df_cliente[df_cliente["romaneio"] == rom]
-
+            for rom, qtd, cidade, data, status in romaneios:
                 ws.cell(row=linha_atual, column=1, value=rom).font = font_bold
-                ws.cell(row=linha_atual, column=2, value=df_rom.shape[0]).font = font_bold
-                ws.cell(row=linha_atual, column=4, value=df_rom.iloc[0][col_cidade]).font = font_bold
-                ws.cell(row=linha_atual, column=5, value=df_rom.iloc[0][col_data]).font = font_bold
-                ws.cell(row=linha_atual, column=6, value=df_rom.iloc[0][col_status]).font = font_bold
+                ws.cell(row=linha_atual, column=2, value=qtd).font = font_bold
+                ws.cell(row=linha_atual, column=4, value=cidade).font = font_bold
+                ws.cell(row=linha_atual, column=5, value=data).font = font_bold
+                ws.cell(row=linha_atual, column=6, value=status).font = font_bold
 
                 aplicar_linha(ws, linha_atual, 1, 6, alignment=align_center, borda=border_all)
                 linha_atual += 1
@@ -319,7 +460,7 @@ def gerar_espelhos_motoristas(
         soma_geral_qtd = 0
         soma_geral_valor = 0
 
-        for cliente in df_motorista["cliente"].drop_duplicates():
+        for cliente, _, cidades in por_cliente:
             ws.merge_cells(start_row=linha_atual, start_column=2, end_row=linha_atual, end_column=6)
             ws[f"B{linha_atual}"] = cliente
             ws[f"B{linha_atual}"].font = font_bold
@@ -331,26 +472,10 @@ def gerar_espelhos_motoristas(
 
             linha_atual += 1
 
-            df_cliente = df_motorista[df_motorista["cliente"] == cliente].copy()
-
-            # cria chave normalizada da cidade
-            df_cliente["_cidade_key"] = df_cliente[col_cidade].apply(_norm_city_key)
-
-            # valor unitário numérico para chave (se não der, vira NaN)
-            df_cliente["_unit_num"] = pd.to_numeric(df_cliente[col_custo], errors="coerce")
-
-            # remove cidades vazias (mantém unit NaN se existir, mas cidade vazia não entra)
-            df_cliente = df_cliente[df_cliente["_cidade_key"] != ""]
+            for cidade, unit_num, quantidade, valor_unitario_original in cidades:
+                cidade_display = str(cidade).strip()
 
-            # ✅ OPÇÃO A: agrupar por (cidade_normalizada + valor_unitário)
-            # (se unit vier inválido e virar NaN, fica agrupado separado também)
-            for (key, unit_num), grp in df_cliente.groupby(["_cidade_key", "_unit_num"], sort=True, dropna=False):
-                cidade_display = str(grp[col_cidade].iloc[0]).strip()
-
-                quantidade = int(grp.shape[0])
-
-                # preserva o que você escreve na planilha (pode ser texto ou número original)
-                valor_unitario_original = grp.iloc[0][col_custo]
+                # valor_unitario_original: preserva o que você escreve na planilha (pode ser texto ou número original)
 
                 # total só calcula se unit_num é número válido
                 if pd.notna(unit_num):
@@ -427,7 +552,8 @@ def gerar_espelhos_motoristas(
         for col in ["A", "B", "C", "D", "E", "F"]:
             ws[f"{col}{linha_atual}"].border = border_all
 
-        for _ in range(5):
+        linhas_desconto = descontos_por.get(motorista, [])
+        for i in range(LINHAS_DESCONTO):
             linha_atual += 1
             ws[f"A{linha_atual}"].border = border_lr
             ws[f"F{linha_atual}"].border = border_lr
@@ -436,6 +562,12 @@ def gerar_espelhos_motoristas(
             ws[f"F{linha_atual}"].font = font_red
             ws[f"F{linha_atual}"].number_format = formato_contabil
 
+            if i < len(linhas_desconto):
+                descricao, valor = linhas_desconto[i]
+                ws[f"A{linha_atual}"] = descricao
+                ws[f"A{linha_atual}"].alignment = align_left_center
+                ws[f"F{linha_atual}"] = valor
+
         linha_atual += 1
 
         ws.merge_cells(start_row=linha_atual, start_column=1, end_row=linha_atual, end_column=5)
@@ -453,6 +585,359 @@ def gerar_espelhos_motoristas(
             ws[f"{col}{linha_atual}"].fill = fill_cliente
             ws[f"{col}{linha_atual}"].font = font_bold
 
+    # =========================
+    # ABRIR MODELO
+    # =========================
+    modelo_io = _to_bytes_io(modelo_input)
+    wb = load_workbook(modelo_io)
+    aba_modelo = wb.active
+    aba_modelo.title = "MODELO_BASE"
+
+    modelo_xml = ModeloXml(wb, aba_modelo) if motor == "xml" else None
+
+    used_sheet_names = set()
+
+    # =========================
+    # CACHE DE ABAS (OPCIONAL)
+    # =========================
+    cache = CacheAbas(cache_dir, max_entradas=cache_max_entradas) if cache_dir else None
+    versao_modelo = hash_bytes(modelo_io.getvalue()) if cache is not None else ""
+    xml_pronto = {}        # aba -> XML reaproveitado do cache
+    checkpoint = None
+    if checkpoint_dir:
+        assinatura = f"banco={hash_bytes(banco_io.getvalue())};modelo={hash_bytes(modelo_io.getvalue())};cols={sorted(cols.items())}"
+        if descontos_por:
+            assinatura += f";descontos={hash_bytes(repr(list(descontos_por.items())).encode('utf-8'))}"
+        checkpoint = CheckpointAbas(checkpoint_dir, assinatura, cada=checkpoint_cada)
+    chave_por_aba = {}     # aba renderizada agora -> chave para guardar no cache
+
+    # =========================
+    # LINHAS DAS PARTES 2 E 3 (vetorizado, uma vez para o banco todo)
+    # =========================
+    # Mesmo resultado de filtrar motorista -> cliente -> romaneio/cidade aba por aba:
+    # - romaneios_por[(motorista, cliente)]: (romaneio, qtd de linhas, cidade, data, status
+    #   da primeira linha), na ordem em que os romaneios aparecem
+    # - cidades_por[(motorista, cliente)]: ✅ OPÇÃO A, um grupo por (cidade normalizada +
+    #   valor unitário), ordenado por cidade e valor (valor inválido/NaN fica separado,
+    #   por último): (cidade da primeira linha, valor numérico, qtd, valor original)
+    base = pd.DataFrame(
+        {
+            "_motorista": df[col_motorista],
+            "_cliente": df["cliente"],
+            "_romaneio": df["romaneio"],
+            "_cidade": df[col_cidade],
+            "_data": df[col_data],
+            "_status": df[col_status],
+            "_custo": df[col_custo],
+            "_cidade_key": norm_city_keys(df[col_cidade]),
+            "_unit_num": pd.to_numeric(df[col_custo], errors="coerce"),
+        }
+    )
+    base = base[base["_motorista"].notna() & base["_cliente"].notna()]
+
+    com_romaneio = base[base["_romaneio"].notna()]
+    chave_rom = ["_motorista", "_cliente", "_romaneio"]
+    com_romaneio = com_romaneio.assign(
+        _qtd=com_romaneio.groupby(chave_rom, sort=False)["_romaneio"].transform("size")
+    ).drop_duplicates(subset=chave_rom)
+
+    romaneios_por = {}
+    for m, c, *linha in com_romaneio[
+        ["_motorista", "_cliente", "_romaneio", "_qtd", "_cidade", "_data", "_status"]
+    ].itertuples(index=False, name=None):
+        romaneios_por.setdefault((m, c), []).append(linha)
+
+    # cidade vazia não entra no mapeamento
+    com_cidade = base[base["_cidade_key"] != ""]
+    chave_cid = ["_motorista", "_cliente", "_cidade_key", "_unit_num"]
+    grupos_cidade = (
+        com_cidade.assign(_qtd=com_cidade.groupby(chave_cid, sort=False, dropna=False)["_cidade_key"].transform("size"))
+        .drop_duplicates(subset=chave_cid)
+        .sort_values(["_cidade_key", "_unit_num"], na_position="last", kind="stable")
+    )
+
+    cidades_por = {}
+    for m, c, *linha in grupos_cidade[
+        ["_motorista", "_cliente", "_cidade", "_unit_num", "_qtd", "_custo"]
+    ].itertuples(index=False, name=None):
+        cidades_por.setdefault((m, c), []).append(linha)
+
+    # =========================
+    # GERAR UMA ABA POR MOTORISTA
+    # =========================
+    # posições das linhas de cada motorista (um groupby em vez de um filtro por motorista)
+    linhas_por_motorista = df.groupby(col_motorista, sort=False).indices
+
+    # estilos que já existem no workbook quando o pool é aberto (iguais nos processos filhos)
+    n_estilos_base = 0
+
+    def emitir(nome_aba, xml):
+        if pacote is not None:
+            pacote.adicionar(nome_aba, xml)
+        else:
+            # aba vazia só reserva nome/posição; o XML entra na hora de salvar
+            wb.create_sheet(nome_aba)
+            xml_pronto[nome_aba] = xml
+
+    def df_do_motorista(motorista):
+        if motorista in linhas_por_motorista:
+            return df.iloc[linhas_por_motorista[motorista]]
+        return df[df[col_motorista] == motorista]
+
+    def renderizar_xml(motorista, nome_aba) -> bytes:
+        aba = modelo_xml.nova_aba(nome_aba)
+        renderizar(aba, motorista, df_do_motorista(motorista))
+        return aba.xml()
+
+    def renderizar_lote(lote):
+        # roda nos processos filhos: XML + só os estilos criados depois do fork
+        saida = []
+        for motorista, nome_aba in lote:
+            xml = renderizar_xml(motorista, nome_aba)
+            saida.append((xml, estilos_usados(wb, xml, a_partir_de=n_estilos_base)))
+        return saida
+
+    if _estilos_do_pai is not None:
+        # processo filho sem fork: mesma preparação do pai, então os mesmos estilos base
+        n_estilos_base = _estilos_do_pai
+        return renderizar_lote
+
+    def montar_plano():
+        # (motorista, nome da aba, chave de cache) na ordem do banco
+        plano = []
+        for motorista in df[col_motorista].drop_duplicates():
+            nome_aba = nome_aba_valido(str(motorista), used_sheet_names)
+            chave = (
+                cache.chave(df_do_motorista(motorista), cols, versao_modelo, descontos_por.get(motorista))
+                if cache is not None
+                else None
+            )
+            plano.append((motorista, nome_aba, chave))
+        return plano
+
+    def abas(plano=None):
+        """
+        (nome_aba, xml) de cada aba do motor "xml", na ordem do plano. No motor
+        "openpyxl" as abas são criadas direto no workbook e nada é devolvido.
+        """
+        # 1) nome de cada aba (ordem final) e chave de cache
+        if plano is None:
+            plano = montar_plano()
+
+        # 2) abas fora do cache renderizadas em paralelo (motor "xml", workers > 1)
+        nonlocal n_estilos_base
+        renderizadas = iter(())
+        pool = None
+        if n_workers > 1:
+            pendentes = [
+                (m, nome) for m, nome, chave in plano
+                if (chave is None or not cache.contem(chave)) and (checkpoint is None or checkpoint.obter(nome) is None)
+            ]
+            if len(pendentes) > 1:
+                tam_lote = max(1, math.ceil(len(pendentes) / (n_workers * 4)))
+                lotes = [pendentes[i: i + tam_lote] for i in range(0, len(pendentes), tam_lote)]
+                n_estilos_base = len(wb._cell_styles)
+                entradas = {
+                    "banco_consolidado_input": banco_io.getvalue(),
+                    "modelo_input": modelo_io.getvalue(),
+                    "descontos_input": descontos_input.getvalue() if isinstance(descontos_input, BytesIO) else descontos_input,
+                }
+                pool = _abrir_pool(min(n_workers, len(lotes)), renderizar_lote, entradas, n_estilos_base)
+                renderizadas = itertools.chain.from_iterable(pool.imap(_executar_lote, lotes))
+                pendentes = {nome for _, nome in pendentes}
+            else:
+                pendentes = set()
+        else:
+            pendentes = set()
+
+        # 3) emitir na ordem do plano
+        def guardar(nome_aba, chave, xml):
+            # aba nova: cache entre execuções e/ou checkpoint desta execução
+            if chave is None and checkpoint is None:
+                return
+            estilos = estilos_usados(wb, xml)
+            if chave is not None:
+                cache.guardar(chave, xml, estilos)
+            if checkpoint is not None and checkpoint.registrar(nome_aba, xml, estilos) and ao_checkpoint:
+                ao_checkpoint(len(checkpoint), len(plano))
+
+        try:
+            for feitos, (motorista, nome_aba, chave) in enumerate(plano):
+                progresso("renderizar", feitos, len(plano))
+                if checkpoint is not None:
+                    entrada = checkpoint.obter(nome_aba)
+                    if entrada is not None:
+                        yield nome_aba, reutilizar_xml(wb, *entrada)
+                        continue
+
+                if nome_aba in pendentes:
+                    xml, estilos = next(renderizadas)
+                    xml = reutilizar_xml(wb, xml, estilos)
+                    yield nome_aba, xml
+                    guardar(nome_aba, chave, xml)
+                    continue
+
+                if chave is not None:
+                    entrada = cache.obter(chave)
+                    if entrada is not None:
+                        yield nome_aba, reutilizar_xml(wb, *entrada)
+                        continue
+                    chave_por_aba[nome_aba] = chave
+
+                if motor == "xml":
+                    xml = renderizar_xml(motorista, nome_aba)
+                    yield nome_aba, xml
+                    chave_por_aba.pop(nome_aba, None)
+                    guardar(nome_aba, chave, xml)
+                    continue
+
+                ws = wb.copy_worksheet(aba_modelo)
+                ws.title = nome_aba
+                renderizar(ws, motorista, df_do_motorista(motorista))
+            progresso("renderizar", len(plano), len(plano))
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def gerar_abas():
+        for nome_aba, xml in abas():
+            emitir(nome_aba, xml)
+
+    def concluir_checkpoint():
+        if checkpoint is not None:
+            checkpoint.limpar()
+
+    # =========================
+    # MODO ZIP: um .xlsx por motorista
+    # =========================
+    if formato == "zip":
+        del wb["MODELO_BASE"]  # já está parseado no ModeloXml
+        resumo_xlsx = gerar_resumo_totais(df, descontos=descontos)
+
+        def xlsx_de_uma_aba(nome_aba, xml) -> bytes:
+            # mesmo workbook (estilos, tema) com só esta aba
+            buf = BytesIO()
+            pacote_aba = PacoteEmFluxo(wb, buf)
+            pacote_aba.adicionar(nome_aba, _sem_linhas_de_grade(xml))
+            pacote_aba.fechar()
+            return buf.getvalue()
+
+        def pedacos_zip():
+            saida = _SaidaEmPedacos()
+            # os .xlsx já são comprimidos: ZIP_STORED
+            with ZipFile(saida, "w", ZIP_STORED, allowZip64=True) as zf:
+                zf.writestr("RESUMO.xlsx", resumo_xlsx)
+                yield saida.retirar()
+                for nome_aba, xml in abas():
+                    zf.writestr(f"motoristas/{nome_aba}.xlsx", xlsx_de_uma_aba(nome_aba, xml))
+                    yield saida.retirar()
+            yield saida.retirar()
+            if cache is not None:
+                cache.podar()
+
+        if output_dir is None:
+            return pedacos_zip()
+
+        os.makedirs(output_dir, exist_ok=True)
+        final_path = os.path.join(output_dir, os.path.splitext(output_filename)[0] + ".zip")
+        fd, tmp_path = tempfile.mkstemp(suffix=".zip", dir=output_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for pedaco in pedacos_zip():
+                    f.write(pedaco)
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return final_path
+
+    # =========================
+    # MODO DIVIDIDO: uma parte por faixa alfabética de motoristas
+    # =========================
+    if dividir:
+        del wb["MODELO_BASE"]  # já está parseado no ModeloXml
+        os.makedirs(output_dir, exist_ok=True)
+
+        plano = montar_plano()
+        partes = dividir_em_partes([m for m, _, _ in plano], max_abas_por_arquivo)
+        base, ext = os.path.splitext(output_filename)
+        caminhos = [os.path.join(output_dir, f"{base}_parte{i:02d}{ext}") for i in range(1, len(partes) + 1)]
+
+        # uma passada só (um pool só); cada parte é um trecho contínuo do plano ordenado
+        geradas = abas([plano[i] for parte in partes for i in parte])
+        try:
+            for caminho, parte in zip(caminhos, partes):
+                fd, tmp_path = tempfile.mkstemp(suffix=ext, dir=output_dir)
+                os.close(fd)
+                pacote_parte = PacoteEmFluxo(wb, tmp_path)
+                try:
+                    for nome_aba, xml in itertools.islice(geradas, len(parte)):
+                        pacote_parte.adicionar(nome_aba, xml)
+                    pacote_parte.fechar()
+                    os.replace(tmp_path, caminho)
+                except Exception:
+                    pacote_parte.descartar()
+                    raise
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+        finally:
+            geradas.close()
+
+        progresso("salvar")
+        resumo_geral = gerar_resumo_totais(
+            df,
+            partes=[(os.path.basename(c), [plano[i][0] for i in parte]) for c, parte in zip(caminhos, partes)],
+            descontos=descontos,
+        )
+        with open(os.path.join(output_dir, ARQUIVO_RESUMO_GERAL), "wb") as f:
+            f.write(resumo_geral)
+
+        if cache is not None:
+            cache.podar()
+        concluir_checkpoint()
+        return caminhos
+
+    # =========================
+    # MODO STREAMING: abas vão direto para o arquivo
+    # =========================
+    if streaming:
+        del wb["MODELO_BASE"]  # já está parseado no ModeloXml
+
+        if output_dir is None:
+            destino = BytesIO()
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+            fd, destino = tempfile.mkstemp(suffix=".xlsx", dir=output_dir)
+            os.close(fd)
+
+        pacote = PacoteEmFluxo(wb, destino)
+        try:
+            gerar_abas()
+            progresso("salvar")
+            pacote.fechar()
+        except Exception:
+            pacote.descartar()
+            if output_dir is not None and os.path.exists(destino):
+                os.remove(destino)
+            raise
+
+        if cache is not None:
+            cache.podar()
+
+        if output_dir is None:
+            concluir_checkpoint()
+            return destino.getvalue()
+
+        final_path = os.path.join(output_dir, output_filename)
+        os.replace(destino, final_path)
+        concluir_checkpoint()
+        return final_path
+
+    pacote = None
+    gerar_abas()
+    progresso("salvar")
+
     # =========================
     # REMOVER ABA MODELO
     # =========================
@@ -461,15 +946,31 @@ def gerar_espelhos_motoristas(
     # =========================
     # SALVAR (disco ou bytes)
     # =========================
+    def salvar(destino):
+        if cache is None and not xml_pronto:
+            wb.save(destino)
+            return
+
+        def guardar_no_cache(ws, xml):
+            chave = chave_por_aba.get(ws.title)
+            if chave:
+                cache.guardar(chave, xml, estilos_usados(wb, xml))
+
+        salvar_pacote(wb, destino, xml_pronto=xml_pronto, ao_serializar=guardar_no_cache if cache is not None else None)
+        if cache is not None:
+            cache.podar()
+
     if output_dir is None:
         out = BytesIO()
-        wb.save(out)
+        salvar(out)
         out.seek(0)
+        concluir_checkpoint()
         return out.getvalue()
 
     os.makedirs(output_dir, exist_ok=True)
     final_path = os.path.join(output_dir, output_filename)
-    wb.save(final_path)
+    salvar(final_path)
+    concluir_checkpoint()
     return final_path
 
 
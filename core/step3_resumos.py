@@ -1,11 +1,37 @@
 import os
+import re
+from typing import Callable, Optional
+
+import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.styles import Font, Border, Side, Alignment
 
+from core.banco import ler_banco
+from core.cache_formulas import gravar_resultados_formulas
+from core.larguras import LarguraColunas
+from core.totais import layout_mapeamento, matriz_resumo_total, preparar
+
+# =========================
+# BLOCO DE TOTAIS NA ABA DE CADA MOTORISTA (bloco_totais=True)
+# =========================
+# Células fixas, iguais em todas as abas (colunas ocultas, fora da área de
+# impressão do modelo): rótulo em H, valor em I. Cliente j (ordem do banco, a
+# mesma das colunas do RESUMO TOTAL) fica em I{LINHA_BLOCO_CLIENTES + j}.
+COLUNA_BLOCO_ROTULO = "H"
+COLUNA_BLOCO_VALOR = "I"
+LINHA_BLOCO_BRUTO = 1
+LINHA_BLOCO_DESCONTO = 2
+LINHA_BLOCO_LIQUIDO = 3
+LINHA_BLOCO_CLIENTES = 4
+
 
 def gerar_resumos(
     espelhos_xlsx_path: str,
     banco_consolidado_xlsx_path: str,
+    *,
+    valores_em_cache: bool = False,
+    bloco_totais: bool = False,
+    ao_progresso: Optional[Callable[[str, int, int], None]] = None,
 ) -> str:
     """
     Cria as abas RESUMO e RESUMO TOTAL dentro do arquivo Espelhos_Motoristas.xlsx.
@@ -17,8 +43,26 @@ def gerar_resumos(
     - RESUMO TOTAL: adicionar última linha "CUSTO TOTAL" somando cada coluna (clientes, valor bruto, desconto em vermelho, valor líquido)
     - Centralização do nome do motorista e do "CUSTO TOTAL" (aba RESUMO e RESUMO TOTAL)
 
+    valores_em_cache=True: grava o resultado de cada fórmula (RESUMO, RESUMO TOTAL e
+    descontos/líquido das abas dos motoristas) junto da fórmula. Quem lê com
+    data_only=True já recebe os totais e o Excel não precisa recalcular ao abrir.
+
+    bloco_totais=True: cada aba de motorista ganha um bloco de totais em células
+    fixas (valor bruto, desconto, líquido e um SUM por cliente, ver
+    COLUNA_BLOCO_VALOR/LINHA_BLOCO_*) e o RESUMO/RESUMO TOTAL só referenciam
+    essas células ('aba'!I1, 'aba'!I{4+j}) em vez de um SUM de intervalo de
+    outra aba por motorista x cliente: fórmulas curtas e uniformes, XML menor e
+    um grafo de dependências com uma célula por referência no recálculo.
+
+    ao_progresso(fase, feitos, total): "leitura", "resumos" (abas de motorista
+    lidas para o RESUMO), "resumo_total" (linhas do RESUMO TOTAL) e "salvar".
+
     Retorna o próprio path do espelhos (arquivo final).
     """
+    def progresso(fase, feitos=0, total=0):
+        if ao_progresso is not None:
+            ao_progresso(fase, feitos, total)
+
     if not os.path.exists(espelhos_xlsx_path):
         raise FileNotFoundError(f"Arquivo não encontrado: {espelhos_xlsx_path}")
     if not os.path.exists(banco_consolidado_xlsx_path):
@@ -44,6 +88,9 @@ def gerar_resumos(
     def excel_sheet_ref(name: str) -> str:
         return name.replace("'", "''")
 
+    def ref_bloco(aba: str, linha: int) -> str:
+        return f"='{excel_sheet_ref(aba)}'!{COLUNA_BLOCO_VALOR}{linha}"
+
     def style_cell(cell, *, font=None, alignment=None, border=None, number_format=None):
         if font is not None:
             cell.font = font
@@ -54,15 +101,6 @@ def gerar_resumos(
         if number_format is not None:
             cell.number_format = number_format
 
-    def auto_ajuste(ws):
-        for column_cells in ws.columns:
-            max_length = 0
-            col_letter = column_cells[0].column_letter
-            for cell in column_cells:
-                if cell.value is not None:
-                    max_length = max(max_length, len(str(cell.value)))
-            ws.column_dimensions[col_letter].width = max_length + 3
-
     def find_descontos_row(ws):
         for row in ws.iter_rows():
             for cell in row:
@@ -122,6 +160,131 @@ def gerar_resumos(
 
         return ranges
 
+    def ranges_pelo_layout(ws, chave):
+        """
+        Intervalos dos clientes no mapeamento calculados do banco
+        (layout_mapeamento), conferidos só nas linhas de título de cada cliente
+        e no TOTAL. Se a aba não bater com o layout, None (procura na aba).
+        """
+        linhas = layout_por_motorista.get(chave)
+        if linhas is None:
+            return None
+        cab = linhas[0][1]
+        if norm_text(ws[f"B{cab}"].value).upper() != "CIDADE" or norm_text(ws[f"F{cab}"].value).upper() != "VALOR TOTAL":
+            return None
+        ranges = {}
+        for cliente, _, linha_cliente, ini, fim in linhas:
+            if norm_text(ws[f"B{linha_cliente}"].value) != norm_text(cliente):
+                return None
+            if cliente in clientes_set:
+                ranges[cliente] = (ini, fim) if fim >= ini else None
+        if norm_text(ws[f"B{linhas[-1][4] + 1}"].value).upper() != "TOTAL":
+            return None
+        return ranges
+
+    def chave_no_banco(ws, motorista):
+        # C4 = "Motorista - documento"; sem documento fica "Motorista -"
+        if motorista in chave_por_nome:
+            return chave_por_nome[motorista]
+        c4 = norm_text(ws["C4"].value)
+        return chave_por_nome.get(c4[:-1].strip() if c4.endswith(" -") else c4)
+
+    def numero(v):
+        # o que SUM/N() consideram: só números; texto e vazio valem 0
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return v
+        return 0
+
+    def soma_coluna_f(ws, ini, fim):
+        return sum(numero(ws[f"F{r}"].value) for r in range(ini, fim + 1))
+
+    def eh_formula(v):
+        return isinstance(v, str) and v.startswith("=")
+
+    # {aba: {coord: valor}} com o resultado de cada fórmula escrita
+    resultados = {} if valores_em_cache else None
+    resultados_completos = True
+
+    def guardar(aba, coord, valor):
+        nonlocal resultados_completos
+        if resultados is None:
+            return
+        if valor is None:
+            resultados_completos = False
+            return
+        resultados.setdefault(aba, {})[coord] = valor
+
+    def valores_motorista(ws, aba, bruto_row, desc_row):
+        """
+        Resultado das fórmulas do Step2 na aba do motorista:
+        F{descontos} = SUM(F..:F..) e F{líquido} = F{nota} - F{descontos}.
+        Retorna o valor dos descontos (None se não for possível calcular).
+        """
+        if not desc_row:
+            return None
+
+        v = ws[f"F{desc_row}"].value
+        m = re.fullmatch(r"=SUM\(F(\d+):F(\d+)\)", str(v)) if eh_formula(v) else None
+        if m:
+            desconto = soma_coluna_f(ws, int(m.group(1)), int(m.group(2)))
+            guardar(aba, f"F{desc_row}", desconto)
+        elif eh_formula(v):
+            guardar(aba, f"F{desc_row}", None)
+            return None
+        else:
+            desconto = numero(v)
+
+        for r in range(desc_row + 1, ws.max_row + 1):
+            if not norm_text(ws[f"A{r}"].value).upper().startswith("VALOR LÍQUIDO"):
+                continue
+            v = ws[f"F{r}"].value
+            m = re.fullmatch(r"=F(\d+)-F(\d+)", str(v)) if eh_formula(v) else None
+            if m and int(m.group(2)) == desc_row and int(m.group(1)) == bruto_row:
+                guardar(aba, f"F{r}", numero(ws[f"F{bruto_row}"].value) - desconto)
+            elif eh_formula(v):
+                guardar(aba, f"F{r}", None)
+            break
+
+        return desconto
+
+    def escrever_bloco(ws, aba, bruto_row, desc_row, valor_bruto, desconto):
+        """
+        Valor bruto, desconto e líquido do bloco de totais da aba do motorista
+        (as linhas dos clientes vão junto do RESUMO TOTAL, em escrever_bloco_cliente).
+        """
+        ws.column_dimensions[COLUNA_BLOCO_ROTULO].hidden = True
+        ws.column_dimensions[COLUNA_BLOCO_VALOR].hidden = True
+
+        bruto = f"{COLUNA_BLOCO_VALOR}{LINHA_BLOCO_BRUTO}"
+        desc = f"{COLUNA_BLOCO_VALOR}{LINHA_BLOCO_DESCONTO}"
+        liq = f"{COLUNA_BLOCO_VALOR}{LINHA_BLOCO_LIQUIDO}"
+        ws[f"{COLUNA_BLOCO_ROTULO}{LINHA_BLOCO_BRUTO}"] = "Valor Bruto"
+        ws[f"{COLUNA_BLOCO_ROTULO}{LINHA_BLOCO_DESCONTO}"] = "Desconto"
+        ws[f"{COLUNA_BLOCO_ROTULO}{LINHA_BLOCO_LIQUIDO}"] = "Valor Líquido"
+
+        ws[bruto] = f"=F{bruto_row}" if bruto_row else 0
+        ws[desc] = f"=F{desc_row}" if desc_row else 0
+        ws[liq] = f"={bruto}-{desc}"
+        for coord in (bruto, desc, liq):
+            ws[coord].number_format = formato_contabil
+
+        if resultados is not None:
+            b = None if eh_formula(valor_bruto) else numero(valor_bruto)
+            if bruto_row:
+                guardar(aba, bruto, b)
+            if desc_row:
+                guardar(aba, desc, desconto)
+            guardar(aba, liq, None if b is None or desconto is None else b - desconto)
+
+    def escrever_bloco_cliente(ws, aba, j, cliente, s, e, valor):
+        linha = LINHA_BLOCO_CLIENTES + j
+        ws[f"{COLUNA_BLOCO_ROTULO}{linha}"] = cliente
+        ws[f"{COLUNA_BLOCO_VALOR}{linha}"] = f"=SUM(F{s}:F{e})"
+        ws[f"{COLUNA_BLOCO_VALOR}{linha}"].number_format = formato_contabil
+        if resultados is not None:
+            guardar(aba, f"{COLUNA_BLOCO_VALOR}{linha}", valor)
+        return ref_bloco(aba, linha)
+
     def nome_limpo(valor):
         """
         Remove sufixo ' - documento' se existir.
@@ -145,9 +308,20 @@ def gerar_resumos(
     # =========================
     # ABRIR ARQUIVOS
     # =========================
+    progresso("leitura")
     wb_espelhos = load_workbook(espelhos_xlsx_path, data_only=False)
-    wb_banco = load_workbook(banco_consolidado_xlsx_path, data_only=True)
-    ws_banco = wb_banco.active
+
+    # =========================
+    # RESUMO TOTAL DIRETO DO BANCO (pivot motorista x cliente + layout do mapeamento)
+    # =========================
+    df_banco = ler_banco(banco_consolidado_xlsx_path)
+    cols_banco = preparar(df_banco)
+    matriz = matriz_resumo_total(df_banco, cols_banco)
+    layout_por_motorista = {
+        m: list(g[["cliente", "linha_cabecalho", "linha_cliente", "ini", "fim"]].itertuples(index=False, name=None))
+        for m, g in layout_mapeamento(df_banco, cols_banco).groupby("motorista", sort=False)
+    }
+    chave_por_nome = {str(m).strip(): m for m in matriz.index}
 
     # =========================
     # OCULTAR LINHAS DE GRADE (TODAS AS ABAS)
@@ -168,17 +342,20 @@ def gerar_resumos(
     ws_resumo = wb_espelhos.create_sheet("RESUMO")
     ws_resumo.sheet_view.showGridLines = False
 
-    ws_resumo["A1"] = "Relação dos Parceiros para Pagamento"
+    # toda escrita de valor passa pelo rastreador (largura das colunas no final)
+    resumo = LarguraColunas(ws_resumo)
+
+    resumo["A1"] = "Relação dos Parceiros para Pagamento"
     ws_resumo["A1"].font = bold
-    ws_resumo["A2"] = "Centro de Custo:"
-    ws_resumo["A3"] = "Período:"
-    ws_resumo["E3"] = "Vencimento:"
+    resumo["A2"] = "Centro de Custo:"
+    resumo["A3"] = "Período:"
+    resumo["E3"] = "Vencimento:"
     ws_resumo["E3"].border = border_all
 
     linha_inicio = 5
     cabecalhos = ["Nome do motorista", "Valor Bruto", "Desconto", "Valor Líquido", "Status NF"]
     for col, texto in enumerate(cabecalhos, start=1):
-        cell = ws_resumo.cell(row=linha_inicio, column=col, value=texto)
+        cell = resumo.cell(row=linha_inicio, column=col, value=texto)
         style_cell(
             cell,
             font=bold_red if texto == "Desconto" else bold,
@@ -196,10 +373,12 @@ def gerar_resumos(
     motorista_to_sheet = {}
     bruto_row_por_motorista = {}
     desconto_row_por_motorista = {}
+    bruto_por_motorista = {}
+    desconto_por_motorista = {}
 
-    for aba in wb_espelhos.sheetnames:
-        if aba in ("RESUMO", "RESUMO TOTAL"):
-            continue
+    abas_motoristas = [aba for aba in wb_espelhos.sheetnames if aba not in ("RESUMO", "RESUMO TOTAL")]
+    for feitos, aba in enumerate(abas_motoristas):
+        progresso("resumos", feitos, len(abas_motoristas))
 
         ws_m = wb_espelhos[aba]
 
@@ -214,34 +393,55 @@ def gerar_resumos(
         if valor_bruto is None:
             valor_bruto = 0
 
+        desconto = valores_motorista(ws_m, aba, bruto_row, desc_row) if resultados is not None else None
+        if eh_formula(valor_bruto):
+            # valor da nota editado como fórmula: resultado desconhecido aqui
+            guardar("RESUMO", f"B{linha_atual}", None)
+
         # Nome do motorista centralizado
-        cell_nome = ws_resumo.cell(row=linha_atual, column=1, value=motorista)
+        cell_nome = resumo.cell(row=linha_atual, column=1, value=motorista)
         style_cell(cell_nome, alignment=center)
 
         motoristas_list.append(motorista)
         motorista_to_sheet[motorista] = aba
         bruto_row_por_motorista[motorista] = bruto_row
         desconto_row_por_motorista[motorista] = desc_row
+        bruto_por_motorista[motorista] = numero(valor_bruto)
+        desconto_por_motorista[motorista] = desconto if desc_row else 0
+
+        if bloco_totais:
+            escrever_bloco(ws_m, aba, bruto_row, desc_row, valor_bruto, desconto_por_motorista[motorista])
+            if bruto_row:
+                if not eh_formula(valor_bruto):
+                    guardar("RESUMO", f"B{linha_atual}", bruto_por_motorista[motorista])
+                valor_bruto = ref_bloco(aba, LINHA_BLOCO_BRUTO)
 
         style_cell(
-            ws_resumo.cell(row=linha_atual, column=2, value=valor_bruto),
+            resumo.cell(row=linha_atual, column=2, value=valor_bruto),
             number_format=formato_contabil,
             alignment=center
         )
 
         if desc_row:
-            c_desc = ws_resumo.cell(row=linha_atual, column=3, value=f"='{aba}'!F{desc_row}")
+            ref_desc = ref_bloco(aba, LINHA_BLOCO_DESCONTO) if bloco_totais else f"='{excel_sheet_ref(aba)}'!F{desc_row}"
+            c_desc = resumo.cell(row=linha_atual, column=3, value=ref_desc)
+            guardar("RESUMO", f"C{linha_atual}", desconto)
         else:
-            c_desc = ws_resumo.cell(row=linha_atual, column=3, value=0)
+            c_desc = resumo.cell(row=linha_atual, column=3, value=0)
         style_cell(c_desc, font=red_font, number_format=formato_contabil, alignment=center)
 
         style_cell(
-            ws_resumo.cell(row=linha_atual, column=4, value=f"=B{linha_atual}-C{linha_atual}"),
+            resumo.cell(row=linha_atual, column=4, value=f"=B{linha_atual}-C{linha_atual}"),
             number_format=formato_contabil,
             alignment=center
         )
+        if resultados is not None:
+            guardar(
+                "RESUMO", f"D{linha_atual}",
+                None if desconto_por_motorista[motorista] is None else bruto_por_motorista[motorista] - desconto_por_motorista[motorista],
+            )
 
-        style_cell(ws_resumo.cell(row=linha_atual, column=5, value=""), alignment=center)
+        style_cell(resumo.cell(row=linha_atual, column=5, value=""), alignment=center)
 
         for c in range(1, 6):
             ws_resumo.cell(row=linha_atual, column=c).border = border_all
@@ -251,19 +451,19 @@ def gerar_resumos(
     # =========================
     # TOTAL RESUMO
     # =========================
-    cell_total = ws_resumo.cell(row=linha_atual, column=1, value="CUSTO TOTAL")
+    cell_total = resumo.cell(row=linha_atual, column=1, value="CUSTO TOTAL")
     style_cell(cell_total, font=bold, alignment=center, border=border_all)
 
     style_cell(
-        ws_resumo.cell(row=linha_atual, column=2, value=f"=SUM(B{linha_primeiro_motorista}:B{linha_atual-1})"),
+        resumo.cell(row=linha_atual, column=2, value=f"=SUM(B{linha_primeiro_motorista}:B{linha_atual-1})"),
         font=bold, number_format=formato_contabil, alignment=center, border=border_all
     )
     style_cell(
-        ws_resumo.cell(row=linha_atual, column=3, value=f"=SUM(C{linha_primeiro_motorista}:C{linha_atual-1})"),
+        resumo.cell(row=linha_atual, column=3, value=f"=SUM(C{linha_primeiro_motorista}:C{linha_atual-1})"),
         font=bold_red, number_format=formato_contabil, alignment=center, border=border_all
     )
     style_cell(
-        ws_resumo.cell(row=linha_atual, column=4, value=f"=SUM(D{linha_primeiro_motorista}:D{linha_atual-1})"),
+        resumo.cell(row=linha_atual, column=4, value=f"=SUM(D{linha_primeiro_motorista}:D{linha_atual-1})"),
         font=bold, number_format=formato_contabil, alignment=center, border=border_all
     )
 
@@ -274,41 +474,40 @@ def gerar_resumos(
             cell.font = bold
             cell.alignment = center
 
+    if resultados is not None:
+        descontos_resumo = [desconto_por_motorista[m] for m in motoristas_list]
+        total_bruto = sum(bruto_por_motorista[m] for m in motoristas_list)
+        total_desc = None if None in descontos_resumo else sum(descontos_resumo)
+        guardar("RESUMO", f"B{linha_atual}", total_bruto)
+        guardar("RESUMO", f"C{linha_atual}", total_desc)
+        guardar("RESUMO", f"D{linha_atual}", None if total_desc is None else total_bruto - total_desc)
+
     # =========================
     # CRIAR ABA RESUMO TOTAL
     # =========================
     ws_rt = wb_espelhos.create_sheet("RESUMO TOTAL")
     ws_rt.sheet_view.showGridLines = False
 
-    ws_rt["A1"] = "Relação dos Parceiros para Pagamento"
+    rt = LarguraColunas(ws_rt)
+
+    rt["A1"] = "Relação dos Parceiros para Pagamento"
     ws_rt["A1"].font = bold
-    ws_rt["A2"] = "Centro de Custo:"
-    ws_rt["A3"] = "Período:"
+    rt["A2"] = "Centro de Custo:"
+    rt["A3"] = "Período:"
 
     linha_cab = 5
     linha_rt = 6
 
+    rt["A5"] = "Nome do Motorista"
     hdr_motor = ws_rt["A5"]
-    hdr_motor.value = "Nome do Motorista"
     style_cell(hdr_motor, font=bold, border=border_all, alignment=center)
 
     for i, motorista in enumerate(motoristas_list):
-        cell = ws_rt.cell(row=linha_rt + i, column=1, value=motorista)
+        cell = rt.cell(row=linha_rt + i, column=1, value=motorista)
         style_cell(cell, border=border_all, alignment=center)
 
-    # Clientes únicos do banco consolidado
-    clientes_unicos = []
-    col_cliente = None
-    for col in range(1, ws_banco.max_column + 1):
-        if norm_text(ws_banco.cell(row=1, column=col).value).lower() == "cliente":
-            col_cliente = col
-            break
-
-    if col_cliente:
-        for r in range(2, ws_banco.max_row + 1):
-            cliente = ws_banco.cell(row=r, column=col_cliente).value
-            if cliente and cliente not in clientes_unicos:
-                clientes_unicos.append(cliente)
+    # Clientes únicos do banco consolidado (ordem do banco)
+    clientes_unicos = [c for c in df_banco["cliente"].drop_duplicates() if pd.notna(c) and c]
 
     clientes_set = set(clientes_unicos)
 
@@ -316,13 +515,13 @@ def gerar_resumos(
 
     # Cabeçalhos clientes
     for idx, cliente in enumerate(clientes_unicos):
-        cell = ws_rt.cell(row=linha_cab, column=col_inicio + idx, value=cliente)
+        cell = rt.cell(row=linha_cab, column=col_inicio + idx, value=cliente)
         style_cell(cell, font=bold, alignment=center, border=border_all)
 
     # NOVA COLUNA: Valor Bruto (após clientes e antes do Desconto)
     col_valor_bruto_rt = col_inicio + len(clientes_unicos)
     style_cell(
-        ws_rt.cell(row=linha_cab, column=col_valor_bruto_rt, value="Valor Bruto"),
+        rt.cell(row=linha_cab, column=col_valor_bruto_rt, value="Valor Bruto"),
         font=bold, alignment=center, border=border_all
     )
 
@@ -331,24 +530,40 @@ def gerar_resumos(
     col_liquido = col_desconto + 1
     col_status = col_liquido + 1
 
-    style_cell(ws_rt.cell(row=linha_cab, column=col_desconto, value="Desconto"), font=bold_red, alignment=center, border=border_all)
-    style_cell(ws_rt.cell(row=linha_cab, column=col_liquido, value="Valor Líquido"), font=bold, alignment=center, border=border_all)
-    style_cell(ws_rt.cell(row=linha_cab, column=col_status, value="Status NF"), font=bold, alignment=center, border=border_all)
+    style_cell(rt.cell(row=linha_cab, column=col_desconto, value="Desconto"), font=bold_red, alignment=center, border=border_all)
+    style_cell(rt.cell(row=linha_cab, column=col_liquido, value="Valor Líquido"), font=bold, alignment=center, border=border_all)
+    style_cell(rt.cell(row=linha_cab, column=col_status, value="Status NF"), font=bold, alignment=center, border=border_all)
 
-    venc = ws_rt.cell(row=3, column=col_status, value="Vencimento:")
+    venc = rt.cell(row=3, column=col_status, value="Vencimento:")
     style_cell(venc, font=bold, alignment=center, border=border_all)
 
-    # Pré-cálculos por motorista
+    # Pré-cálculos por motorista: intervalos do layout calculado do banco (valores da
+    # matriz); aba que não bate com o layout é varrida como antes (valores das células)
     ranges_por_motorista = {}
+    valores_por_motorista = {}
     for motorista, sheet_name in motorista_to_sheet.items():
         ws_m = wb_espelhos[sheet_name]
-        ranges_por_motorista[motorista] = build_client_ranges_in_mapeamento(ws_m, clientes_set)
+        chave = chave_no_banco(ws_m, motorista)
+        ranges = ranges_pelo_layout(ws_m, chave)
+        if ranges is None:
+            ranges_por_motorista[motorista] = build_client_ranges_in_mapeamento(ws_m, clientes_set)
+            continue
+        ranges_por_motorista[motorista] = ranges
+        valores_por_motorista[motorista] = matriz.loc[chave]
 
     bruto_letter = ws_rt.cell(row=linha_cab, column=col_valor_bruto_rt).column_letter
     desc_letter = ws_rt.cell(row=linha_cab, column=col_desconto).column_letter
 
+    # somas por coluna para o resultado das fórmulas da linha CUSTO TOTAL
+    totais_rt = {c: 0 for c in range(col_inicio, col_liquido + 1)}
+
+    def somar_rt(c, v):
+        # None = resultado desconhecido; contamina o total da coluna
+        totais_rt[c] = None if v is None or totais_rt[c] is None else totais_rt[c] + v
+
     # Preencher linhas
     for i, motorista in enumerate(motoristas_list):
+        progresso("resumo_total", i, len(motoristas_list))
         row_out = linha_rt + i
         sheet_name = motorista_to_sheet.get(motorista)
         sheet_ref = excel_sheet_ref(sheet_name) if sheet_name else None
@@ -363,40 +578,69 @@ def gerar_resumos(
             rng = client_ranges.get(cliente)
             if sheet_ref and rng:
                 s, e = rng
-                out_cell.value = f"=SUM('{sheet_ref}'!F{s}:F{e})"
+                v = None
+                if resultados is not None:
+                    valores = valores_por_motorista.get(motorista)
+                    v = float(valores[cliente]) if valores is not None else soma_coluna_f(wb_espelhos[sheet_name], s, e)
+                if bloco_totais:
+                    out_cell.value = escrever_bloco_cliente(wb_espelhos[sheet_name], sheet_name, j, cliente, s, e, v)
+                else:
+                    out_cell.value = f"=SUM('{sheet_ref}'!F{s}:F{e})"
                 out_cell.number_format = formato_contabil
+                if resultados is not None:
+                    guardar("RESUMO TOTAL", out_cell.coordinate, v)
+                    somar_rt(col_inicio + j, v)
             else:
                 out_cell.value = ""
+            rt.registrar(col_inicio + j, out_cell.value)
             out_cell.alignment = center
             out_cell.border = border_all
 
         # Valor Bruto
         cbruto = ws_rt.cell(row=row_out, column=col_valor_bruto_rt)
         if sheet_ref and bruto_row:
-            cbruto.value = f"='{sheet_ref}'!F{bruto_row}"
+            cbruto.value = ref_bloco(sheet_name, LINHA_BLOCO_BRUTO) if bloco_totais else f"='{sheet_ref}'!F{bruto_row}"
             cbruto.number_format = formato_contabil
+            if resultados is not None:
+                guardar("RESUMO TOTAL", cbruto.coordinate, bruto_por_motorista[motorista])
+                somar_rt(col_valor_bruto_rt, bruto_por_motorista[motorista])
         else:
             cbruto.value = ""
+        rt.registrar(col_valor_bruto_rt, cbruto.value)
         cbruto.alignment = center
         cbruto.border = border_all
 
         # Desconto
         cdesc = ws_rt.cell(row=row_out, column=col_desconto)
         if sheet_ref and desc_row:
-            cdesc.value = f"='{sheet_ref}'!F{desc_row}"
+            cdesc.value = ref_bloco(sheet_name, LINHA_BLOCO_DESCONTO) if bloco_totais else f"='{sheet_ref}'!F{desc_row}"
             cdesc.number_format = formato_contabil
+            if resultados is not None:
+                d = desconto_por_motorista[motorista]
+                guardar("RESUMO TOTAL", cdesc.coordinate, d)
+                somar_rt(col_desconto, d)
         else:
             cdesc.value = ""
+        rt.registrar(col_desconto, cdesc.value)
         cdesc.font = red_font
         cdesc.alignment = center
         cdesc.border = border_all
 
         # Valor Líquido (Valor Bruto - Desconto)
-        cliq = ws_rt.cell(row=row_out, column=col_liquido, value=f"={bruto_letter}{row_out}-N({desc_letter}{row_out})")
+        cliq = rt.cell(row=row_out, column=col_liquido, value=f"={bruto_letter}{row_out}-N({desc_letter}{row_out})")
         style_cell(cliq, number_format=formato_contabil, alignment=center, border=border_all)
+        if resultados is not None:
+            if not (sheet_ref and bruto_row):
+                guardar("RESUMO TOTAL", cliq.coordinate, None)  # "" - N(...) = #VALUE!
+                somar_rt(col_liquido, None)
+            else:
+                d = desconto_por_motorista[motorista] if desc_row else 0
+                liq = None if d is None else bruto_por_motorista[motorista] - d
+                guardar("RESUMO TOTAL", cliq.coordinate, liq)
+                somar_rt(col_liquido, liq)
 
         # Status NF (vazio)
-        cnf = ws_rt.cell(row=row_out, column=col_status, value="")
+        cnf = rt.cell(row=row_out, column=col_status, value="")
         style_cell(cnf, alignment=center, border=border_all)
 
     # =========================
@@ -406,47 +650,59 @@ def gerar_resumos(
     first_data_row = linha_rt
     last_data_row = row_total_rt - 1
 
-    cell_total_label = ws_rt.cell(row=row_total_rt, column=1, value="CUSTO TOTAL")
+    cell_total_label = rt.cell(row=row_total_rt, column=1, value="CUSTO TOTAL")
     style_cell(cell_total_label, font=bold, alignment=center, border=border_all)
 
     # Somar cada coluna numérica (clientes + valor bruto + desconto + valor líquido)
     # clientes
     for c in range(col_inicio, col_inicio + len(clientes_unicos)):
         col_letter = ws_rt.cell(row=linha_cab, column=c).column_letter
-        cell = ws_rt.cell(row=row_total_rt, column=c, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
+        cell = rt.cell(row=row_total_rt, column=c, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
         style_cell(cell, font=bold, alignment=center, border=border_all, number_format=formato_contabil)
 
     # valor bruto
     col_letter = ws_rt.cell(row=linha_cab, column=col_valor_bruto_rt).column_letter
-    cell = ws_rt.cell(row=row_total_rt, column=col_valor_bruto_rt, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
+    cell = rt.cell(row=row_total_rt, column=col_valor_bruto_rt, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
     style_cell(cell, font=bold, alignment=center, border=border_all, number_format=formato_contabil)
 
     # desconto (vermelho)
     col_letter = ws_rt.cell(row=linha_cab, column=col_desconto).column_letter
-    cell = ws_rt.cell(row=row_total_rt, column=col_desconto, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
+    cell = rt.cell(row=row_total_rt, column=col_desconto, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
     style_cell(cell, font=bold_red, alignment=center, border=border_all, number_format=formato_contabil)
 
     # valor líquido
     col_letter = ws_rt.cell(row=linha_cab, column=col_liquido).column_letter
-    cell = ws_rt.cell(row=row_total_rt, column=col_liquido, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
+    cell = rt.cell(row=row_total_rt, column=col_liquido, value=f"=SUM({col_letter}{first_data_row}:{col_letter}{last_data_row})")
     style_cell(cell, font=bold, alignment=center, border=border_all, number_format=formato_contabil)
 
     # status (vazio, mas com borda)
-    cell = ws_rt.cell(row=row_total_rt, column=col_status, value="")
+    cell = rt.cell(row=row_total_rt, column=col_status, value="")
     style_cell(cell, font=bold, alignment=center, border=border_all)
 
     # Garantir borda em toda a linha final (até status)
     for c in range(1, col_status + 1):
         ws_rt.cell(row=row_total_rt, column=c).border = border_all
 
+    for c, v in totais_rt.items():
+        guardar("RESUMO TOTAL", ws_rt.cell(row=row_total_rt, column=c).coordinate, v)
+
     # =========================
-    # AUTO AJUSTE
+    # AUTO AJUSTE (larguras medidas durante a escrita)
     # =========================
-    auto_ajuste(ws_resumo)
-    auto_ajuste(ws_rt)
+    resumo.aplicar(folga=3)
+    rt.aplicar(folga=3)
 
     # =========================
     # SALVAR
     # =========================
+    if resultados is not None and resultados_completos:
+        # todos os resultados vão em cache: o Excel não precisa recalcular ao abrir
+        wb_espelhos.calculation.fullCalcOnLoad = False
+
+    progresso("salvar")
     wb_espelhos.save(espelhos_xlsx_path)
+
+    if resultados is not None:
+        gravar_resultados_formulas(espelhos_xlsx_path, resultados)
+
     return espelhos_xlsx_path
\ No newline at end of file
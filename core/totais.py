@@ -0,0 +1,219 @@
+import math
+
+import pandas as pd
+
+from core.banco import identificar_colunas, norm_city_keys, validar_colunas
+
+
+def _texto(serie: pd.Series) -> pd.Series:
+    """
+    Mesmo texto que o Step2 escreve na aba: vazio/NaN vira "", resto vira str(valor).
+    """
+    return serie.astype(object).where(serie.notna(), "").map(str)
+
+
+def _texto_documento(serie: pd.Series) -> pd.Series:
+    """
+    Como _texto, mas número inteiro lido como float (coluna numérica com
+    células vazias: 123 -> 123.0 no read_excel) sai sem o ".0". Banco,
+    agência, conta e CPF vão assim para o arquivo de pagamento.
+    """
+    def texto(v):
+        return str(int(v)) if isinstance(v, float) and v.is_integer() else str(v)
+
+    return serie.astype(object).where(serie.notna(), "").map(texto)
+
+
+def valores_validos(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """
+    Colunas auxiliares (vetorizadas) com a mesma regra da PARTE 3 do Step2:
+    - _cidade_key: cidade normalizada (linhas com cidade vazia não entram no mapeamento)
+    - _unit_num: valor unitário numérico (NaN se inválido)
+    - _valido: entra no TOTAL (cliente e cidade preenchidos e valor unitário
+      numérico; linha sem cliente não vai para a aba do motorista)
+    """
+    cidade_key = norm_city_keys(df[cols["cidade"]])
+    unit_num = pd.to_numeric(df[cols["custo"]], errors="coerce")
+    valido = df["cliente"].notna() & (cidade_key != "") & unit_num.notna()
+
+    return pd.DataFrame(
+        {
+            "motorista": df[cols["motorista"]],
+            "cliente": df["cliente"],
+            "romaneio": df["romaneio"],
+            "_cidade_key": cidade_key,
+            "_unit_num": unit_num,
+            "_valido": valido,
+            "quantidade": valido.astype(int),
+            "valor": unit_num.where(valido, 0.0),
+        },
+        index=df.index,
+    )
+
+
+def totais_por_motorista_cliente(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """
+    Uma linha por (motorista, cliente), na ordem em que aparecem no banco:
+    motorista, cliente, quantidade, valor, romaneios.
+    """
+    base = valores_validos(df, cols)
+    g = base.groupby(["motorista", "cliente"], sort=False)
+    out = g.agg(quantidade=("quantidade", "sum"), valor=("valor", "sum"), romaneios=("romaneio", "nunique"))
+    return out.reset_index()
+
+
+def totais_por_motorista(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """
+    Uma linha por motorista (ordem do banco): motorista, quantidade, valor_bruto, romaneios.
+    valor_bruto é o "VALOR TOTAL DOS SERVIÇOS PRESTADOS" da aba do motorista.
+    """
+    base = valores_validos(df, cols)
+    g = base.groupby("motorista", sort=False)
+    out = g.agg(quantidade=("quantidade", "sum"), valor_bruto=("valor", "sum"), romaneios=("romaneio", "nunique"))
+    return out.reset_index()
+
+
+def totais_por_mes(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """
+    Uma linha por (mes, motorista, cliente) com as mesmas regras de valor do
+    Step2 (valores_validos): mes, motorista, cliente, quantidade, romaneios, valor.
+    romaneios: distintos dentro do mês.
+    """
+    base = valores_validos(df, cols)
+    datas = pd.to_datetime(df[cols["data"]], errors="coerce", dayfirst=True)
+    base["mes"] = datas.dt.strftime("%Y-%m").fillna("")
+    base = base[base["motorista"].notna() & base["cliente"].notna()]
+
+    g = base.groupby(["mes", "motorista", "cliente"], sort=False)
+    out = g.agg(quantidade=("quantidade", "sum"), romaneios=("romaneio", "nunique"), valor=("valor", "sum"))
+    return out.reset_index()
+
+
+def matriz_resumo_total(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """
+    RESUMO TOTAL calculado direto do banco: um pivot motorista x cliente do
+    valor (valor unitário x quantidade, mesmas linhas que entram nos grupos
+    cidade + valor unitário da PARTE 3 do Step2).
+
+    Linhas e colunas na ordem do banco. NaN onde a aba do motorista não tem
+    linhas daquele cliente no mapeamento (no RESUMO TOTAL a célula fica vazia);
+    0.0 quando tem linhas, mas nenhuma com valor unitário numérico.
+    """
+    base = valores_validos(df, cols)
+    base = base[base["motorista"].notna() & base["cliente"].notna()]
+    base = base.assign(_no_mapeamento=(base["_cidade_key"] != "").astype(int))
+
+    pivot = base.pivot_table(
+        index="motorista", columns="cliente", values=["valor", "_no_mapeamento"], aggfunc="sum", sort=False
+    )
+    motoristas = base["motorista"].drop_duplicates()
+    clientes = base["cliente"].drop_duplicates()
+    valor = pivot["valor"].reindex(index=motoristas, columns=clientes)
+    presente = pivot["_no_mapeamento"].reindex(index=motoristas, columns=clientes).fillna(0) > 0
+    return valor.where(presente)
+
+
+def layout_mapeamento(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """
+    Posição das linhas do MAPEAMENTO POR CIDADE (PARTE 3) na aba de cada
+    motorista, calculada do banco com o mesmo layout do Step2:
+    PARTE 2 começa na linha 11 (1 linha por cliente + 1 por romaneio), uma
+    linha em branco, o cabeçalho CIDADE e, por cliente, 1 linha de título +
+    1 por grupo cidade + valor unitário.
+
+    Uma linha por (motorista, cliente) na ordem da aba: motorista, cliente,
+    linha_cabecalho (CIDADE / VALOR TOTAL), linha_cliente (título do cliente),
+    ini, fim (intervalo em F; ini > fim quando o cliente não tem linhas).
+    """
+    motorista = df[cols["motorista"]]
+    tem_cliente = df["cliente"].notna()
+    chave = ["motorista", "cliente"]
+
+    pares = pd.DataFrame({"motorista": motorista, "cliente": df["cliente"]})[motorista.notna()].drop_duplicates()
+
+    romaneios = pd.DataFrame({"motorista": motorista, "cliente": df["cliente"], "romaneio": df["romaneio"]})
+    romaneios = romaneios[motorista.notna() & tem_cliente & df["romaneio"].notna()].drop_duplicates()
+    n_romaneios = romaneios.groupby(chave, sort=False).size().rename("n_romaneios")
+
+    cidade_key = norm_city_keys(df[cols["cidade"]])
+    grupos = pd.DataFrame({
+        "motorista": motorista,
+        "cliente": df["cliente"],
+        "_cidade_key": cidade_key,
+        "_unit_num": pd.to_numeric(df[cols["custo"]], errors="coerce"),
+    })
+    grupos = grupos[motorista.notna() & tem_cliente & (cidade_key != "")].drop_duplicates()
+    n_grupos = grupos.groupby(chave, sort=False).size().rename("n_grupos")
+
+    out = pares.merge(n_romaneios, on=chave, how="left").merge(n_grupos, on=chave, how="left")
+    out[["n_romaneios", "n_grupos"]] = out[["n_romaneios", "n_grupos"]].fillna(0).astype(int)
+
+    por_motorista = out.groupby("motorista", sort=False)
+    out["linha_cabecalho"] = 11 + por_motorista["n_romaneios"].transform("sum") + por_motorista["cliente"].transform("size") + 1
+    blocos = out["n_grupos"] + 1
+    out["linha_cliente"] = out["linha_cabecalho"] + 1 + blocos.groupby(out["motorista"], sort=False).cumsum() - blocos
+    out["ini"] = out["linha_cliente"] + 1
+    out["fim"] = out["linha_cliente"] + out["n_grupos"]
+    return out[["motorista", "cliente", "linha_cabecalho", "linha_cliente", "ini", "fim"]].reset_index(drop=True)
+
+
+def dados_bancarios(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """
+    Campos de F2:F8 da aba de cada motorista (primeira linha do motorista no banco),
+    como texto: contrato, banco, agencia, conta, favorecido, cpf_cnpj, pix.
+    Campo vazio fica "" (na aba aparece como INEXISTENTE).
+    """
+    primeiras = df.drop_duplicates(subset=[cols["motorista"]])
+    primeiras = primeiras[primeiras[cols["motorista"]].notna()]
+
+    def campo(nome_coluna):
+        if nome_coluna and nome_coluna in primeiras.columns:
+            return _texto_documento(primeiras[nome_coluna])
+        return pd.Series("", index=primeiras.index)
+
+    motorista = _texto(primeiras[cols["motorista"]])
+    prestador = campo(cols["prestador"])
+    cnpj = campo(cols["cnpj"])
+    cpf = campo(cols["cpf"] or "cpf")
+
+    tem_prestador = prestador.str.strip() != ""
+    doc = cnpj.where(cnpj.str.strip() != "", cpf)
+
+    out = pd.DataFrame(
+        {
+            "motorista": primeiras[cols["motorista"]],
+            "prestador": prestador,
+            "contrato": campo(cols["contrato"]).str.strip(),
+            "banco": campo("banco"),
+            "agencia": campo("agencia"),
+            "conta": campo(cols["conta"]),
+            "favorecido": prestador.where(tem_prestador, motorista),
+            "cpf_cnpj": doc,
+            "pix": campo(cols["pix"]),
+        }
+    )
+    return out.reset_index(drop=True)
+
+
+def dividir_em_partes(motoristas, max_por_parte: int) -> list:
+    """
+    Divide os motoristas em faixas alfabéticas (sem diferenciar maiúsculas)
+    de no máximo max_por_parte, com tamanhos equilibrados.
+    Retorna uma lista por parte com as posições em `motoristas`, em ordem alfabética.
+    """
+    nomes = [str(m).casefold() for m in motoristas]
+    ordem = sorted(range(len(nomes)), key=lambda i: (nomes[i], i))
+    if not ordem:
+        return []
+    n_partes = math.ceil(len(ordem) / max(1, max_por_parte))
+    tam = math.ceil(len(ordem) / n_partes)
+    return [ordem[i: i + tam] for i in range(0, len(ordem), tam)]
+
+
+def preparar(df: pd.DataFrame) -> dict:
+    """
+    Identifica e valida as colunas do banco (mesmas regras do Step2).
+    """
+    cols = identificar_colunas(df)
+    validar_colunas(df, cols)
+    return cols
@@ -0,0 +1,79 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, a trava vale só entre threads do mesmo processo
+    fcntl = None
+
+
+class TravaArquivo:
+    """
+    Exclusão mútua entre threads e processos (workers do gunicorn) usando
+    flock num arquivo. Cada instância é uma tentativa de posse; não é
+    reentrante.
+
+    compartilhada=True: trava de leitura (LOCK_SH). Várias leituras juntas,
+    nenhuma enquanto alguém tem a exclusiva (e vice-versa). Sem flock vira
+    exclusiva.
+
+    Uso:
+        trava = TravaArquivo("storage/travas/<sid>.lock")
+        if not trava.adquirir(bloquear=False):
+            ...             # alguém está com a trava
+            trava.adquirir()
+        try:
+            ...
+        finally:
+            trava.liberar()
+    """
+
+    _locais = {}
+    _locais_lock = threading.Lock()
+
+    def __init__(self, path: str, compartilhada: bool = False):
+        self.path = path
+        self.compartilhada = compartilhada
+        self._f = None
+        self._local = None
+
+    def adquirir(self, bloquear: bool = True) -> bool:
+        if fcntl is None:
+            with TravaArquivo._locais_lock:
+                self._local = TravaArquivo._locais.setdefault(os.path.abspath(self.path), threading.Lock())
+            return self._local.acquire(blocking=bloquear)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            modo = fcntl.LOCK_SH if self.compartilhada else fcntl.LOCK_EX
+            fcntl.flock(f.fileno(), modo | (0 if bloquear else fcntl.LOCK_NB))
+        except BlockingIOError:
+            f.close()
+            return False
+        except Exception:
+            f.close()
+            raise
+        self._f = f
+        return True
+
+    def liberar(self) -> None:
+        if fcntl is None:
+            if self._local is not None:
+                self._local.release()
+                self._local = None
+            return
+
+        if self._f is not None:
+            try:
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._f.close()
+                self._f = None
+
+    def __enter__(self):
+        self.adquirir()
+        return self
+
+    def __exit__(self, *exc):
+        self.liberar()
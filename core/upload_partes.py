@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from core.cabecalho_xlsx import CabecalhoXlsx, FaltamDados
+from core.descontos import validar_cabecalho_descontos
+from core.entrada import CabecalhoCsv, CabecalhoParquet
+from core.step1_banco_consolidado import validar_cabecalho
+
+
+# descontos: opcional (core/descontos.py)
+ARQUIVOS_UPLOAD = ("motoristas", "fechamento", "descontos")
+
+TAMANHO_PARTE_PADRAO = 1024 * 1024
+TAMANHO_PARTE_MIN = 64 * 1024
+TAMANHO_PARTE_MAX = 8 * 1024 * 1024
+
+_RE_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _gravar_json(path: str, dados: dict) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class UploadEmPartes:
+    """
+    Upload retomável: o arquivo chega em partes de tamanho fixo, cada uma com
+    o sha256 dela, em qualquer ordem e quantas vezes for preciso. O arquivo é
+    montado direto na pasta de trabalho da sessão:
+
+      <pasta>/<upload_id>/
+        meta.json       campo, nome, tamanho, tamanho_parte, total_partes, sha256
+        arquivo         já com o tamanho final; cada parte vai para a posição dela
+        partes/<i>      marca da parte i recebida (conteúdo = sha256 da parte)
+        cabecalho.json  resultado da validação antecipada do cabeçalho
+
+    O upload_id sai de (campo, nome, tamanho, tamanho_parte, sha256): iniciar
+    de novo o mesmo arquivo retoma o upload e só as partes que faltam precisam
+    ser enviadas.
+
+    Validação antecipada: assim que chegam o fim do arquivo (diretório do zip)
+    e o começo da primeira aba, o cabeçalho é conferido com as mesmas regras do
+    Step1 (validar_cabecalho), sem esperar o resto. CSV: o começo do arquivo;
+    .parquet: o rodapé (core/entrada.py). status()["prioridade"]
+    diz quais partes enviar primeiro para isso.
+    """
+
+    def __init__(self, pasta: str, upload_id: str):
+        if not _RE_UPLOAD_ID.fullmatch(upload_id or ""):
+            raise ValueError("Upload inválido.")
+        self.pasta = os.path.join(pasta, upload_id)
+        self.upload_id = upload_id
+        meta_path = os.path.join(self.pasta, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError("Upload não encontrado (inicie de novo).")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self._arquivo = os.path.join(self.pasta, "arquivo")
+        self._partes = os.path.join(self.pasta, "partes")
+        self._faltando = []
+
+    @classmethod
+    def iniciar(
+        cls,
+        pasta: str,
+        campo: str,
+        nome: str,
+        tamanho: int,
+        *,
+        tamanho_parte: int = TAMANHO_PARTE_PADRAO,
+        sha256: str = "",
+    ) -> "UploadEmPartes":
+        if campo not in ARQUIVOS_UPLOAD:
+            raise ValueError(f"Arquivo inválido: {campo} (use {' ou '.join(ARQUIVOS_UPLOAD)}).")
+        if tamanho <= 0:
+            raise ValueError("Arquivo vazio.")
+        tamanho_parte = min(max(int(tamanho_parte), TAMANHO_PARTE_MIN), TAMANHO_PARTE_MAX)
+        sha256 = (sha256 or "").lower()
+
+        chave = f"{campo}\0{nome}\0{tamanho}\0{tamanho_parte}\0{sha256}"
+        upload_id = hashlib.sha256(chave.encode("utf-8")).hexdigest()[:32]
+        destino = os.path.join(pasta, upload_id)
+
+        if not os.path.exists(os.path.join(destino, "meta.json")):
+            os.makedirs(os.path.join(destino, "partes"), exist_ok=True)
+            with open(os.path.join(destino, "arquivo"), "wb") as f:
+                f.truncate(tamanho)
+            _gravar_json(os.path.join(destino, "meta.json"), {
+                "campo": campo,
+                "nome": nome,
+                "tamanho": tamanho,
+                "tamanho_parte": tamanho_parte,
+                "total_partes": -(-tamanho // tamanho_parte),
+                "sha256": sha256,
+            })
+
+        return cls(pasta, upload_id)
+
+    # =========================
+    # PARTES
+    # =========================
+    def recebidas(self) -> set:
+        return {int(n) for n in os.listdir(self._partes) if n.isdigit()}
+
+    def receber(self, indice: int, dados: bytes, checksum: str) -> dict:
+        """
+        Grava a parte `indice` se o sha256 bater. Parte repetida é aceita de
+        novo (sobrescreve com o mesmo conteúdo). Retorna status().
+        """
+        tamanho, tp, total = self.meta["tamanho"], self.meta["tamanho_parte"], self.meta["total_partes"]
+        if not 0 <= indice < total:
+            raise ValueError(f"Parte {indice} fora do arquivo (0 a {total - 1}).")
+
+        esperado = min(tp, tamanho - indice * tp)
+        if len(dados) != esperado:
+            raise ValueError(f"Parte {indice} com {len(dados)} bytes (esperado {esperado}).")
+        if hashlib.sha256(dados).hexdigest() != (checksum or "").strip().lower():
+            raise ValueError(f"Checksum da parte {indice} não confere (envie de novo).")
+
+        with open(self._arquivo, "r+b") as f:
+            f.seek(indice * tp)
+            f.write(dados)
+
+        marca = os.path.join(self._partes, str(indice))
+        with open(marca + ".tmp", "w") as f:
+            f.write(checksum.strip().lower())
+        os.replace(marca + ".tmp", marca)
+
+        return self.status()
+
+    # =========================
+    # VALIDAÇÃO ANTECIPADA DO CABEÇALHO
+    # =========================
+    def _cabecalho(self, recebidas: set):
+        """
+        {"ok": bool, "colunas": [...], "erro": str} ou None enquanto faltam partes.
+        """
+        cache_path = os.path.join(self.pasta, "cabecalho.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        tp = self.meta["tamanho_parte"]
+
+        def ler(inicio, fim):
+            if not all(i in recebidas for i in range(inicio // tp, (fim - 1) // tp + 1)):
+                return None
+            with open(self._arquivo, "rb") as f:
+                f.seek(inicio)
+                return f.read(fim - inicio)
+
+        def disponivel(inicio, fim):
+            i = inicio // tp
+            while i * tp < fim and i in recebidas:
+                i += 1
+            return ler(inicio, min(fim, i * tp)) if i * tp > inicio else b""
+
+        ext = os.path.splitext(self.meta["nome"].lower())[1]
+        classe = {".csv": CabecalhoCsv, ".parquet": CabecalhoParquet}.get(ext, CabecalhoXlsx)
+        leitor = classe(ler, disponivel, self.meta["tamanho"])
+        try:
+            valores = leitor.colunas()
+        except FaltamDados:
+            self._faltando = leitor.faltando
+            return None
+        except (ValueError, KeyError) as e:
+            resultado = {"ok": False, "colunas": [], "erro": f"{self.meta['nome']}: {e}"}
+        else:
+            colunas = [str(v).strip().lower() for v in valores if v is not None]
+            try:
+                if self.meta["campo"] == "descontos":
+                    validar_cabecalho_descontos(colunas)
+                else:
+                    validar_cabecalho(self.meta["campo"], colunas)
+                resultado = {"ok": True, "colunas": colunas, "erro": ""}
+            except Exception as e:
+                resultado = {"ok": False, "colunas": colunas, "erro": str(e)}
+
+        _gravar_json(cache_path, resultado)
+        return resultado
+
+    def status(self) -> dict:
+        recebidas = self.recebidas()
+        total = self.meta["total_partes"]
+        cabecalho = self._cabecalho(recebidas)
+
+        prioridade = []
+        if cabecalho is None:
+            tp = self.meta["tamanho_parte"]
+            for inicio, fim in self._faltando:
+                for i in range(inicio // tp, (fim - 1) // tp + 1):
+                    if i not in recebidas and i not in prioridade:
+                        prioridade.append(i)
+                        break
+
+        return {
+            "upload_id": self.upload_id,
+            "campo": self.meta["campo"],
+            "nome": self.meta["nome"],
+            "tamanho": self.meta["tamanho"],
+            "tamanho_parte": self.meta["tamanho_parte"],
+            "total_partes": total,
+            "recebidas": sorted(recebidas),
+            "completo": len(recebidas) == total,
+            "prioridade": prioridade,
+            "cabecalho": cabecalho,
+        }
+
+    # =========================
+    # CONCLUIR
+    # =========================
+    def concluir(self, destino: str) -> str:
+        """
+        Confere se tudo chegou (e o sha256 do arquivo inteiro, se informado no
+        início), move o arquivo montado para `destino` e apaga o upload.
+        """
+        st = self.status()
+        if not st["completo"]:
+            faltam = st["total_partes"] - len(st["recebidas"])
+            raise ValueError(f"Upload incompleto: faltam {faltam} parte(s).")
+        if st["cabecalho"] is not None and not st["cabecalho"]["ok"]:
+            raise ValueError(st["cabecalho"]["erro"])
+
+        if self.meta["sha256"]:
+            h = hashlib.sha256()
+            with open(self._arquivo, "rb") as f:
+                for bloco in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(bloco)
+            if h.hexdigest() != self.meta["sha256"]:
+                raise ValueError("Checksum do arquivo inteiro não confere (envie de novo).")
+
+        os.replace(self._arquivo, destino)
+        shutil.rmtree(self.pasta, ignore_errors=True)
+        return destino
@@ -0,0 +1,48 @@
+# gunicorn.conf.py
+#
+# O app é importado uma vez no master (preload) e os módulos pesados
+# (pandas/openpyxl/core) são pré-carregados lá antes do fork: cada worker
+# nasce pronto, dividindo essas páginas de memória com o master, em vez de
+# pagar o import na primeira requisição (ou a cada reinício por timeout).
+#
+# GUNICORN_PRE_CARREGAR=0 desliga o pré-carregamento (workers importam sob demanda).
+#
+# O Procfile roda o worker com --threads (gthread): o GET /progresso (SSE) é
+# atendido enquanto o POST do passo roda. Com ESPELHOS_WORKERS > 1 o pool do
+# Step2 continua valendo nesse worker: os processos vêm do forkserver em vez de
+# fork (ver core/step2_gerar_espelhos.py); o modo aparece no log do worker.
+import os
+import time
+
+preload_app = True
+
+_PRE_CARREGAR = os.environ.get("GUNICORN_PRE_CARREGAR", "1") == "1"
+
+
+def when_ready(server):
+    # roda no master, antes de criar os workers
+    if not _PRE_CARREGAR:
+        return
+    from app import pre_carregar
+
+    t = time.monotonic()
+    pre_carregar()
+    server.log.info("Módulos pesados pré-carregados no master em %.2fs", time.monotonic() - t)
+
+
+def pre_fork(server, worker):
+    worker.inicio_boot = time.monotonic()
+
+
+def post_worker_init(worker):
+    # tempo do fork até o worker estar pronto para atender
+    worker.log.info(
+        "Worker %s pronto em %.3fs", worker.pid, time.monotonic() - getattr(worker, "inicio_boot", time.monotonic())
+    )
+    workers_step2 = int(os.environ.get("ESPELHOS_WORKERS", "1"))
+    if workers_step2 != 1:
+        worker.log.info(
+            "Step2 com %s processos (%s)",
+            workers_step2 or os.cpu_count(),
+            "forkserver: worker com threads" if worker.cfg.threads > 1 else "fork",
+        )